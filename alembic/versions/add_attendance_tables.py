@@ -0,0 +1,45 @@
+"""add attendance_events and session_attendance tables
+
+Revision ID: add_attendance_tables
+Revises: add_payment_daily_rollups
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_attendance_tables'
+down_revision = 'add_payment_daily_rollups'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'attendance_events',
+        sa.Column('id', sa.BigInteger(), primary_key=True),
+        sa.Column('session_id', sa.Integer(), sa.ForeignKey('live_sessions.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('conference_id', sa.Integer(), sa.ForeignKey('conferences.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('event_type', sa.String(length=16), nullable=False),
+        sa.Column('occurred_at', sa.DateTime(), nullable=False),
+    )
+    op.create_index('ix_attendance_events_session_user', 'attendance_events', ['session_id', 'user_id', 'occurred_at'])
+    op.create_table(
+        'session_attendance',
+        sa.Column('session_id', sa.Integer(), sa.ForeignKey('live_sessions.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('conference_id', sa.Integer(), sa.ForeignKey('conferences.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('first_seen', sa.DateTime(), nullable=False),
+        sa.Column('last_seen', sa.DateTime(), nullable=False),
+        sa.Column('seconds', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('joins', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('present', sa.Boolean(), nullable=False, server_default='false'),
+    )
+    op.create_index('ix_session_attendance_conference_id', 'session_attendance', ['conference_id'])
+
+def downgrade() -> None:
+    op.drop_index('ix_session_attendance_conference_id', table_name='session_attendance')
+    op.drop_table('session_attendance')
+    op.drop_index('ix_attendance_events_session_user', table_name='attendance_events')
+    op.drop_table('attendance_events')
@@ -0,0 +1,32 @@
+"""add conference_counters table
+
+Revision ID: add_conference_counters
+Revises: add_session_status_organizer
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_conference_counters'
+down_revision = 'add_session_status_organizer'
+branch_labels = None
+depends_on = None
+
+COUNTER_COLUMNS = (
+    'abstracts', 'oral_accepted', 'poster_accepted', 'rejected', 'reviews', 'reviewers',
+    'participants', 'cert_participants', 'cert_speakers', 'cert_reviewers', 'sessions_total',
+)
+
+def upgrade() -> None:
+    op.create_table(
+        'conference_counters',
+        sa.Column('conference_id', sa.Integer(), sa.ForeignKey('conferences.id', ondelete='CASCADE'), primary_key=True),
+        *[sa.Column(name, sa.Integer(), nullable=False, server_default='0') for name in COUNTER_COLUMNS],
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+    )
+    # Les compteurs sont initialisés paresseusement ou via `python -m utils.counters`
+
+def downgrade() -> None:
+    op.drop_table('conference_counters')
@@ -0,0 +1,34 @@
+"""add auto_started to live_sessions and store session_time in UTC
+
+Revision ID: add_live_session_auto_started
+Revises: add_payment_stripe_event_id
+Create Date: 2026-10-20 10:00:00.000000
+
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_live_session_auto_started'
+down_revision = 'add_payment_stripe_event_id'
+branch_labels = None
+depends_on = None
+
+# Fuseau dans lequel les dates existantes ont été saisies (voir utils/live_state.py)
+LIVE_SESSION_TIMEZONE = os.getenv("LIVE_SESSION_TIMEZONE", "UTC")
+
+def upgrade() -> None:
+    op.add_column('live_sessions', sa.Column('auto_started', sa.Boolean(), nullable=False, server_default='false'))
+    if LIVE_SESSION_TIMEZONE != "UTC":
+        op.execute(sa.text(
+            "UPDATE live_sessions SET session_time = (session_time AT TIME ZONE :tz) AT TIME ZONE 'UTC'"
+        ).bindparams(tz=LIVE_SESSION_TIMEZONE))
+
+def downgrade() -> None:
+    if LIVE_SESSION_TIMEZONE != "UTC":
+        op.execute(sa.text(
+            "UPDATE live_sessions SET session_time = (session_time AT TIME ZONE 'UTC') AT TIME ZONE :tz"
+        ).bindparams(tz=LIVE_SESSION_TIMEZONE))
+    op.drop_column('live_sessions', 'auto_started')
@@ -0,0 +1,21 @@
+"""add join_epoch to live_sessions
+
+Revision ID: add_live_session_join_epoch
+Revises: add_attendance_tables
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_live_session_join_epoch'
+down_revision = 'add_attendance_tables'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('live_sessions', sa.Column('join_epoch', sa.Integer(), nullable=False, server_default='0'))
+
+def downgrade() -> None:
+    op.drop_column('live_sessions', 'join_epoch')
@@ -0,0 +1,31 @@
+"""add payment_daily_rollups table
+
+Revision ID: add_payment_daily_rollups
+Revises: add_conference_counters
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_payment_daily_rollups'
+down_revision = 'add_conference_counters'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'payment_daily_rollups',
+        sa.Column('conference_id', sa.Integer(), sa.ForeignKey('conferences.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('day', sa.Date(), primary_key=True),
+        sa.Column('payments_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('amount_total', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('refunds_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('refunds_total', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+    )
+    # Remplir l'historique ensuite avec `python -m utils.revenue`
+
+def downgrade() -> None:
+    op.drop_table('payment_daily_rollups')
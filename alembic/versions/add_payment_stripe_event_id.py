@@ -0,0 +1,23 @@
+"""add stripe_event_id to payments
+
+Revision ID: add_payment_stripe_event_id
+Revises: add_email_outbox
+Create Date: 2026-10-20 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_payment_stripe_event_id'
+down_revision = 'add_email_outbox'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('payments', sa.Column('stripe_event_id', sa.String(length=255), nullable=True))
+    op.create_unique_constraint('uq_payments_stripe_event_id', 'payments', ['stripe_event_id'])
+
+def downgrade() -> None:
+    op.drop_constraint('uq_payments_stripe_event_id', 'payments', type_='unique')
+    op.drop_column('payments', 'stripe_event_id')
@@ -0,0 +1,35 @@
+"""add push_subscriptions table
+
+Revision ID: add_push_subscriptions
+Revises: add_qa_questions
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_push_subscriptions'
+down_revision = 'add_qa_questions'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'push_subscriptions',
+        sa.Column('endpoint_hash', sa.String(length=64), primary_key=True),
+        sa.Column('endpoint', sa.Text(), nullable=False),
+        sa.Column('p256dh', sa.String(length=255), nullable=False),
+        sa.Column('auth', sa.String(length=255), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='SET NULL'), nullable=True),
+        sa.Column('conference_id', sa.Integer(), sa.ForeignKey('conferences.id', ondelete='SET NULL'), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_push_subscriptions_user_id', 'push_subscriptions', ['user_id'])
+    op.create_index('ix_push_subscriptions_conference_id', 'push_subscriptions', ['conference_id'])
+
+def downgrade() -> None:
+    op.drop_index('ix_push_subscriptions_conference_id', table_name='push_subscriptions')
+    op.drop_index('ix_push_subscriptions_user_id', table_name='push_subscriptions')
+    op.drop_table('push_subscriptions')
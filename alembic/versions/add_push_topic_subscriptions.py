@@ -0,0 +1,28 @@
+"""add push_topic_subscriptions table
+
+Revision ID: add_push_topic_subscriptions
+Revises: add_push_subscriptions
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_push_topic_subscriptions'
+down_revision = 'add_push_subscriptions'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'push_topic_subscriptions',
+        sa.Column('topic', sa.String(length=100), primary_key=True),
+        sa.Column('endpoint_hash', sa.String(length=64), sa.ForeignKey('push_subscriptions.endpoint_hash', ondelete='CASCADE'), primary_key=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+    )
+    op.create_index('ix_push_topic_subscriptions_endpoint_hash', 'push_topic_subscriptions', ['endpoint_hash'])
+
+def downgrade() -> None:
+    op.drop_index('ix_push_topic_subscriptions_endpoint_hash', table_name='push_topic_subscriptions')
+    op.drop_table('push_topic_subscriptions')
@@ -0,0 +1,30 @@
+"""add qa_messages table
+
+Revision ID: add_qa_messages
+Revises: add_live_session_join_epoch
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_qa_messages'
+down_revision = 'add_live_session_join_epoch'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'qa_messages',
+        sa.Column('id', sa.BigInteger(), primary_key=True),
+        sa.Column('conference_id', sa.Integer(), sa.ForeignKey('conferences.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='SET NULL'), nullable=True),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+    )
+    op.create_index('ix_qa_messages_conference_id_id', 'qa_messages', ['conference_id', 'id'])
+
+def downgrade() -> None:
+    op.drop_index('ix_qa_messages_conference_id_id', table_name='qa_messages')
+    op.drop_table('qa_messages')
@@ -0,0 +1,41 @@
+"""add qa_questions and qa_question_votes tables
+
+Revision ID: add_qa_questions
+Revises: add_qa_messages
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_qa_questions'
+down_revision = 'add_qa_messages'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'qa_questions',
+        sa.Column('id', sa.String(length=32), primary_key=True),
+        sa.Column('conference_id', sa.Integer(), sa.ForeignKey('conferences.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='SET NULL'), nullable=True),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('votes', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('answered', sa.Boolean(), nullable=False, server_default='false'),
+        sa.Column('hidden', sa.Boolean(), nullable=False, server_default='false'),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_qa_questions_conference_id', 'qa_questions', ['conference_id'])
+    op.create_table(
+        'qa_question_votes',
+        sa.Column('question_id', sa.String(length=32), sa.ForeignKey('qa_questions.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+    )
+
+def downgrade() -> None:
+    op.drop_table('qa_question_votes')
+    op.drop_index('ix_qa_questions_conference_id', table_name='qa_questions')
+    op.drop_table('qa_questions')
@@ -48,6 +48,39 @@ def get_current_user(authorization: Optional[str] = Header(None), db: Session =
     except PyJWTError:
         raise HTTPException(status_code=401, detail="Token invalide")
 
+def get_current_user_id(authorization: Optional[str] = Header(None)) -> int:
+    """
+    Valide uniquement la signature et l'expiration du JWT, sans charger l'utilisateur :
+    pour les lectures à fort trafic qui ne doivent pas toucher la base
+    """
+    if not authorization:
+        raise HTTPException(
+            status_code=401,
+            detail="Non authentifié",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    try:
+        payload = jwt.decode(authorization.replace("Bearer ", ""), SECRET_KEY, algorithms=[ALGORITHM])
+        user_id = payload.get("sub")
+        if user_id is None:
+            raise HTTPException(status_code=401, detail="Token invalide")
+        return int(user_id)
+    except ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token expiré")
+    except (PyJWTError, ValueError):
+        raise HTTPException(status_code=401, detail="Token invalide")
+
+def user_id_from_token(token: str) -> Optional[int]:
+    """
+    Identifiant de l'utilisateur d'un jeton d'accès valide, None sinon (connexions WebSocket
+    qui transmettent le jeton en paramètre de requête)
+    """
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        return int(payload["sub"])
+    except (PyJWTError, KeyError, TypeError, ValueError):
+        return None
+
 @router.post("/login", operation_id="login_auth")
 async def login(
     email: str = Form(...),
@@ -60,30 +60,16 @@ async def login(
         }
     }
 
-import smtplib
-import os
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from fastapi import HTTPException
-
-SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 465
-SMTP_USER ="sundusnidar@gmail.com"
-SMTP_PASSWORD = "wzja gtwm lttz molj"
-
-def send_reset_email(to_email: str, reset_link: str):
-    try:
-        message = MIMEMultipart("alternative")
-        message["Subject"] = "Réinitialisation de votre mot de passe"
-        message["From"] = SMTP_USER
-        message["To"] = to_email
-
-        text = (
-            f"Bonjour,\n\n"
-            f"Voici le lien pour réinitialiser votre mot de passe : {reset_link}\n\n"
-            f"Si vous n'avez pas demandé cette réinitialisation, ignorez cet email."
-        )
-        html = f"""
+from utils.email_outbox import queue_email, email_worker
+
+def queue_reset_email(db: Session, to_email: str, reset_link: str):
+    # Mis en file d'envoi (utils/email_outbox) : la requête n'attend pas le serveur SMTP
+    text = (
+        f"Bonjour,\n\n"
+        f"Voici le lien pour réinitialiser votre mot de passe : {reset_link}\n\n"
+        f"Si vous n'avez pas demandé cette réinitialisation, ignorez cet email."
+    )
+    html = f"""
         <html>
           <body>
             <p>Bonjour,<br><br>
@@ -94,19 +80,7 @@ def send_reset_email(to_email: str, reset_link: str):
           </body>
         </html>
         """
-
-        message.attach(MIMEText(text, "plain"))
-        message.attach(MIMEText(html, "html"))
-
-        with smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT) as server:
-            server.login(SMTP_USER, SMTP_PASSWORD)
-            server.sendmail(SMTP_USER, to_email, message.as_string())
-
-        print(f"Email de réinitialisation envoyé à {to_email}")
-
-    except Exception as e:
-        # Log error without breaking flow, pour plus de robustesse
-        print(f"Erreur lors de l'envoi de l'email à {to_email} : {e}")
+    queue_email(db, to_email, "Réinitialisation de votre mot de passe", text, html)
 
 
 @router.post("/forgot-password")
@@ -124,7 +98,9 @@ async def forgot_password(email: str = Form(...), db: Session = Depends(get_db))
 
     reset_link = f"http://localhost:3000/reset-password?token={reset_token}"
 
-    send_reset_email(user.email, reset_link)
+    queue_reset_email(db, user.email, reset_link)
+    db.commit()
+    email_worker.wake()
 
     return {"message": "Si cet email existe, un lien de réinitialisation a été envoyé."}
 
@@ -10,6 +10,7 @@ from models.reviews import Review
 from datetime import datetime
 from utils.email_sender import generate_certificate_pdf
 from auth import get_current_user
+from utils.stats_cache import invalidate_stats
 
 router = APIRouter()
 
@@ -79,6 +80,7 @@ def get_certificate(conference_id: int, cert_type: str, db: Session = Depends(ge
     )
     db.add(cert)
     db.commit()
+    invalidate_stats(conference_id)
 
     # Retourner le PDF
     return Response(pdf_buffer.read(), media_type="application/pdf", headers={
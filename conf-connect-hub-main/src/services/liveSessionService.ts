@@ -36,7 +36,8 @@ class LiveSessionService {
   async createSession(conferenceId: number, data: CreateSessionData): Promise<LiveSession> {
     const formData = new FormData();
     formData.append('session_title', data.session_title);
-    formData.append('session_time', data.session_time);
+    // Champ datetime-local (heure locale du navigateur) envoyé en UTC avec son décalage
+    formData.append('session_time', new Date(data.session_time).toISOString());
     
     const response = await api.post(`/conferences/${conferenceId}/live-sessions`, formData);
     return response.data;
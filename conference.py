@@ -16,6 +16,8 @@ import base64
 import json
 import os
 from utils.email_sender import EmailSender
+from utils.email_outbox import email_worker
+from utils.live_state import publish_session_event
 import secrets
 from fastapi.responses import RedirectResponse
 from passlib.context import CryptContext
@@ -320,6 +322,7 @@ def delete_conference(conference_id: int, db: Session = Depends(get_db), current
 
     db.delete(conference)
     db.commit()
+    publish_session_event("conference_deleted", conference_id)
     return {"message": "Conférence supprimée avec succès"}
 
 @router.post("/conferences/{conference_id}/invite-reviewer")
@@ -401,88 +404,25 @@ async def invite_reviewer(
         db.add(invitation)
         db.flush()  # Get the invitation ID without committing
 
-        # Prepare email content
+        # Email mis en file dans la même transaction que l'invitation : il n'est envoyé que
+        # si l'invitation est enregistrée, et la requête n'attend pas le serveur SMTP
         frontend_url = os.getenv('FRONTEND_URL', 'http://localhost:8080')
         accept_url = f"{frontend_url}/accept-invitation/{accept_token}?conference_id={conference_id}"
         reject_url = f"{frontend_url}/reject-invitation/{reject_token}?conference_id={conference_id}"
-        
-        email_subject = f"Invitation à évaluer la conférence : {conference.title}"
-        email_body = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                <h2 style="color: #2c3e50;">Invitation à devenir Reviewer</h2>
-                
-                <p>Bonjour,</p>
-                
-                <p>Vous avez été invité(e) par {current_user.first_name} {current_user.last_name} à devenir reviewer pour la conférence :</p>
-                
-                <div style="background-color: #f8f9fa; padding: 15px; margin: 20px 0; border-radius: 5px;">
-                    <h3 style="color: #2c3e50; margin-top: 0;">{conference.title}</h3>
-                    <p style="margin-bottom: 0;">{conference.description or 'Pas de description disponible'}</p>
-                </div>
-
-                <p>En tant que reviewer, vous aurez la responsabilité d'évaluer les soumissions et de contribuer à la qualité scientifique de la conférence.</p>
-
-                <div style="margin: 30px 0;">
-                    <a href="{accept_url}" style="display: inline-block; background-color: #28a745; color: white; padding: 12px 25px; text-decoration: none; border-radius: 5px; margin-right: 15px;">
-                        Accepter l'invitation
-                    </a>
-                    
-                    <a href="{reject_url}" style="display: inline-block; background-color: #dc3545; color: white; padding: 12px 25px; text-decoration: none; border-radius: 5px;">
-                        Décliner l'invitation
-                    </a>
-                </div>
-
-                <p style="color: #666; font-size: 0.9em;">
-                    Si les boutons ne fonctionnent pas, vous pouvez copier et coller ces liens dans votre navigateur :<br>
-                    Accepter : {accept_url}<br>
-                    Décliner : {reject_url}
-                </p>
-
-                <hr style="border: none; border-top: 1px solid #eee; margin: 30px 0;">
-
-                <p style="color: #666; font-size: 0.8em;">
-                    Cet email a été envoyé automatiquement. Merci de ne pas y répondre directement.<br>
-                    Si vous n'êtes pas concerné(e) par cette invitation, vous pouvez ignorer cet email.
-                </p>
-            </div>
-        </body>
-        </html>
-        """
-
-        # Send email using EmailSender
-        email_sender = EmailSender()
-        try:
-            # Generate URLs for accept/reject
-            frontend_url = os.getenv('FRONTEND_URL', 'http://localhost:8080')
-            accept_url = f"{frontend_url}/accept-invitation/{accept_token}?conference_id={conference_id}"
-            reject_url = f"{frontend_url}/reject-invitation/{reject_token}?conference_id={conference_id}"
-            
-            # Send invitation email
-            email_sender.send_reviewer_invitation(
-                to_email=email,
-                conference_title=conference.title,
-                accept_url=accept_url,
-                reject_url=reject_url
-            )
-            print(f"Invitation email sent successfully to {email}")
-            
-            # If email sent successfully, commit the invitation to database
-            db.commit()
-            return {
-                "message": "Invitation envoyée avec succès",
-                "invitation_id": invitation.id
-            }
-            
-        except Exception as email_error:
-            print(f"Error sending invitation email: {str(email_error)}")
-            print(traceback.format_exc())
-            db.rollback()
-            raise HTTPException(
-                status_code=500,
-                detail=f"Erreur lors de l'envoi de l'email d'invitation: {str(email_error)}"
-            )
+        EmailSender().send_reviewer_invitation(
+            db,
+            to_email=email,
+            conference_title=conference.title,
+            accept_url=accept_url,
+            reject_url=reject_url
+        )
+        db.commit()
+        email_worker.wake()
+        print(f"Invitation email queued for {email}")
+        return {
+            "message": "Invitation envoyée avec succès",
+            "invitation_id": invitation.id
+        }
 
     except HTTPException as he:
         raise he
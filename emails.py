@@ -0,0 +1,64 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from datetime import datetime
+from database import get_db
+from auth import get_current_user
+from models.users import User, UserRole
+from models.email_outbox import EmailOutbox
+from utils.email_outbox import email_worker, outbox_counts, PENDING, DEAD
+
+router = APIRouter()
+
+def _require_admin(current_user: User):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Réservé aux administrateurs.")
+
+# État de la file d'emails : nombre d'emails par statut, compteurs des workers de ce
+# processus et derniers emails en lettre morte
+@router.get("/api/emails/outbox")
+def get_email_outbox(
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    _require_admin(current_user)
+    oldest = db.query(EmailOutbox.created_at).filter(EmailOutbox.status == PENDING) \
+        .order_by(EmailOutbox.created_at).first()
+    dead = db.query(EmailOutbox).filter(EmailOutbox.status == DEAD) \
+        .order_by(EmailOutbox.id.desc()).limit(limit).all()
+    return {
+        "counts": outbox_counts(db),
+        "oldest_pending_seconds": (datetime.utcnow() - oldest[0]).total_seconds() if oldest else None,
+        "workers": email_worker.metrics(),
+        "dead": [
+            {
+                "id": email.id,
+                "to_email": email.to_email,
+                "subject": email.subject,
+                "attempts": email.attempts,
+                "last_error": email.last_error,
+                "created_at": email.created_at,
+            }
+            for email in dead
+        ],
+    }
+
+# Remet un email en lettre morte dans la file (après correction de l'adresse ou du serveur SMTP)
+@router.post("/api/emails/outbox/{email_id}/retry")
+def retry_email(
+    email_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    _require_admin(current_user)
+    email = db.query(EmailOutbox).filter(EmailOutbox.id == email_id).first()
+    if not email:
+        raise HTTPException(status_code=404, detail="Email introuvable")
+    if email.status != DEAD:
+        raise HTTPException(status_code=400, detail="Seuls les emails en lettre morte peuvent être renvoyés")
+    email.status = PENDING
+    email.attempts = 0
+    email.next_attempt_at = datetime.utcnow()
+    db.commit()
+    email_worker.wake()
+    return {"message": "Email remis en file d'envoi", "id": email.id}
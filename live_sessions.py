@@ -1,16 +1,50 @@
-from fastapi import APIRouter, Depends, HTTPException, Form, status
+from fastapi import APIRouter, Depends, HTTPException, Form, Request, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_
 from models.LiveSession import LiveSession, SessionStatus
 from models.conferences import Conference
 from models.users import User
-from database import get_db
-from auth import get_current_user
+from database import get_db, SessionLocal
+from auth import get_current_user, get_current_user_id
 from datetime import datetime
+from utils.stats_cache import invalidate_stats
+from utils.attendance import attendance_buffer, JOIN, HEARTBEAT, LEAVE
+from models.attendance import SessionAttendance
+from utils.lobby import lobbies, retry_after, verify_ticket, LobbyTicketError
+from utils.join_tokens import issue_join_token, verify_join_token, JoinTokenError
+from utils.live_state import (
+    broker, publish_session_event, registry, session_snapshot,
+    SessionTransitionError, start_session, stop_session, to_utc, utc_isoformat
+)
 from typing import List, Optional
+import asyncio
+import json
+import os
+import time
 
 router = APIRouter()
 
+# Intervalle (secondes) des commentaires keep-alive envoyés sur le flux SSE
+LIVE_STREAM_KEEPALIVE = float(os.getenv("LIVE_STREAM_KEEPALIVE", "15"))
+
+def _conference_exists(conference_id: int) -> bool:
+    db = SessionLocal()
+    try:
+        return db.query(Conference.id).filter(Conference.id == conference_id).first() is not None
+    finally:
+        db.close()
+
+async def _ensure_conference_exists(conference_id: int):
+    # Les conférences connues sont chargées au démarrage ; seule une conférence inconnue du
+    # registre (créée depuis, ou inexistante) déclenche une requête
+    if registry.knows_conference(conference_id):
+        return
+    if not await run_in_threadpool(_conference_exists, conference_id):
+        raise HTTPException(status_code=404, detail="Conférence introuvable")
+    registry.add_conference(conference_id)
+
 # Créer une nouvelle session live
 @router.post("/conferences/{conference_id}/live-sessions")
 async def create_live_session(
@@ -48,7 +82,7 @@ async def create_live_session(
         # Créer la nouvelle session
         live_session = LiveSession(
             session_title=session_title,
-            session_time=session_time,
+            session_time=to_utc(session_time),
             conference_id=conference_id,
             organizer_id=current_user.id,
             status=SessionStatus.PENDING,
@@ -58,11 +92,13 @@ async def create_live_session(
         db.add(live_session)
         db.commit()
         db.refresh(live_session)
+        invalidate_stats(conference_id)
+        publish_session_event("session_created", conference_id, live_session)
         
         return {
             "id": live_session.id,
             "session_title": live_session.session_title,
-            "session_time": live_session.session_time.isoformat(),
+            "session_time": utc_isoformat(live_session.session_time),
             "status": live_session.status,
             "is_active": live_session.is_active,
             "organizer_id": live_session.organizer_id
@@ -108,32 +144,17 @@ async def start_live_session(
                 detail="Session introuvable ou vous n'êtes pas autorisé à la lancer"
             )
         
-        if live_session.status != SessionStatus.PENDING:
-            raise HTTPException(
-                status_code=400,
-                detail="Cette session ne peut pas être lancée (déjà active ou terminée)"
-            )
-        
-        # Désactiver toutes les autres sessions actives pour cette conférence
-        db.query(LiveSession).filter(
-            LiveSession.conference_id == conference_id,
-            LiveSession.is_active == True
-        ).update({"is_active": False})
-        
-        # Activer cette session
-        live_session.status = SessionStatus.ACTIVE
-        live_session.is_active = True
-        live_session.started_at = datetime.utcnow()
-        
-        db.commit()
-        db.refresh(live_session)
+        try:
+            start_session(db, live_session)
+        except SessionTransitionError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         return {
             "id": live_session.id,
             "session_title": live_session.session_title,
             "status": live_session.status,
             "is_active": live_session.is_active,
-            "started_at": live_session.started_at.isoformat() if live_session.started_at else None
+            "started_at": utc_isoformat(live_session.started_at)
         }
         
     except HTTPException:
@@ -176,26 +197,17 @@ async def stop_live_session(
                 detail="Session introuvable ou vous n'êtes pas autorisé à l'arrêter"
             )
         
-        if live_session.status != SessionStatus.ACTIVE:
-            raise HTTPException(
-                status_code=400,
-                detail="Cette session n'est pas active"
-            )
-        
-        # Arrêter la session
-        live_session.status = SessionStatus.ENDED
-        live_session.is_active = False
-        live_session.ended_at = datetime.utcnow()
-        
-        db.commit()
-        db.refresh(live_session)
+        try:
+            stop_session(db, live_session)
+        except SessionTransitionError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         return {
             "id": live_session.id,
             "session_title": live_session.session_title,
             "status": live_session.status,
             "is_active": live_session.is_active,
-            "ended_at": live_session.ended_at.isoformat() if live_session.ended_at else None
+            "ended_at": utc_isoformat(live_session.ended_at)
         }
         
     except HTTPException:
@@ -204,38 +216,31 @@ async def stop_live_session(
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Erreur lors de l'arrêt de la session: {str(e)}")
 
-# Obtenir la session active d'une conférence
+# Obtenir la session active d'une conférence (servie depuis le registre en mémoire)
 @router.get("/conferences/{conference_id}/live-sessions/active")
 async def get_active_session(
     conference_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user_id: int = Depends(get_current_user_id)
 ):
     try:
         # Vérifier que la conférence existe
-        conference = db.query(Conference).filter(Conference.id == conference_id).first()
-        if not conference:
-            raise HTTPException(status_code=404, detail="Conférence introuvable")
+        await _ensure_conference_exists(conference_id)
         
         # Récupérer la session active
-        active_session = db.query(LiveSession).filter(
-            LiveSession.conference_id == conference_id,
-            LiveSession.is_active == True,
-            LiveSession.status == SessionStatus.ACTIVE
-        ).first()
+        active_session = registry.get(conference_id)
         
         if not active_session:
             return {"active_session": None, "message": "Aucune session active pour cette conférence"}
         
         return {
             "active_session": {
-                "id": active_session.id,
-                "session_title": active_session.session_title,
-                "session_time": active_session.session_time.isoformat(),
-                "status": active_session.status,
-                "is_active": active_session.is_active,
-                "started_at": active_session.started_at.isoformat() if active_session.started_at else None,
-                "organizer_id": active_session.organizer_id
+                "id": active_session["id"],
+                "session_title": active_session["session_title"],
+                "session_time": active_session["session_time"],
+                "status": active_session["status"],
+                "is_active": active_session["is_active"],
+                "started_at": active_session["started_at"],
+                "organizer_id": active_session["organizer_id"]
             }
         }
         
@@ -270,19 +275,7 @@ async def get_conference_sessions(
         ).order_by(LiveSession.session_time.desc()).all()
         
         return {
-            "sessions": [
-                {
-                    "id": session.id,
-                    "session_title": session.session_title,
-                    "session_time": session.session_time.isoformat(),
-                    "status": session.status,
-                    "is_active": session.is_active,
-                    "started_at": session.started_at.isoformat() if session.started_at else None,
-                    "ended_at": session.ended_at.isoformat() if session.ended_at else None,
-                    "organizer_id": session.organizer_id
-                }
-                for session in sessions
-            ]
+            "sessions": [session_snapshot(session) for session in sessions]
         }
         
     except HTTPException:
@@ -294,21 +287,14 @@ async def get_conference_sessions(
 @router.get("/conferences/{conference_id}/live-sessions/can-join")
 async def can_join_session(
     conference_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user_id: int = Depends(get_current_user_id)
 ):
     try:
         # Vérifier que la conférence existe
-        conference = db.query(Conference).filter(Conference.id == conference_id).first()
-        if not conference:
-            raise HTTPException(status_code=404, detail="Conférence introuvable")
+        await _ensure_conference_exists(conference_id)
         
         # Vérifier s'il y a une session active
-        active_session = db.query(LiveSession).filter(
-            LiveSession.conference_id == conference_id,
-            LiveSession.is_active == True,
-            LiveSession.status == SessionStatus.ACTIVE
-        ).first()
+        active_session = registry.get(conference_id)
         
         if not active_session:
             return {
@@ -319,13 +305,15 @@ async def can_join_session(
         # TODO: Vérifier si l'utilisateur est inscrit à la conférence
         # Pour l'instant, on autorise tous les utilisateurs connectés
         
+        # Le jeton d'accès Jitsi n'est délivré qu'après admission par le lobby
         return {
             "can_join": True,
             "session": {
-                "id": active_session.id,
-                "session_title": active_session.session_title,
-                "started_at": active_session.started_at.isoformat() if active_session.started_at else None
-            }
+                "id": active_session["id"],
+                "session_title": active_session["session_title"],
+                "started_at": active_session["started_at"]
+            },
+            "lobby_url": f"/conferences/{conference_id}/live-sessions/lobby"
         }
         
     except HTTPException:
@@ -333,25 +321,237 @@ async def can_join_session(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de la vérification: {str(e)}")
 
+# Vérification d'un jeton d'accès (hook d'authentification Jitsi) : sans base ni session utilisateur
+@router.post("/live-sessions/join-token/verify")
+async def verify_live_session_join_token(
+    token: str = Form(...),
+    room: Optional[str] = Form(None)
+):
+    try:
+        claims = verify_join_token(token, room)
+    except JoinTokenError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    return {
+        "valid": True,
+        "user_id": claims["uid"],
+        "conference_id": claims["cid"],
+        "session_id": claims["sid"],
+        "room": claims["room"],
+        "expires_at": claims["exp"]
+    }
+
+# Révoquer tous les jetons d'accès émis pour une session (incrément de son epoch)
+@router.post("/conferences/{conference_id}/live-sessions/{session_id}/revoke-tokens")
+async def revoke_live_session_tokens(
+    conference_id: int,
+    session_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        live_session = db.query(LiveSession).filter(
+            LiveSession.id == session_id,
+            LiveSession.conference_id == conference_id,
+            LiveSession.organizer_id == current_user.id
+        ).first()
+        if not live_session:
+            raise HTTPException(
+                status_code=404,
+                detail="Session introuvable ou vous n'êtes pas autorisé à la modifier"
+            )
+
+        live_session.join_epoch = LiveSession.join_epoch + 1
+        db.commit()
+        db.refresh(live_session)
+        publish_session_event("session_tokens_revoked", conference_id, live_session)
+
+        return {"id": live_session.id, "join_epoch": live_session.join_epoch}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la révocation des jetons: {str(e)}")
+
+# Lobby d'admission : au lancement d'une session, les clients prennent un ticket puis sont
+# admis progressivement au lieu de rejoindre Jitsi tous au même instant
+@router.post("/conferences/{conference_id}/live-sessions/lobby")
+async def take_lobby_ticket(
+    conference_id: int,
+    response: Response,
+    current_user_id: int = Depends(get_current_user_id)
+):
+    await _ensure_conference_exists(conference_id)
+    active_session = registry.get(conference_id)
+    if not active_session:
+        raise HTTPException(status_code=409, detail="Aucune session active pour cette conférence")
+
+    lobby = lobbies.get(conference_id, active_session["id"])
+    ticket, admit_at, position = lobby.issue(current_user_id)
+    wait = max(admit_at - time.time(), 0)
+    result = {
+        "ticket": ticket,
+        "session_id": active_session["id"],
+        "position": position,
+        "admitted": wait == 0,
+        "queue_depth": lobby.queue_depth()
+    }
+    if wait > 0:
+        result["retry_after"] = retry_after(wait)
+        response.headers["Retry-After"] = str(int(result["retry_after"]) or 1)
+    return result
+
+@router.get("/conferences/{conference_id}/live-sessions/lobby/status")
+async def get_lobby_status(
+    conference_id: int,
+    ticket: str,
+    response: Response,
+    current_user_id: int = Depends(get_current_user_id)
+):
+    active_session = registry.get(conference_id)
+    if not active_session:
+        raise HTTPException(status_code=410, detail="La session n'est plus active")
+    try:
+        claims = verify_ticket(ticket, conference_id, active_session["id"], current_user_id)
+    except LobbyTicketError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+
+    wait = claims["adm"] - time.time()
+    if wait > 0:
+        hint = retry_after(wait)
+        response.headers["Retry-After"] = str(int(hint) or 1)
+        return {"admitted": False, "position": claims["pos"], "retry_after": hint}
+    return {
+        "admitted": True,
+        "session": {
+            "id": active_session["id"],
+            "session_title": active_session["session_title"],
+            "started_at": active_session["started_at"]
+        },
+        **issue_join_token(current_user_id, conference_id, active_session)
+    }
+
+@router.get("/conferences/{conference_id}/live-sessions/lobby/metrics")
+async def get_lobby_metrics(
+    conference_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    conference = db.query(Conference).filter(
+        Conference.id == conference_id,
+        Conference.organizer_id == current_user.id
+    ).first()
+    if not conference:
+        raise HTTPException(
+            status_code=403,
+            detail="Vous devez être l'organisateur de cette conférence pour voir le lobby"
+        )
+    active_session = registry.get(conference_id)
+    lobby = lobbies.find(conference_id, active_session["id"] if active_session else None)
+    return {"conference_id": conference_id, "lobby": lobby.metrics() if lobby else None}
+
+def _require_active_session(conference_id: int, session_id: int):
+    active_session = registry.get(conference_id)
+    if not active_session or active_session["id"] != session_id:
+        raise HTTPException(status_code=409, detail="Cette session n'est pas en cours")
+
+def _session_in_conference(conference_id: int, session_id: int) -> bool:
+    db = SessionLocal()
+    try:
+        return db.query(LiveSession.id).filter(
+            LiveSession.id == session_id,
+            LiveSession.conference_id == conference_id
+        ).first() is not None
+    finally:
+        db.close()
+
+async def _session_exists(conference_id: int, session_id: int) -> bool:
+    active_session = registry.get(conference_id)
+    if active_session and active_session["id"] == session_id:
+        return True
+    return await run_in_threadpool(_session_in_conference, conference_id, session_id)
+
+# Présence des participants : les événements sont mis en tampon puis écrits par lots
+@router.post("/conferences/{conference_id}/live-sessions/{session_id}/join", status_code=status.HTTP_202_ACCEPTED)
+async def join_live_session(
+    conference_id: int,
+    session_id: int,
+    current_user_id: int = Depends(get_current_user_id)
+):
+    _require_active_session(conference_id, session_id)
+    attendance_buffer.record(JOIN, conference_id, session_id, current_user_id)
+    return {"detail": "Présence enregistrée"}
+
+@router.post("/conferences/{conference_id}/live-sessions/{session_id}/heartbeat", status_code=status.HTTP_202_ACCEPTED)
+async def heartbeat_live_session(
+    conference_id: int,
+    session_id: int,
+    current_user_id: int = Depends(get_current_user_id)
+):
+    _require_active_session(conference_id, session_id)
+    attendance_buffer.record(HEARTBEAT, conference_id, session_id, current_user_id)
+    return {"detail": "Présence enregistrée"}
+
+@router.post("/conferences/{conference_id}/live-sessions/{session_id}/leave", status_code=status.HTTP_202_ACCEPTED)
+async def leave_live_session(
+    conference_id: int,
+    session_id: int,
+    current_user_id: int = Depends(get_current_user_id)
+):
+    # Un départ est accepté même si la session vient de se terminer, mais seulement pour une
+    # session existante de cette conférence
+    if not await _session_exists(conference_id, session_id):
+        raise HTTPException(status_code=404, detail="Session introuvable")
+    attendance_buffer.record(LEAVE, conference_id, session_id, current_user_id)
+    return {"detail": "Départ enregistré"}
+
+# Temps de présence par participant (pour l'organisateur)
+@router.get("/conferences/{conference_id}/live-sessions/{session_id}/attendance")
+async def get_session_attendance(
+    conference_id: int,
+    session_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    conference = db.query(Conference).filter(
+        Conference.id == conference_id,
+        Conference.organizer_id == current_user.id
+    ).first()
+    if not conference:
+        raise HTTPException(
+            status_code=403,
+            detail="Vous devez être l'organisateur de cette conférence pour voir les présences"
+        )
+    rows = db.query(SessionAttendance, User.fullname).join(
+        User, User.id == SessionAttendance.user_id
+    ).filter(
+        SessionAttendance.session_id == session_id,
+        SessionAttendance.conference_id == conference_id
+    ).order_by(SessionAttendance.seconds.desc()).all()
+    return {
+        "session_id": session_id,
+        "attendees": [
+            {
+                "user_id": attendance.user_id,
+                "fullname": fullname,
+                "minutes": attendance.seconds // 60,
+                "seconds": attendance.seconds,
+                "joins": attendance.joins,
+                "first_seen": attendance.first_seen.isoformat(),
+                "last_seen": attendance.last_seen.isoformat(),
+                "present": attendance.present
+            }
+            for attendance, fullname in rows
+        ]
+    }
+
 @router.get("/conferences/{conference_id}/live-sessions/public")
 async def get_public_sessions(conference_id: int, db: Session = Depends(get_db)):
     sessions = db.query(LiveSession).filter(
         LiveSession.conference_id == conference_id
     ).order_by(LiveSession.session_time.asc()).all()
     return {
-        "sessions": [
-            {
-                "id": session.id,
-                "session_title": session.session_title,
-                "session_time": session.session_time.isoformat(),
-                "status": session.status,
-                "is_active": session.is_active,
-                "started_at": session.started_at.isoformat() if session.started_at else None,
-                "ended_at": session.ended_at.isoformat() if session.ended_at else None,
-                "organizer_id": session.organizer_id
-            }
-            for session in sessions
-        ]
+        "sessions": [session_snapshot(session) for session in sessions]
     }
 
 @router.delete("/conferences/{conference_id}/live-sessions/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -384,4 +584,75 @@ async def delete_live_session(
         )
     db.delete(live_session)
     db.commit()
-    return {"detail": "Session supprimée avec succès"} 
\ No newline at end of file
+    invalidate_stats(conference_id)
+    publish_session_event("session_deleted", conference_id, session_id=session_id)
+    return {"detail": "Session supprimée avec succès"}
+
+def _current_state(conference_id: int) -> dict:
+    # Session courte : on ne garde pas de connexion à la base pendant toute la durée du flux
+    db = SessionLocal()
+    try:
+        sessions = db.query(LiveSession).filter(
+            LiveSession.conference_id == conference_id
+        ).order_by(LiveSession.session_time.asc()).all()
+        active = next(
+            (s for s in sessions if s.is_active and s.status == SessionStatus.ACTIVE),
+            None
+        )
+        return {
+            "type": "state",
+            "conference_id": conference_id,
+            "active_session": session_snapshot(active),
+            "sessions": [session_snapshot(session) for session in sessions]
+        }
+    finally:
+        db.close()
+
+def _sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+# Flux SSE des changements d'état des sessions (remplace le polling de /active et /can-join)
+@router.get("/conferences/{conference_id}/live-sessions/stream")
+async def stream_live_sessions(conference_id: int, request: Request):
+    queue = broker.subscribe(conference_id)
+    initial_state = await run_in_threadpool(_current_state, conference_id)
+
+    async def events():
+        try:
+            yield _sse(initial_state)
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=LIVE_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse(event)
+        finally:
+            broker.unsubscribe(conference_id, queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+# Même flux via WebSocket
+@router.websocket("/ws/conference/{conference_id}/live-sessions")
+async def websocket_live_sessions(websocket: WebSocket, conference_id: int):
+    await websocket.accept()
+    queue = broker.subscribe(conference_id)
+
+    async def forward():
+        await websocket.send_json(await run_in_threadpool(_current_state, conference_id))
+        while True:
+            await websocket.send_json(await queue.get())
+
+    sender = asyncio.create_task(forward())
+    try:
+        # La lecture sert uniquement à détecter la déconnexion du client
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        broker.unsubscribe(conference_id, queue)
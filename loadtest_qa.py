@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Test de charge du Q&A : ouvre N clients WebSocket par salle, dont M émetteurs qui publient à
+un débit donné, puis mesure la latence de bout en bout (envoi -> réception par chaque client),
+les messages perdus et la mémoire du serveur. Les résultats sont écrits en JSON pour comparer
+les exécutions d'un commit à l'autre.
+
+Par défaut une instance de l'application est démarrée localement (uvicorn) ; avec --url le
+test vise une instance déjà lancée (--server-pid pour suivre sa mémoire).
+
+Usage : DATABASE_URL=postgresql://... python loadtest_qa.py --rooms 1 --clients 1000 --senders 10 --rate 2 --duration 30
+(JOIN_TOKEN_SECRET et LOBBY_TICKET_SECRET sont générés s'ils ne sont pas définis)
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import resource
+import secrets
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import requests
+import websockets
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Configuration
+HOST = "127.0.0.1"
+DEFAULT_PORT = 8110
+STARTUP_TIMEOUT = 30
+# Secrets obligatoires au démarrage (voir utils/join_tokens, utils/lobby) : générés pour le
+# test s'ils ne sont pas définis, partagés par les instances lancées
+TEST_SECRETS = {
+    "JOIN_TOKEN_SECRET": os.getenv("JOIN_TOKEN_SECRET") or secrets.token_hex(32),
+    "LOBBY_TICKET_SECRET": os.getenv("LOBBY_TICKET_SECRET") or secrets.token_hex(32),
+}
+# Connexions ouvertes en parallèle pendant la montée en charge
+CONNECT_CONCURRENCY = 200
+MEMORY_SAMPLE_INTERVAL = 0.5
+MESSAGE_PREFIX = "lt"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Test de charge du Q&A (WebSocket)")
+    parser.add_argument("--rooms", type=int, default=1, help="nombre de salles (conférences)")
+    parser.add_argument("--first-conference", type=int, default=1, help="identifiant de la première conférence")
+    parser.add_argument("--clients", type=int, default=100, help="clients par salle")
+    parser.add_argument("--senders", type=int, default=5, help="émetteurs par salle (parmi les clients)")
+    parser.add_argument("--rate", type=float, default=1.0, help="messages par seconde par émetteur")
+    parser.add_argument("--duration", type=float, default=20.0, help="durée d'émission (secondes)")
+    parser.add_argument("--drain", type=float, default=5.0, help="attente des derniers messages (secondes)")
+    parser.add_argument("--batch", choices=("json", "msgpack"), help="mode groupé des clients")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--url", help="instance existante (ex. ws://127.0.0.1:8001) au lieu d'en démarrer une")
+    parser.add_argument("--server-pid", type=int, help="processus de l'instance existante (mémoire)")
+    parser.add_argument("--output", help="fichier JSON des résultats")
+    return parser.parse_args()
+
+# --- Serveur ---
+
+def start_instance(args):
+    """
+    Démarre une instance uvicorn. Les limites de débit par connexion sont relevées (sauf si
+    déjà définies) pour que les émetteurs ne soient pas limités au débit demandé.
+    """
+    env = dict(os.environ, **TEST_SECRETS)
+    env.setdefault("QA_CONNECTION_RATE", str(max(args.rate * 2, 2)))
+    env.setdefault("QA_CONNECTION_BURST", str(max(int(args.rate * 4), 10)))
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", HOST, "--port", str(args.port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+    )
+
+def wait_until_ready(port):
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        try:
+            requests.get(f"http://{HOST}:{port}/docs", timeout=1)
+            return True
+        except requests.RequestException:
+            time.sleep(0.5)
+    return False
+
+def rss_mb(pid):
+    """Mémoire résidente d'un processus (Linux), None si indisponible"""
+    if pid is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+    return None
+
+async def sample_memory(pid, samples, stop):
+    while not stop.is_set():
+        value = rss_mb(pid)
+        if value is not None:
+            samples.append(value)
+        try:
+            await asyncio.wait_for(stop.wait(), MEMORY_SAMPLE_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+# --- Clients ---
+
+class Client:
+    """Un client simulé : compte les messages de test reçus et leur latence"""
+
+    def __init__(self, room, index):
+        self.room = room
+        self.index = index
+        self.ws = None
+        self.received = set()
+        self.latencies = []
+        self.errors = {}
+        self.closed_code = None
+
+    def on_message(self, message):
+        if message.startswith(MESSAGE_PREFIX + ":"):
+            _, sender, seq, sent_ns = message.split(":", 3)
+            key = (sender, int(seq))
+            if key not in self.received:
+                self.received.add(key)
+                self.latencies.append((time.time_ns() - int(sent_ns)) / 1e6)
+            return
+        if message.startswith("{"):
+            frame = json.loads(message)
+            if frame.get("type") == "ping":
+                asyncio.create_task(self.ws.send(json.dumps({"type": "pong"})))
+            elif frame.get("type") == "error":
+                code = frame.get("code", "error")
+                self.errors[code] = self.errors.get(code, 0) + 1
+
+    async def listen(self, batch):
+        try:
+            async for frame in self.ws:
+                if batch is None:
+                    self.on_message(frame)
+                else:
+                    messages = msgpack.unpackb(frame) if isinstance(frame, bytes) else json.loads(frame)
+                    for message in messages:
+                        self.on_message(message)
+        except websockets.ConnectionClosed as e:
+            self.closed_code = e.rcvd.code if e.rcvd else None
+
+async def connect_clients(base_url, args):
+    clients = []
+    failures = 0
+    semaphore = asyncio.Semaphore(CONNECT_CONCURRENCY)
+    query = f"?batch={args.batch}" if args.batch else ""
+
+    async def connect(room, index):
+        nonlocal failures
+        client = Client(room, index)
+        async with semaphore:
+            try:
+                client.ws = await websockets.connect(
+                    f"{base_url}/ws/conference/{room}/qa{query}", ping_interval=None, open_timeout=30
+                )
+            except Exception:
+                failures += 1
+                return
+        clients.append(client)
+
+    rooms = range(args.first_conference, args.first_conference + args.rooms)
+    await asyncio.gather(*(connect(room, index) for room in rooms for index in range(args.clients)))
+    return clients, failures
+
+async def run_sender(client, args, sent, stop_at):
+    interval = 1.0 / args.rate
+    seq = 0
+    next_send = time.monotonic()
+    name = f"{client.room}-{client.index}"
+    while time.monotonic() < stop_at:
+        try:
+            await client.ws.send(f"{MESSAGE_PREFIX}:{name}:{seq}:{time.time_ns()}")
+        except websockets.ConnectionClosed:
+            return
+        sent[client.room] = sent.get(client.room, 0) + 1
+        seq += 1
+        next_send += interval
+        await asyncio.sleep(max(0.0, next_send - time.monotonic()))
+
+def percentile(values, p):
+    if not values:
+        return None
+    # Rang le plus proche
+    index = min(len(values) - 1, max(0, math.ceil(p / 100 * len(values)) - 1))
+    return round(values[index], 2)
+
+async def run_load(base_url, args, server_pid):
+    memory = {"before": rss_mb(server_pid)}
+    started = time.monotonic()
+    clients, failures = await connect_clients(base_url, args)
+    connect_seconds = round(time.monotonic() - started, 2)
+    memory["connected"] = rss_mb(server_pid)
+    print(f"✅ {len(clients)} clients connectés en {connect_seconds} s ({failures} échecs)")
+
+    listeners = [asyncio.create_task(client.listen(args.batch)) for client in clients]
+    samples = []
+    stop_sampling = asyncio.Event()
+    sampler = asyncio.create_task(sample_memory(server_pid, samples, stop_sampling))
+
+    # Historique et questions reçus à la connexion : on laisse passer avant de mesurer
+    await asyncio.sleep(1)
+    by_room = {}
+    for client in clients:
+        by_room.setdefault(client.room, []).append(client)
+    senders = [client for room_clients in by_room.values() for client in room_clients[:args.senders]]
+    sent = {}
+    stop_at = time.monotonic() + args.duration
+    print(f"📤 {len(senders)} émetteurs à {args.rate} msg/s pendant {args.duration} s")
+    await asyncio.gather(*(run_sender(client, args, sent, stop_at) for client in senders))
+    await asyncio.sleep(args.drain)
+
+    stop_sampling.set()
+    await sampler
+    memory["peak"] = max(samples) if samples else None
+    memory["after"] = rss_mb(server_pid)
+    for client in clients:
+        await client.ws.close()
+    for listener in listeners:
+        listener.cancel()
+
+    expected = sum(sent.get(client.room, 0) for client in clients)
+    delivered = sum(len(client.received) for client in clients)
+    latencies = sorted(latency for client in clients for latency in client.latencies)
+    errors = {}
+    for client in clients:
+        for code, count in client.errors.items():
+            errors[code] = errors.get(code, 0) + count
+    closed = sum(1 for client in clients if client.closed_code is not None)
+
+    return {
+        "connections": {"opened": len(clients), "failed": failures, "seconds": connect_seconds,
+                        "closed_by_server": closed},
+        "messages": {
+            "sent": sum(sent.values()),
+            "expected_deliveries": expected,
+            "delivered": delivered,
+            "dropped": expected - delivered,
+            "drop_rate": round((expected - delivered) / expected, 6) if expected else 0.0,
+            "server_errors": errors,
+        },
+        "latency_ms": {
+            "count": len(latencies),
+            "min": round(latencies[0], 2) if latencies else None,
+            "p50": percentile(latencies, 50),
+            "p90": percentile(latencies, 90),
+            "p99": percentile(latencies, 99),
+            "p999": percentile(latencies, 99.9),
+            "max": round(latencies[-1], 2) if latencies else None,
+            "mean": round(sum(latencies) / len(latencies), 2) if latencies else None,
+        },
+        "server_memory_mb": memory,
+    }
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def raise_open_files_limit(needed):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        if target < needed:
+            print(f"⚠️  Limite de fichiers ouverts à {target} : certains clients ne pourront pas se connecter")
+
+def main():
+    args = parse_args()
+    if args.batch == "msgpack" and msgpack is None:
+        print("❌ msgpack n'est pas installé (pip install msgpack)")
+        return 1
+    if args.senders > args.clients:
+        print("❌ --senders doit être inférieur ou égal à --clients")
+        return 1
+
+    print("🚀 Test de charge du Q&A")
+    print("=" * 50)
+    raise_open_files_limit(args.rooms * args.clients + 256)
+
+    process = None
+    server_pid = args.server_pid
+    base_url = args.url.rstrip("/") if args.url else f"ws://{HOST}:{args.port}"
+    if not args.url:
+        process = start_instance(args)
+        server_pid = process.pid
+        if not wait_until_ready(args.port):
+            print(f"❌ L'instance sur le port {args.port} n'a pas démarré")
+            process.terminate()
+            return 1
+        print(f"✅ Instance prête sur le port {args.port}")
+
+    try:
+        results = asyncio.run(run_load(base_url, args, server_pid))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "config": {
+            "rooms": args.rooms,
+            "clients_per_room": args.clients,
+            "senders_per_room": args.senders,
+            "rate_per_sender": args.rate,
+            "duration": args.duration,
+            "batch": args.batch,
+        },
+        **results,
+    }
+    output = args.output or f"loadtest_qa_{datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    latency = report["latency_ms"]
+    print(f"📊 Latence (ms) p50={latency['p50']} p99={latency['p99']} max={latency['max']}")
+    print(f"📉 Messages perdus : {report['messages']['dropped']} / {report['messages']['expected_deliveries']}")
+    print(f"💾 Mémoire serveur (Mo) : {report['server_memory_mb']}")
+    print(f"\n✅ Résultats écrits dans {output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
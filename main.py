@@ -1,4 +1,4 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.utils import get_openapi  
 from auth import router as auth_router
@@ -10,14 +10,27 @@ from stats import router as stats_router
 from reviewers import router as review_router 
 from conference import router as conference_router
 from profile import router as profile_router
-from database import Base, engine  # Ajout de l'import de Base et engine
+from database import Base, engine, SessionLocal  # Ajout de l'import de Base et engine
 from registration import router as registration_router
 from payment import router as payment_router
 from certificate import router as certificate_router
 from qa import router as qa_router  # <-- Ajout du router Q&A
 from live_sessions import router as live_sessions_router  # <-- Ajout du router des sessions live
-from typing import List
-from pywebpush import webpush, WebPushException
+from presence import router as presence_router
+from notifications import router as notifications_router
+from emails import router as emails_router
+from utils.pubsub import pubsub
+from utils.live_state import start_live_state
+from utils.live_scheduler import scheduler as live_scheduler, start_live_scheduler
+from utils.attendance import attendance_buffer
+from utils.presence import presence
+from utils.qa_history import qa_history
+from utils.qa_rooms import qa_rooms
+from utils.qa_questions import question_board
+from utils.push_delivery import push_worker
+from utils.email_outbox import email_worker
+from utils.join_tokens import check_join_token_secret
+from utils.lobby import check_lobby_ticket_secret
 
 # Créer les tables au démarrage
 Base.metadata.create_all(bind=engine)
@@ -61,6 +74,44 @@ app.include_router(payment_router, tags=["Payment"])
 app.include_router(certificate_router, tags=["Certificates"])
 app.include_router(qa_router, tags=["Q&A"])
 app.include_router(live_sessions_router, tags=["Live Sessions"])  # <-- Ajout du router des sessions live
+app.include_router(presence_router, tags=["Presence"])
+app.include_router(notifications_router, tags=["Notifications"])
+app.include_router(emails_router, tags=["Emails"])
+
+# Services d'arrière-plan : canal pub/sub entre workers, registre des sessions actives,
+# planificateur des lancements / arrêts automatiques, écriture groupée des présences,
+# compteurs de personnes en ligne, salles (nettoyage des connexions), historique et
+# questions Q&A, envoi des notifications push et des emails
+@app.on_event("startup")
+async def start_background_services():
+    check_join_token_secret()
+    check_lobby_ticket_secret()
+    await pubsub.start()
+    await attendance_buffer.start()
+    await presence.start()
+    await qa_history.start()
+    await qa_rooms.start()
+    await question_board.start()
+    await push_worker.start()
+    await email_worker.start()
+    db = SessionLocal()
+    try:
+        start_live_state(db)
+        await start_live_scheduler(db)
+    finally:
+        db.close()
+
+@app.on_event("shutdown")
+async def stop_background_services():
+    await live_scheduler.stop()
+    await attendance_buffer.stop()
+    await presence.stop()
+    await qa_history.stop()
+    await question_board.stop()
+    await qa_rooms.stop()
+    await push_worker.stop()
+    await email_worker.stop()
+    await pubsub.stop()
 
 # Custom OpenAPI schema for JWT
 def custom_openapi():
@@ -95,29 +146,16 @@ app.openapi = custom_openapi
 async def root():
     return {"message": "Bienvenue sur l'API d'authentification"}
 
-subscriptions: List[dict] = []
-
-@app.post("/api/save-subscription")
-async def save_subscription(request: Request):
-    data = await request.json()
-    subscriptions.append(data)
-    return {"message": "Subscription saved"}
-
-@app.post("/api/send-notification")
-async def send_notification():
-    for sub in subscriptions:
-        try:
-            webpush(
-                subscription_info=sub,
-                data="Ceci est une notification push !",
-                vapid_private_key=VAPID_PRIVATE_KEY,
-                vapid_claims={"sub": "mailto:admin@example.com"}
-            )
-        except WebPushException as ex:
-            print("Erreur d'envoi:", ex)
-    return {"message": "Notifications envoyées"}
-
-VAPID_PUBLIC_KEY = "BD-3sYib-nb1LbZtOBDj7fwoAIRXwGgIcG_gNDfmCdA5pWrAN0rQmjTdUG3MJjPKN-1P2dBslItR-67AbCeq0sI"
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8001, reload=False)
+    # Trames WebSocket plus grosses refusées par le serveur avant même d'être lues en entier
+    # (16 Mo par défaut) ; les limites Q&A plus fines sont dans utils.qa_limits.
+    # Compression permessage-deflate proposée aux clients qui la négocient.
+    # Pings du protocole WebSocket : une connexion qui n'y répond pas en WS_PING_TIMEOUT
+    # secondes est fermée (détection des clients disparus, y compris ceux qui ne font qu'écouter).
+    uvicorn.run(
+        "main:app", host="0.0.0.0", port=8001, reload=False,
+        ws_max_size=64 * 1024, ws_per_message_deflate=True,
+        ws_ping_interval=float(os.getenv("WS_PING_INTERVAL", "20")),
+        ws_ping_timeout=float(os.getenv("WS_PING_TIMEOUT", "20"))
+    )
@@ -15,13 +15,15 @@ class LiveSession(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     session_title = Column(String(200), nullable=False)
-    session_time = Column(DateTime, nullable=False)
+    session_time = Column(DateTime, nullable=False)  # UTC
     conference_id = Column(Integer, ForeignKey('conferences.id'), nullable=False)
     organizer_id = Column(Integer, ForeignKey('users.id'), nullable=False)  # Organisateur qui lance la session
     status = Column(Enum(SessionStatus), default=SessionStatus.PENDING, nullable=False)
     started_at = Column(DateTime, nullable=True)  # Quand la session a été lancée
     ended_at = Column(DateTime, nullable=True)    # Quand la session s'est terminée
     is_active = Column(Boolean, default=False)    # Session actuellement active
+    auto_started = Column(Boolean, default=False, server_default="false", nullable=False)  # Lancée par le planificateur
+    join_epoch = Column(Integer, default=0, server_default="0", nullable=False)  # Incrémenté pour révoquer les jetons d'accès
 
     # Relationships
     conference = relationship("Conference")
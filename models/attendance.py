@@ -0,0 +1,31 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, ForeignKey, Index
+from database import Base
+from datetime import datetime
+
+# Journal brut des événements de présence (join / heartbeat / leave), écrit par lots
+class AttendanceEvent(Base):
+    __tablename__ = "attendance_events"
+
+    id = Column(BigInteger, primary_key=True)
+    session_id = Column(Integer, ForeignKey('live_sessions.id', ondelete="CASCADE"), nullable=False)
+    conference_id = Column(Integer, ForeignKey('conferences.id', ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete="CASCADE"), nullable=False)
+    event_type = Column(String(16), nullable=False)
+    occurred_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_attendance_events_session_user", "session_id", "user_id", "occurred_at"),
+    )
+
+# Temps de présence cumulé par participant et par session
+class SessionAttendance(Base):
+    __tablename__ = "session_attendance"
+
+    session_id = Column(Integer, ForeignKey('live_sessions.id', ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete="CASCADE"), primary_key=True)
+    conference_id = Column(Integer, ForeignKey('conferences.id', ondelete="CASCADE"), nullable=False, index=True)
+    first_seen = Column(DateTime, nullable=False)
+    last_seen = Column(DateTime, nullable=False)
+    seconds = Column(Integer, nullable=False, default=0, server_default="0")
+    joins = Column(Integer, nullable=False, default=0, server_default="0")
+    present = Column(Boolean, nullable=False, default=False, server_default="false")
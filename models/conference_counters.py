@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from database import Base
+from datetime import datetime
+
+# Compteurs incrémentaux par conférence, maintenus par les listeners de utils/counters.py
+class ConferenceCounters(Base):
+    __tablename__ = "conference_counters"
+
+    conference_id = Column(Integer, ForeignKey('conferences.id', ondelete="CASCADE"), primary_key=True)
+    abstracts = Column(Integer, nullable=False, default=0, server_default="0")
+    oral_accepted = Column(Integer, nullable=False, default=0, server_default="0")
+    poster_accepted = Column(Integer, nullable=False, default=0, server_default="0")
+    rejected = Column(Integer, nullable=False, default=0, server_default="0")
+    reviews = Column(Integer, nullable=False, default=0, server_default="0")
+    reviewers = Column(Integer, nullable=False, default=0, server_default="0")
+    participants = Column(Integer, nullable=False, default=0, server_default="0")  # inscriptions payées
+    cert_participants = Column(Integer, nullable=False, default=0, server_default="0")
+    cert_speakers = Column(Integer, nullable=False, default=0, server_default="0")
+    cert_reviewers = Column(Integer, nullable=False, default=0, server_default="0")
+    sessions_total = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -13,6 +13,8 @@ class Payment(Base):
     paid_at = Column(DateTime, default=datetime.utcnow)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     conference_id = Column(Integer, ForeignKey('conferences.id'), nullable=False)
+    # Événement Stripe à l'origine de la ligne : un webhook redélivré n'est compté qu'une fois
+    stripe_event_id = Column(String(255), unique=True, nullable=True)
 
     # Relationships
     user = relationship("User")
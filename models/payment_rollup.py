@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, Float, Date, DateTime, ForeignKey
+from database import Base
+from datetime import datetime
+
+# Totaux journaliers des paiements par conférence, mis à jour dans la même transaction que le webhook Stripe
+class PaymentDailyRollup(Base):
+    __tablename__ = "payment_daily_rollups"
+
+    conference_id = Column(Integer, ForeignKey('conferences.id', ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    payments_count = Column(Integer, nullable=False, default=0, server_default="0")
+    amount_total = Column(Float, nullable=False, default=0, server_default="0")
+    refunds_count = Column(Integer, nullable=False, default=0, server_default="0")
+    refunds_total = Column(Float, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
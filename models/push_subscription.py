@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from database import Base
+from datetime import datetime
+
+# Abonnements Web Push, un par endpoint de navigateur (clé : empreinte SHA-256 de l'endpoint)
+class PushSubscription(Base):
+    __tablename__ = "push_subscriptions"
+
+    endpoint_hash = Column(String(64), primary_key=True)
+    endpoint = Column(Text, nullable=False)
+    p256dh = Column(String(255), nullable=False)
+    auth = Column(String(255), nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete="SET NULL"), nullable=True, index=True)
+    conference_id = Column(Integer, ForeignKey('conferences.id', ondelete="SET NULL"), nullable=True, index=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Sujets suivis par un abonnement ("conference:12", "session:34", "role:ORGANIZER") ; la clé
+# primaire (topic, endpoint_hash) sert d'index pour lister les abonnés d'un sujet
+class PushTopicSubscription(Base):
+    __tablename__ = "push_topic_subscriptions"
+
+    topic = Column(String(100), primary_key=True)
+    endpoint_hash = Column(String(64), ForeignKey('push_subscriptions.endpoint_hash', ondelete="CASCADE"), primary_key=True, index=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
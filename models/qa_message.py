@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, BigInteger, Text, DateTime, ForeignKey, Index
+from database import Base
+from datetime import datetime
+
+# Historique des messages Q&A d'une conférence, écrit par lots
+class QAMessage(Base):
+    __tablename__ = "qa_messages"
+
+    id = Column(BigInteger, primary_key=True)
+    conference_id = Column(Integer, ForeignKey('conferences.id', ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete="SET NULL"), nullable=True)
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_qa_messages_conference_id_id", "conference_id", "id"),
+    )
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey
+from database import Base
+from datetime import datetime
+
+# Questions Q&A classées par votes ; instantané périodique de l'index en mémoire
+class QAQuestion(Base):
+    __tablename__ = "qa_questions"
+
+    id = Column(String(32), primary_key=True)
+    conference_id = Column(Integer, ForeignKey('conferences.id', ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete="SET NULL"), nullable=True)
+    content = Column(Text, nullable=False)
+    votes = Column(Integer, nullable=False, default=0, server_default="0")
+    answered = Column(Boolean, nullable=False, default=False, server_default="false")
+    hidden = Column(Boolean, nullable=False, default=False, server_default="false")
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Un vote par utilisateur et par question
+class QAQuestionVote(Base):
+    __tablename__ = "qa_question_votes"
+
+    question_id = Column(String(32), ForeignKey('qa_questions.id', ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete="CASCADE"), primary_key=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
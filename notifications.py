@@ -0,0 +1,170 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from database import get_db
+from auth import get_current_user, user_id_from_token
+from models.users import User, UserRole
+from models.conferences import Conference
+from models.LiveSession import LiveSession
+from models.push_subscription import PushSubscription
+from utils.push import (
+    upsert_subscription, subscribe_topics, unsubscribe_topics, validate_topics, endpoint_hash,
+    conference_topic, role_topic, SubscriptionError, VAPID_PRIVATE_KEY
+)
+from utils.push_delivery import push_worker
+
+router = APIRouter()
+
+def _optional_user_id(authorization: Optional[str]) -> Optional[int]:
+    return user_id_from_token(authorization.replace("Bearer ", "")) if authorization else None
+
+async def _json_body(request: Request) -> dict:
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Corps de requête JSON attendu")
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Objet JSON attendu")
+    return data
+
+# Abonnement Web Push du navigateur. Le jeton d'accès (facultatif) rattache l'abonnement à
+# l'utilisateur et l'abonne au sujet de son rôle ; `conference_id` (facultatif) l'abonne au
+# sujet de la conférence.
+@router.post("/api/save-subscription")
+async def save_subscription(
+    request: Request,
+    conference_id: Optional[int] = None,
+    authorization: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    data = await _json_body(request)
+    user_id = _optional_user_id(authorization)
+    if conference_id is None and isinstance(data.get("conference_id"), int):
+        conference_id = data["conference_id"]
+    try:
+        key = upsert_subscription(db, data, user_id=user_id, conference_id=conference_id)
+    except SubscriptionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    topics = []
+    if conference_id is not None:
+        topics.append(conference_topic(conference_id))
+    if user_id is not None:
+        role = db.query(User.role).filter(User.id == user_id).scalar()
+        if role is not None:
+            topics.append(role_topic(role))
+    if topics:
+        subscribe_topics(db, key, topics)
+        db.commit()
+    return {"message": "Subscription saved", "topics": topics}
+
+def _topic_request(data: dict, db: Session):
+    endpoint = data.get("endpoint")
+    if not isinstance(endpoint, str):
+        raise HTTPException(status_code=400, detail="Endpoint d'abonnement manquant")
+    try:
+        topics = validate_topics(data.get("topics"))
+    except SubscriptionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    key = endpoint_hash(endpoint)
+    if db.query(PushSubscription.endpoint_hash).filter(PushSubscription.endpoint_hash == key).first() is None:
+        raise HTTPException(status_code=404, detail="Abonnement introuvable")
+    return key, topics
+
+# Sujets suivis par un navigateur : {"endpoint": "...", "topics": ["conference:3", "session:12"]}
+# Les sujets de rôle (role:ORGANIZER...) sont réservés aux utilisateurs de ce rôle.
+@router.post("/api/push/topics")
+async def subscribe_push_topics(
+    request: Request,
+    authorization: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    data = await _json_body(request)
+    key, topics = _topic_request(data, db)
+    role_topics = [t for t in topics if t.startswith("role:")]
+    if role_topics:
+        user_id = _optional_user_id(authorization)
+        role = db.query(User.role).filter(User.id == user_id).scalar() if user_id is not None else None
+        if role is None or role_topics != [role_topic(role)]:
+            raise HTTPException(status_code=403, detail="Sujet de rôle non autorisé")
+    subscribe_topics(db, key, topics)
+    db.commit()
+    return {"message": "Sujets enregistrés", "topics": topics}
+
+# Retrait de sujets : comme pour l'abonnement, seul le navigateur connaît l'URL de son
+# endpoint, qui suffit à l'identifier ; aucun jeton n'est demandé
+@router.post("/api/push/topics/unsubscribe")
+async def unsubscribe_push_topics(
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    data = await _json_body(request)
+    key, topics = _topic_request(data, db)
+    removed = unsubscribe_topics(db, key, topics)
+    return {"message": "Sujets retirés", "removed": removed}
+
+def _check_send_topics(db: Session, current_user: User, topics: List[str]):
+    """
+    Un administrateur envoie à qui il veut ; un organisateur seulement aux sujets de ses
+    conférences (conference:N, session:N d'une session de ces conférences)
+    """
+    if current_user.role == UserRole.ADMIN:
+        return
+    if current_user.role != UserRole.ORGANIZER:
+        raise HTTPException(status_code=403, detail="Réservé aux organisateurs et administrateurs.")
+    if not topics:
+        raise HTTPException(status_code=403, detail="L'envoi à tous les abonnés est réservé aux administrateurs.")
+    for topic in topics:
+        kind, _, value = topic.partition(":")
+        if kind == "conference":
+            conference_id = int(value)
+        elif kind == "session":
+            conference_id = db.query(LiveSession.conference_id).filter(LiveSession.id == int(value)).scalar()
+        else:
+            conference_id = None
+        if conference_id is None or db.query(Conference.id).filter(
+            Conference.id == conference_id,
+            Conference.organizer_id == current_user.id
+        ).first() is None:
+            raise HTTPException(
+                status_code=403,
+                detail=f"Vous devez être l'organisateur de la conférence pour envoyer au sujet {topic}"
+            )
+
+# Envoi en arrière-plan aux abonnés des sujets `topic` (paramètre répétable) ou de la
+# conférence `conference_id`, à tous sinon (administrateurs uniquement). La réponse est
+# immédiate, la progression se suit avec GET /api/notifications/jobs/{job_id}
+@router.post("/api/send-notification", status_code=status.HTTP_202_ACCEPTED)
+async def send_notification(
+    conference_id: Optional[int] = None,
+    topic: Optional[List[str]] = Query(None),
+    message: str = "Ceci est une notification push !",
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    topics = list(topic or [])
+    if conference_id is not None:
+        topics.append(conference_topic(conference_id))
+    if topics:
+        try:
+            topics = validate_topics(topics)
+        except SubscriptionError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    _check_send_topics(db, current_user, topics)
+    if not VAPID_PRIVATE_KEY:
+        raise HTTPException(status_code=503, detail="Notifications push non configurées (VAPID_PRIVATE_KEY)")
+    job = push_worker.submit(message, topics=topics or None, submitted_by=current_user.id)
+    return {
+        "message": "Envoi des notifications démarré",
+        "job_id": job.id,
+        "progress_url": f"/api/notifications/jobs/{job.id}"
+    }
+
+# Progression d'un envoi : visible par son auteur et par les administrateurs
+@router.get("/api/notifications/jobs/{job_id}")
+async def get_notification_job(job_id: str, current_user: User = Depends(get_current_user)):
+    progress = push_worker.get(job_id)
+    if progress is None or (
+        current_user.role != UserRole.ADMIN and progress.get("submitted_by") != current_user.id
+    ):
+        raise HTTPException(status_code=404, detail="Envoi introuvable")
+    return progress
@@ -2,11 +2,16 @@ import os
 import stripe
 from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
 from models.payment import Payment
 from models.registration import Registration
 from models.users import User
 from database import get_db
 from auth import get_current_user
+from utils.stats_cache import invalidate_stats
+from utils.revenue import record_payment, COMPLETED_STATUS, REFUNDED_STATUS
+from utils.push import conference_topic, subscribe_user_to_topic
+from utils.push_delivery import notify
 from datetime import datetime
 
 router = APIRouter()
@@ -46,10 +51,29 @@ def create_payment_session(registration_id: int, db: Session = Depends(get_db),
             "registration_id": registration.id,
             "user_id": current_user.id,
             "conference_id": conference.id
+        },
+        # Recopié sur le PaymentIntent (et sa Charge) pour retrouver la conférence lors d'un remboursement
+        payment_intent_data={
+            "metadata": {
+                "registration_id": registration.id,
+                "user_id": current_user.id,
+                "conference_id": conference.id
+            }
         }
     )
     return {"checkout_url": session.url}
 
+def _commit_once(db: Session, event_id) -> bool:
+    # Deux livraisons simultanées du même événement : la contrainte unique sur
+    # stripe_event_id fait échouer la seconde, qui est annulée en entier
+    try:
+        db.commit()
+        return True
+    except IntegrityError:
+        db.rollback()
+        print(f"🔁 Webhook {event_id} already processed")
+        return False
+
 @router.post("/payments/webhook")
 async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
     payload = await request.body()
@@ -66,6 +90,13 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
         print(f"❌ Webhook error: {e}")
         return {"status": "error", "message": str(e)}
 
+    # Stripe livre chaque événement au moins une fois : une redélivrance ne doit ni recréer le
+    # paiement ni recompter les totaux journaliers
+    event_id = event.get('id')
+    if event_id and db.query(Payment.id).filter(Payment.stripe_event_id == event_id).first():
+        print(f"🔁 Webhook {event_id} already processed")
+        return {"status": "duplicate"}
+
     # Gère le paiement réussi
     if event['type'] == 'checkout.session.completed':
         session = event['data']['object']
@@ -79,26 +110,65 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
 
         # Met à jour l'inscription
         registration = db.query(Registration).filter_by(id=registration_id).first()
+        became_paid = False
         if registration:
             print(f"📝 Updating registration {registration_id} from '{registration.status}' to 'paid'")
+            became_paid = registration.status != 'paid'
             registration.status = 'paid'
             registration.updated_at = datetime.utcnow()
-            db.commit()
-            print(f"✅ Registration {registration_id} updated successfully")
+            if became_paid:
+                # Les navigateurs du participant suivent désormais la conférence
+                subscribe_user_to_topic(db, registration.user_id, conference_topic(registration.conference_id))
         else:
             print(f"❌ Registration {registration_id} not found!")
 
-        # Crée un paiement
+        # Crée un paiement et met à jour le total journalier dans la même transaction
+        paid_at = datetime.utcnow()
         payment = Payment(
             amount=amount,
             payment_method='stripe',
-            payment_status='completed',
-            paid_at=datetime.utcnow(),
+            payment_status=COMPLETED_STATUS,
+            paid_at=paid_at,
             user_id=user_id,
-            conference_id=conference_id
+            conference_id=conference_id,
+            stripe_event_id=event_id
         )
         db.add(payment)
-        db.commit()
+        record_payment(db, conference_id, amount, paid_at)
+        if not _commit_once(db, event_id):
+            return {"status": "duplicate"}
+        invalidate_stats(conference_id)
         print(f"✅ Payment record created for user {user_id}, conference {conference_id}")
+        if became_paid:
+            notify(
+                f"Votre inscription à « {registration.conference.title} » est confirmée",
+                user_id=registration.user_id
+            )
+
+    # Gère les remboursements complets (les remboursements partiels ne sont pas suivis)
+    elif event['type'] == 'charge.refunded':
+        charge = event['data']['object']
+        metadata = charge.get('metadata') or {}
+        user_id = metadata.get('user_id')
+        conference_id = metadata.get('conference_id')
+        if not charge.get('refunded') or not user_id or not conference_id:
+            print(f"⚠️ Refund ignored for charge {charge.get('id')}")
+            return {"status": "ignored"}
+
+        amount = charge['amount_refunded'] / 100
+        refunded_at = datetime.utcnow()
+        db.add(Payment(
+            amount=amount,
+            payment_method='stripe',
+            payment_status=REFUNDED_STATUS,
+            paid_at=refunded_at,
+            user_id=user_id,
+            conference_id=conference_id,
+            stripe_event_id=event_id
+        ))
+        record_payment(db, conference_id, amount, refunded_at, refund=True)
+        if not _commit_once(db, event_id):
+            return {"status": "duplicate"}
+        print(f"↩️ Refund recorded for user {user_id}, conference {conference_id}, amount {amount}")
 
     return {"status": "success"} 
\ No newline at end of file
@@ -0,0 +1,94 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from auth import get_current_user_id
+from database import SessionLocal
+from models.conferences import Conference
+from utils.live_state import registry
+from utils.presence import presence
+import asyncio
+import json
+import os
+
+router = APIRouter()
+
+# Salles suivies : présence dans une session live ou dans le Q&A d'une conférence
+ROOM_KINDS = ("session", "qa")
+
+# Intervalle (secondes) des commentaires keep-alive envoyés sur le flux SSE
+PRESENCE_STREAM_KEEPALIVE = float(os.getenv("PRESENCE_STREAM_KEEPALIVE", "15"))
+
+def _room(kind: str, room_id: int) -> str:
+    if kind not in ROOM_KINDS:
+        raise HTTPException(status_code=404, detail="Type de salle inconnu")
+    return f"{kind}:{room_id}"
+
+def _conference_exists(conference_id: int) -> bool:
+    db = SessionLocal()
+    try:
+        return db.query(Conference.id).filter(Conference.id == conference_id).first() is not None
+    finally:
+        db.close()
+
+async def _require_room(kind: str, room_id: int) -> str:
+    """
+    Salle d'un signal de présence : session en cours ou conférence existante (chaque salle
+    suivie occupe de la mémoire, elle ne peut pas être créée pour n'importe quel identifiant)
+    """
+    room = _room(kind, room_id)
+    if kind == "session":
+        if not registry.session_active(room_id):
+            raise HTTPException(status_code=409, detail="Cette session n'est pas en cours")
+    elif not registry.knows_conference(room_id):
+        if not await run_in_threadpool(_conference_exists, room_id):
+            raise HTTPException(status_code=404, detail="Conférence introuvable")
+        registry.add_conference(room_id)
+    return room
+
+# Signal de présence, à envoyer toutes les ~15 secondes par le client
+@router.post("/presence/{kind}/{room_id}/heartbeat")
+async def presence_heartbeat(
+    kind: str,
+    room_id: int,
+    current_user_id: int = Depends(get_current_user_id)
+):
+    room = await _require_room(kind, room_id)
+    presence.heartbeat(room, current_user_id)
+    return {**presence.snapshot(room), "ttl": presence.ttl}
+
+@router.post("/presence/{kind}/{room_id}/leave", status_code=status.HTTP_204_NO_CONTENT)
+async def presence_leave(
+    kind: str,
+    room_id: int,
+    current_user_id: int = Depends(get_current_user_id)
+):
+    presence.leave(_room(kind, room_id), current_user_id)
+
+# Lecture des compteurs : en mémoire, sans accès à la base
+@router.get("/presence/{kind}/{room_id}")
+async def get_presence(kind: str, room_id: int):
+    return presence.snapshot(_room(kind, room_id))
+
+# Flux SSE des changements du nombre de personnes en ligne
+@router.get("/presence/{kind}/{room_id}/stream")
+async def stream_presence(kind: str, room_id: int, request: Request):
+    room = _room(kind, room_id)
+    queue = presence.updates.subscribe(room)
+
+    async def events():
+        try:
+            yield f"event: presence\ndata: {json.dumps(presence.snapshot(room))}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    update = await asyncio.wait_for(queue.get(), timeout=PRESENCE_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: presence\ndata: {json.dumps(update)}\n\n"
+        finally:
+            presence.updates.unsubscribe(room, queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
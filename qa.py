@@ -1,27 +1,170 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
-from typing import Dict, List
-from database import get_db
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException, Query, status
+from typing import Dict, List, Optional
+from database import get_db, SessionLocal
 from sqlalchemy.orm import Session
-from models.users import User
-from auth import get_current_user
+from starlette.concurrency import run_in_threadpool
+from models.conferences import Conference
+from models.users import User, UserRole
+from auth import get_current_user, user_id_from_token
+from utils.live_state import registry
+from utils.pubsub import WORKER_ID
+from utils.qa_history import qa_history, load_history, QA_HISTORY_PAGE_SIZE
+from utils.qa_rooms import qa_rooms, BATCH_FORMATS
+from utils.qa_limits import qa_guard, FrameRejected
+from utils.qa_questions import question_board, QuestionError, QUESTION_FRAMES, QA_TOP_SIZE, QA_TOP_MAX
 import json
 
 router = APIRouter()
 
-# Connexions actives par conférence
-active_connections: Dict[int, List[WebSocket]] = {}
+def _conference_exists(conf_id: int) -> bool:
+    db = SessionLocal()
+    try:
+        return db.query(Conference.id).filter(Conference.id == conf_id).first() is not None
+    finally:
+        db.close()
+
+async def _known_conference(conf_id: int) -> bool:
+    if registry.knows_conference(conf_id):
+        return True
+    if not await run_in_threadpool(_conference_exists, conf_id):
+        return False
+    registry.add_conference(conf_id)
+    return True
+
+def _protocol_frame(data: str) -> Optional[dict]:
+    # Trame JSON du protocole (pong, questions) ; tout le reste est un message de discussion
+    if not data.startswith("{"):
+        return None
+    try:
+        frame = json.loads(data)
+    except ValueError:
+        return None
+    if isinstance(frame, dict) and (frame.get("type") == "pong" or frame.get("type") in QUESTION_FRAMES):
+        return frame
+    return None
 
+# Q&A d'une conférence. Le paramètre `token` (jeton d'accès) est facultatif ; il est requis
+# pour voter et pour modérer (organisateur). Avec `batch=json` ou `batch=msgpack`, le client
+# reçoit des trames regroupant plusieurs messages (tableau JSON ou MessagePack binaire).
 @router.websocket("/ws/conference/{conf_id}/qa")
-async def websocket_qa(websocket: WebSocket, conf_id: int):
+async def websocket_qa(websocket: WebSocket, conf_id: int, token: Optional[str] = None,
+                       batch: Optional[str] = None):
     await websocket.accept()
-    if conf_id not in active_connections:
-        active_connections[conf_id] = []
-    active_connections[conf_id].append(websocket)
+    user_id = user_id_from_token(token) if token else None
+    if (token and user_id is None) or (batch is not None and batch not in BATCH_FORMATS) \
+            or not await _known_conference(conf_id):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    connection = qa_rooms.connect(conf_id, websocket, batch=batch)
     try:
+        # Rattrapage : dernière page de l'historique (suite via GET /conferences/{id}/qa/messages)
+        # puis questions les mieux classées ; ensuite seules les variations sont envoyées
+        replay = await qa_history.replay(conf_id)
+        connection.enqueue(json.dumps({"type": "history", **replay}), qa_rooms.policy)
+        questions = await question_board.ensure_loaded(conf_id)
+        connection.enqueue(json.dumps({"type": "questions", "questions": questions.top(QA_TOP_SIZE)}), qa_rooms.policy)
+        # Taille, débit et doublons contrôlés avant tout traitement ; un client qui insiste
+        # malgré les refus est déconnecté
+        limits = qa_guard.connection_state()
         while True:
             data = await websocket.receive_text()
-            # Broadcast à tous les clients de la même conférence
-            for conn in active_connections[conf_id]:
-                await conn.send_text(data)
+            # Toute trame reçue repousse le prochain ping applicatif (voir qa_rooms.reap)
+            connection.touch()
+            try:
+                qa_guard.admit(conf_id, limits, user_id, data)
+                frame = _protocol_frame(data)
+                if frame is None or frame["type"] == "ask":
+                    content = data if frame is None else str(frame.get("content"))
+                    qa_guard.check_duplicate(conf_id, limits, user_id, content)
+            except FrameRejected as e:
+                if qa_guard.should_close(conf_id, limits):
+                    await qa_rooms.disconnect(connection, code=status.WS_1008_POLICY_VIOLATION)
+                    return
+                if qa_guard.should_reply(limits):
+                    connection.enqueue(json.dumps(e.frame()), qa_rooms.policy)
+                continue
+            qa_guard.accept(conf_id, limits)
+            if frame is not None and frame["type"] == "pong":
+                continue
+            if frame is not None:
+                try:
+                    reply = question_board.handle(conf_id, user_id, frame)
+                except QuestionError as e:
+                    reply = {"type": "error", "detail": str(e)}
+                if reply is not None:
+                    connection.enqueue(json.dumps(reply), qa_rooms.policy)
+                continue
+            # Diffusion non bloquante (chaque connexion a sa propre file d'envoi), y compris
+            # aux participants connectés aux autres workers
+            qa_rooms.publish(conf_id, data)
+            qa_history.record(conf_id, data, user_id)
     except WebSocketDisconnect:
-        active_connections[conf_id].remove(websocket) 
\ No newline at end of file
+        pass
+    except RuntimeError:
+        # Socket déjà fermée par la tâche d'envoi (client disparu) pendant l'attente d'une trame
+        if not connection.is_dead():
+            raise
+    finally:
+        await qa_rooms.disconnect(connection)
+
+# Historique paginé (du plus récent au plus ancien, curseur `before` = next_cursor précédent)
+@router.get("/conferences/{conf_id}/qa/messages")
+async def get_qa_messages(
+    conf_id: int,
+    before: Optional[int] = None,
+    limit: int = Query(QA_HISTORY_PAGE_SIZE, ge=1, le=200)
+):
+    if not await _known_conference(conf_id):
+        raise HTTPException(status_code=404, detail="Conférence introuvable")
+    if before is None:
+        history = await qa_history.replay(conf_id, limit)
+    else:
+        history = await run_in_threadpool(load_history, conf_id, before, limit)
+    return {"conference_id": conf_id, **history}
+
+# Questions ouvertes les mieux classées, servies depuis l'index en mémoire
+@router.get("/conferences/{conf_id}/qa/questions")
+async def get_qa_questions(
+    conf_id: int,
+    limit: int = Query(QA_TOP_SIZE, ge=1, le=QA_TOP_MAX)
+):
+    if not await _known_conference(conf_id):
+        raise HTTPException(status_code=404, detail="Conférence introuvable")
+    questions = await question_board.ensure_loaded(conf_id)
+    return {"conference_id": conf_id, "open": questions.open_count(), "questions": questions.top(limit)}
+
+# Compteurs de ce worker pour la salle : trames acceptées / refusées, messages abandonnés
+# (clients lents)
+@router.get("/conferences/{conf_id}/qa/metrics")
+async def get_qa_metrics(
+    conf_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    conference = db.query(Conference).filter(
+        Conference.id == conf_id,
+        Conference.organizer_id == current_user.id
+    ).first()
+    if not conference:
+        raise HTTPException(
+            status_code=403,
+            detail="Vous devez être l'organisateur de cette conférence pour voir ces métriques"
+        )
+    return {
+        "conference_id": conf_id,
+        "inbound": qa_guard.metrics(conf_id),
+        "outbound": qa_rooms.metrics(conf_id),
+    }
+
+# Connexions Q&A ouvertes sur ce worker, par salle
+@router.get("/qa/rooms")
+async def get_qa_rooms(current_user: User = Depends(get_current_user)):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Réservé aux administrateurs.")
+    rooms = qa_rooms.room_counts()
+    return {
+        "worker": WORKER_ID,
+        "connections": sum(rooms.values()),
+        "rooms": [{"conference_id": conf_id, "connections": count} for conf_id, count in sorted(rooms.items())],
+        "reaped": {"dead": qa_rooms.reaped_dead},
+    }
@@ -8,6 +8,7 @@ from datetime import datetime
 from auth import get_current_user
 from models.payment import Payment
 from models.reviewers import Reviewer
+from utils.stats_cache import invalidate_stats
 
 router = APIRouter()
 
@@ -34,6 +35,7 @@ def register_for_conference(conference_id: int, db: Session = Depends(get_db), c
     db.add(registration)
     db.commit()
     db.refresh(registration)
+    invalidate_stats(conference_id)
     return {"message": "Inscription créée", "registration_id": registration.id, "status": registration.status}
 
 @router.get("/conferences/{conference_id}/is-registered")
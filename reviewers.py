@@ -4,7 +4,8 @@ from models import reviewers, users, conferences, abstracts
 from models.reviews import Review, ReviewDecision  # Import ReviewDecision
 from models.abstracts import Abstract, AbstractStatus, PresentationType, AbstractOut
 from database import get_db
-from utils.email import send_email
+from utils.email_outbox import queue_email, email_worker
+from utils.stats_cache import invalidate_stats
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
 from sqlalchemy.orm import aliased
@@ -71,24 +72,24 @@ def invite_reviewer(
             role=users.UserRole.REVIEWER
         )
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        db.flush()
     accept_token = secrets.token_urlsafe(32)
     print("Création invitation reviewer pour:", user.id, data.conference_id)
     invitation = ReviewerInvitation(
         invited_by_id=current_user.id,
         invitee_id=user.id,
-        email=data.email,
+        invitee_email=data.email,
         conference_id=data.conference_id,
         accept_token=accept_token
     )
     db.add(invitation)
-    db.commit()
-    db.refresh(invitation)
-    # Lien d'acceptation
+    # Lien d'acceptation, envoyé par la file d'emails dans la même transaction que l'invitation
     accept_link = f"http://localhost:8080/accept-invitation?token={accept_token}&conference_id={data.conference_id}"
     message = f"Hello,\nYou are invited to be a reviewer for conference {data.conference_id}.\nAccept: {accept_link}"
-    send_email(to=data.email, subject="Reviewer Invitation", body=message)
+    queue_email(db, data.email, "Reviewer Invitation", message)
+    db.commit()
+    db.refresh(invitation)
+    email_worker.wake()
     return invitation
 
 # Accept Invitation by token
@@ -208,6 +209,7 @@ def create_review(
         db.commit()
         db.refresh(target_abstract)
 
+    invalidate_stats(target_abstract.conference_id)
     return review_entry
 
 # Read Review (by reviewer)
@@ -250,6 +252,7 @@ def update_review(
         db.commit()
 
     db.refresh(review_entry)
+    invalidate_stats(target_abstract.conference_id)
     return review_entry
 
 # Delete Review (by reviewer)
@@ -259,8 +262,10 @@ def delete_review(review_id: int, db: Session = Depends(get_db), current_user: u
     if not review_entry:
         raise HTTPException(status_code=404, detail="Review not found or you do not have access to it.")
     
+    conference_id = review_entry.abstract.conference_id if review_entry.abstract else None
     db.delete(review_entry)
     db.commit()
+    invalidate_stats(conference_id)
     return {"message": "Review deleted successfully"}
 
 @router.post("/abstracts/{abstract_id}/assign-reviewer", status_code=201)
@@ -395,6 +400,7 @@ def create_review_for_abstract(
         db.commit()
         db.refresh(target_abstract)
 
+    invalidate_stats(target_abstract.conference_id)
     return review_entry
 
 @router.get("/reviewer/my-reviews")
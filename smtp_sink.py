@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Serveur SMTP local pour les tests de la file d'emails (utils/email_outbox) : accepte les emails
+sans les transmettre, les affiche et peut les enregistrer dans une boîte mbox. Permet aussi de
+simuler un serveur lent (--delay), des refus temporaires (--fail-rate, code 451) et des
+adresses refusées définitivement (--reject, code 550).
+
+Usage :
+    python smtp_sink.py --port 1025 --fail-rate 0.2
+    SMTP_HOST=127.0.0.1 SMTP_PORT=1025 SMTP_SECURITY=none SMTP_FROM=test@conference.local uvicorn main:app
+
+Vérification complète de la livraison (démarre ce serveur et l'application) : test_email_outbox.py
+"""
+
+import argparse
+import asyncio
+import mailbox
+import random
+import signal
+from email import message_from_bytes
+from email.header import decode_header, make_header
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    Controller = None
+
+# Configuration
+HOST = "127.0.0.1"
+DEFAULT_PORT = 1025
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serveur SMTP local de test")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--delay", type=float, default=0.0, help="délai avant d'accepter chaque email (secondes)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="part des emails refusés temporairement (451)")
+    parser.add_argument("--reject", action="append", default=[],
+                        help="domaine ou adresse refusé définitivement (550), répétable")
+    parser.add_argument("--mbox", help="boîte mbox où enregistrer les emails reçus")
+    parser.add_argument("--quiet", action="store_true", help="n'affiche que les compteurs")
+    return parser.parse_args()
+
+class SinkHandler:
+    """Reçoit les emails et tient les compteurs (acceptés, refusés temporairement / définitivement)"""
+
+    def __init__(self, args):
+        self.args = args
+        self.accepted = 0
+        self.deferred = 0
+        self.rejected = 0
+        self.mbox = mailbox.mbox(args.mbox) if args.mbox else None
+
+    def _rejected(self, address):
+        address = address.lower()
+        return any(address == rule.lower() or address.endswith("@" + rule.lower()) for rule in self.args.reject)
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if self._rejected(address):
+            self.rejected += 1
+            return f"550 5.1.1 <{address}>: adresse refusée"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.args.delay:
+            await asyncio.sleep(self.args.delay)
+        if random.random() < self.args.fail_rate:
+            self.deferred += 1
+            return "451 4.3.0 Erreur temporaire simulée, réessayez plus tard"
+        self.accepted += 1
+        if self.mbox is not None:
+            self.mbox.add(envelope.content)
+            self.mbox.flush()
+        if not self.args.quiet:
+            message = message_from_bytes(envelope.content)
+            subject = str(make_header(decode_header(message.get("Subject", ""))))
+            print(f"📨 {envelope.mail_from} -> {', '.join(envelope.rcpt_tos)} : {subject}")
+        return "250 Message accepté"
+
+    def summary(self):
+        return f"✅ {self.accepted} acceptés, ⏳ {self.deferred} refusés temporairement, ❌ {self.rejected} refusés"
+
+async def serve(args):
+    handler = SinkHandler(args)
+    controller = Controller(handler, hostname=args.host, port=args.port)
+    controller.start()
+    print(f"📬 Serveur SMTP de test sur {args.host}:{args.port} (Ctrl+C pour arrêter)")
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        controller.stop()
+        print(handler.summary())
+
+def main():
+    args = parse_args()
+    if Controller is None:
+        print("❌ aiosmtpd n'est pas installé (pip install aiosmtpd)")
+        return 1
+    asyncio.run(serve(args))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, func
-from datetime import date
+from sqlalchemy import func, literal, select, union_all
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+import math
 from database import get_db
 from models.abstracts import Abstract, AbstractStatus, PresentationType
 from models.users import User, UserRole
@@ -11,6 +13,11 @@ from models.LiveSession import LiveSession
 from models.reviewers import Reviewer
 from models.ConferenceParticipant import ConferenceParticipant
 from models.registration import Registration
+from models.payment import Payment
+from models.payment_rollup import PaymentDailyRollup
+from utils.stats_cache import get_cached_stats, set_cached_stats
+from utils.live_state import today_bounds
+from utils.counters import COUNTER_COLUMNS, compute_counters, counters_table, empty_counters, reconcile_counters
 
 # Import pour récupérer l'utilisateur connecté
 from abstracts import get_current_user
@@ -18,80 +25,340 @@ from abstracts import get_current_user
 
 router = APIRouter()
 
+# Longueur maximale de la série journalière des revenus (jours)
+REVENUE_MAX_DAYS = 3660
+
+
+def _stats_query(conference_id: int, organizer_id: int):
+    """
+    Lecture par clé primaire des compteurs incrémentaux (conference_counters) ; seul
+    sessions_today, qui dépend de la date du jour, reste calculé à la volée
+    """
+    day_start, day_end = today_bounds()
+    sessions_today = select(func.count()).where(
+        LiveSession.conference_id == conference_id,
+        LiveSession.session_time >= day_start,
+        LiveSession.session_time < day_end
+    ).scalar_subquery()
+
+    return (
+        select(
+            Conference.deadline,
+            *[counters_table.c[column] for column in COUNTER_COLUMNS],
+            sessions_today.label("sessions_today"),
+        )
+        .select_from(Conference)
+        .outerjoin(counters_table, counters_table.c.conference_id == Conference.id)
+        .where(Conference.id == conference_id, Conference.organizer_id == organizer_id)
+    )
+
+
+def _stats_payload(counters, sessions_today: int, deadline) -> dict:
+    return {
+        "abstracts": counters["abstracts"],
+        "reviewers": counters["reviewers"],
+        "reviews": counters["reviews"],
+        "participants": counters["participants"],
+        "oral_accepted": counters["oral_accepted"],
+        "poster_accepted": counters["poster_accepted"],
+        "rejected": counters["rejected"],
+        "invitations": 0,
+        "cert_participants": counters["cert_participants"],
+        "cert_speakers": counters["cert_speakers"],
+        "cert_reviewers": counters["cert_reviewers"],
+        "sessions_total": counters["sessions_total"],
+        "sessions_today": sessions_today,
+        "deadline": deadline.isoformat() if deadline else None
+    }
+
+
+@router.post("/counters/reconcile")
+def reconcile_conference_counters(
+    conference_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Réservé aux administrateurs.")
+    return reconcile_counters(db, [conference_id] if conference_id is not None else None)
+
+
+# Déclarée avant /{conference_id} pour que "mine" ne soit pas interprété comme un identifiant
+@router.get("/mine")
+async def get_my_stats(
+    sort: str = "conference_id",
+    order: str = "desc",
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    fresh: bool = False,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="L'ordre doit être asc ou desc.")
+
+    conferences = db.query(Conference.id, Conference.title, Conference.deadline).filter(
+        Conference.organizer_id == current_user.id
+    ).all()
+    conference_ids = [conference.id for conference in conferences]
+
+    # Compteurs incrémentaux lus en une requête ; les conférences sans ligne (ou ?fresh=1)
+    # sont recalculées avec une requête GROUP BY conference_id par table source
+    counters = {}
+    if conference_ids and not fresh:
+        rows = db.execute(
+            select(counters_table).where(counters_table.c.conference_id.in_(conference_ids))
+        ).mappings()
+        counters = {row["conference_id"]: row for row in rows}
+    missing = [conference_id for conference_id in conference_ids if conference_id not in counters]
+    if missing:
+        computed = compute_counters(db, missing)
+        for conference_id in missing:
+            counters[conference_id] = computed.get(conference_id, empty_counters())
+
+    sessions_today = {}
+    if conference_ids:
+        day_start, day_end = today_bounds()
+        sessions_today = dict(db.execute(
+            select(LiveSession.conference_id, func.count())
+            .where(
+                LiveSession.conference_id.in_(conference_ids),
+                LiveSession.session_time >= day_start,
+                LiveSession.session_time < day_end
+            )
+            .group_by(LiveSession.conference_id)
+        ).all())
+
+    items = [
+        {
+            "conference_id": conference.id,
+            "title": conference.title,
+            **_stats_payload(counters[conference.id], sessions_today.get(conference.id, 0), conference.deadline),
+        }
+        for conference in conferences
+    ]
+
+    if items and sort not in items[0]:
+        raise HTTPException(status_code=400, detail=f"Tri impossible sur '{sort}'.")
+    # Les valeurs nulles (deadline absente) sont toujours placées en fin de liste
+    items = sorted(
+        (item for item in items if item[sort] is not None),
+        key=lambda item: item[sort],
+        reverse=order == "desc"
+    ) + [item for item in items if item[sort] is None]
+
+    offset = (page - 1) * page_size
+    return {
+        "total": len(items),
+        "page": page,
+        "page_size": page_size,
+        "sort": sort,
+        "order": order,
+        "items": items[offset:offset + page_size],
+    }
+
+
 @router.get("/{conference_id}")
 async def get_stats(
     conference_id: int,
+    fresh: bool = False,
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user)
 ):
     try:
-        # Vérifie que la conférence appartient bien à l'utilisateur
-        conference = db.query(Conference).filter(
-            Conference.id == conference_id,
-            Conference.organizer_id == current_user.id
-        ).first()
+        if not fresh:
+            cached = get_cached_stats(conference_id, current_user.id)
+            if cached is not None:
+                return cached
 
-        if not conference:
+        # Une seule requête : vérifie que la conférence appartient bien à l'utilisateur
+        # et calcule toutes les statistiques
+        row = db.execute(_stats_query(conference_id, current_user.id)).mappings().first()
+
+        if not row:
             raise HTTPException(status_code=404, detail="Conférence non trouvée ou non autorisée.")
 
-        # Ensuite, garde le même code pour les statistiques :
-        abstracts_count = db.query(Abstract).filter(Abstract.conference_id == conference_id).count()
-        reviewers_count = db.query(Reviewer).filter(Reviewer.conference_id == conference_id).count()
-        participants_count = db.query(Registration).filter(Registration.conference_id == conference_id, Registration.status == 'paid').count()
-
-        accepted_orals = db.query(Abstract).filter(
-            Abstract.status == AbstractStatus.accepted,
-            Abstract.conference_id == conference_id,
-            Abstract.presentation_type == PresentationType.ORAL
-        ).count()
-        poster_accepted = db.query(Abstract).filter(
-            Abstract.status == AbstractStatus.accepted,
-            Abstract.conference_id == conference_id,
-            Abstract.presentation_type == PresentationType.E_POSTER
-        ).count()
-        rejected = db.query(Abstract).filter(
-            Abstract.status == AbstractStatus.rejected,
-            Abstract.conference_id == conference_id
-        ).count()
-
-        cert_participants = db.query(Certificate).filter(
-            Certificate.certificate_type == "participation",
-            Certificate.conference_id == conference_id
-        ).count()
-        cert_speakers = db.query(Certificate).filter(
-            Certificate.certificate_type == "presentation",
-            Certificate.conference_id == conference_id
-        ).count()
-        cert_reviewers = db.query(Certificate).filter(
-            Certificate.certificate_type == "reviewer",
-            Certificate.conference_id == conference_id
-        ).count()
-
-        sessions_total = db.query(LiveSession).filter(
-            LiveSession.conference_id == conference_id
-        ).count()
-        sessions_today = db.query(LiveSession).filter(
-            func.date(LiveSession.session_time) == date.today(),
-            LiveSession.conference_id == conference_id
-        ).count()
-
-        deadline = conference.deadline.isoformat() if conference.deadline else None
-
-        return {
-            "abstracts": abstracts_count,
-            "reviewers": reviewers_count,
-            "participants": participants_count,
-            "oral_accepted": accepted_orals,
-            "poster_accepted": poster_accepted,
-            "rejected": rejected,
-            "invitations": 0,
-            "cert_participants": cert_participants,
-            "cert_speakers": cert_speakers,
-            "cert_reviewers": cert_reviewers,
-            "sessions_total": sessions_total,
-            "sessions_today": sessions_today,
-            "deadline": deadline
-        }
+        if row["abstracts"] is None:
+            # Pas encore de ligne de compteurs pour cette conférence : on l'initialise
+            reconcile_counters(db, [conference_id])
+            row = db.execute(_stats_query(conference_id, current_user.id)).mappings().first()
 
+        stats = _stats_payload(row, row["sessions_today"], row["deadline"])
+        set_cached_stats(conference_id, current_user.id, stats)
+        return stats
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur serveur: {str(e)}")
+
+
+# Largeur de chaque granularité acceptée par date_trunc
+TIMESERIES_BUCKETS = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+}
+TIMESERIES_DEFAULT_WINDOW = timedelta(days=90)
+
+
+def _naive_utc(value: datetime) -> datetime:
+    # Les colonnes DateTime sont stockées en UTC sans fuseau
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _truncate(value: datetime, bucket: str) -> datetime:
+    # Même alignement que date_trunc côté Postgres (les semaines commencent le lundi)
+    value = value.replace(minute=0, second=0, microsecond=0)
+    if bucket == "hour":
+        return value
+    value = value.replace(hour=0)
+    if bucket == "week":
+        value -= timedelta(days=value.weekday())
+    return value
+
+
+def _timeseries_query(conference_id: int, bucket: str, start: datetime, end: datetime):
+    """
+    Une seule requête (UNION ALL) qui regroupe soumissions, inscriptions et paiements par date_trunc
+    """
+    def bucketed(series, column, conference_column, amount=None, *criteria):
+        period = func.date_trunc(bucket, column)
+        return (
+            select(
+                literal(series).label("series"),
+                period.label("bucket"),
+                func.count().label("count"),
+                (func.coalesce(func.sum(amount), 0) if amount is not None else literal(0)).label("amount"),
+            )
+            .where(conference_column == conference_id, column >= start, column < end, *criteria)
+            .group_by(period)
+        )
+
+    return union_all(
+        bucketed("submissions", Abstract.submitted_at, Abstract.conference_id),
+        bucketed("registrations", Registration.created_at, Registration.conference_id),
+        bucketed(
+            "payments", Payment.paid_at, Payment.conference_id, Payment.amount,
+            Payment.payment_status == 'completed'
+        ),
+    )
+
+
+@router.get("/{conference_id}/timeseries")
+async def get_timeseries(
+    conference_id: int,
+    bucket: str = "day",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    max_points: int = Query(200, ge=1, le=2000),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    if bucket not in TIMESERIES_BUCKETS:
+        raise HTTPException(status_code=400, detail="Granularité inconnue (hour, day ou week).")
+
+    conference = db.query(Conference.id, Conference.created_at).filter(
+        Conference.id == conference_id,
+        Conference.organizer_id == current_user.id
+    ).first()
+    if not conference:
+        raise HTTPException(status_code=404, detail="Conférence non trouvée ou non autorisée.")
+
+    end = _naive_utc(end) if end else datetime.utcnow()
+    start = _naive_utc(start) if start else (conference.created_at or end - TIMESERIES_DEFAULT_WINDOW)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="La date de début doit précéder la date de fin.")
+
+    # Sous-échantillonnage : on regroupe `step` intervalles consécutifs par point
+    width = TIMESERIES_BUCKETS[bucket]
+    first_bucket = _truncate(start, bucket)
+    bucket_count = math.ceil((end - first_bucket) / width)
+    step = max(1, math.ceil(bucket_count / max_points))
+    point_width = width * step
+    point_count = math.ceil(bucket_count / step)
+
+    # Remplissage des trous : chaque point existe, même sans données
+    points = [
+        {
+            "t": (first_bucket + point_width * i).isoformat(),
+            "submissions": 0,
+            "registrations": 0,
+            "payments": 0,
+            "revenue": 0.0,
+        }
+        for i in range(point_count)
+    ]
+    for row in db.execute(_timeseries_query(conference_id, bucket, start, end)).mappings():
+        index = int((row["bucket"] - first_bucket) // point_width)
+        if not 0 <= index < point_count:
+            continue
+        point = points[index]
+        point[row["series"]] += row["count"]
+        if row["series"] == "payments":
+            point["revenue"] += float(row["amount"])
+
+    return {
+        "bucket": bucket,
+        "step": step,
+        "interval_seconds": int(point_width.total_seconds()),
+        "start": first_bucket.isoformat(),
+        "end": end.isoformat(),
+        "points": points,
+    }
+
+
+@router.get("/{conference_id}/revenue")
+async def get_revenue(
+    conference_id: int,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    conference = db.query(Conference.id).filter(
+        Conference.id == conference_id,
+        Conference.organizer_id == current_user.id
+    ).first()
+    if not conference:
+        raise HTTPException(status_code=404, detail="Conférence non trouvée ou non autorisée.")
+
+    # Lecture des totaux journaliers uniquement : le coût dépend du nombre de jours, pas de paiements
+    query = db.query(PaymentDailyRollup).filter(PaymentDailyRollup.conference_id == conference_id)
+    if start:
+        query = query.filter(PaymentDailyRollup.day >= start)
+    if end:
+        query = query.filter(PaymentDailyRollup.day <= end)
+    rows = {row.day: row for row in query.order_by(PaymentDailyRollup.day)}
+
+    totals = {"payments_count": 0, "amount_total": 0.0, "refunds_count": 0, "refunds_total": 0.0}
+    for row in rows.values():
+        for key in totals:
+            totals[key] += getattr(row, key)
+    totals["net_total"] = totals["amount_total"] - totals["refunds_total"]
+
+    # Série journalière sans trous entre la première et la dernière date demandées
+    series = []
+    first_day = start or (min(rows) if rows else None)
+    last_day = end or (max(rows) if rows else None)
+    if first_day and last_day and (last_day - first_day).days > REVENUE_MAX_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Période trop longue (maximum {REVENUE_MAX_DAYS} jours)"
+        )
+    if first_day and last_day:
+        day = first_day
+        while day <= last_day:
+            row = rows.get(day)
+            series.append({
+                "day": day.isoformat(),
+                "payments_count": row.payments_count if row else 0,
+                "amount_total": row.amount_total if row else 0.0,
+                "refunds_count": row.refunds_count if row else 0,
+                "refunds_total": row.refunds_total if row else 0.0,
+            })
+            day += timedelta(days=1)
+
+    return {"conference_id": conference_id, "totals": totals, "daily": series}
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Script de test des compteurs par conférence (utils/counters) : plusieurs lignes écrites dans
+un même flush pour une conférence sans ligne de compteurs ne doivent être comptées qu'une fois
+
+Toutes les écritures sont faites dans une transaction annulée à la fin : la base n'est pas
+modifiée.
+
+Usage : DATABASE_URL=postgresql://... python test_counters.py
+"""
+
+import os
+import sys
+import uuid
+from datetime import date, timedelta
+
+import models  # noqa: F401  (enregistre tous les modèles et leurs relations)
+from database import SessionLocal
+from models.conference_counters import ConferenceCounters
+from models.conferences import Conference
+from models.registration import Registration
+from models.users import User
+from utils.counters import compute_counters
+
+def stored_participants(db, conference_id):
+    row = db.query(ConferenceCounters).filter(ConferenceCounters.conference_id == conference_id).first()
+    return None if row is None else row.participants
+
+def expect(label, stored, actual):
+    if stored == actual:
+        print(f"✅ {label} : {stored}")
+        return True
+    print(f"❌ {label} : compteur {stored}, attendu {actual}")
+    return False
+
+def check_counters(db):
+    tag = uuid.uuid4().hex[:8]
+    users = [User(fullname=f"Test {i}", email=f"compteurs-{tag}-{i}@test.local", hashed_password="x") for i in range(2)]
+    db.add_all(users)
+    db.flush()
+    conference = Conference(
+        title=f"Test compteurs {tag}", deadline=date.today() + timedelta(days=30),
+        important_date=date.today(), fees=0, venue="ONLINE", thematic=[], organizer_id=users[0].id
+    )
+    db.add(conference)
+    db.flush()
+    ok = expect("Nouvelle conférence sans ligne de compteurs", stored_participants(db, conference.id), None)
+
+    # Deux inscriptions payées dans le même flush : la ligne est initialisée par la première
+    registrations = [Registration(user_id=user.id, conference_id=conference.id, status="paid") for user in users]
+    db.add_all(registrations)
+    db.flush()
+    actual = compute_counters(db, [conference.id])[conference.id]["participants"]
+    ok &= expect("Deux inscriptions en un flush", stored_participants(db, conference.id), actual)
+
+    # Même cas pour des suppressions, la ligne de compteurs ayant disparu
+    db.query(ConferenceCounters).filter(ConferenceCounters.conference_id == conference.id).delete()
+    for registration in registrations:
+        db.delete(registration)
+    db.flush()
+    ok &= expect("Deux suppressions en un flush", stored_participants(db, conference.id), 0)
+    return ok
+
+def main():
+    print("🚀 Test des compteurs par conférence")
+    print("=" * 50)
+
+    if not os.getenv("DATABASE_URL"):
+        print("ℹ️  DATABASE_URL non défini : utilisation de la base par défaut de database.py")
+    db = SessionLocal()
+    try:
+        ok = check_counters(db)
+    finally:
+        db.rollback()
+        db.close()
+    print("\n" + ("✅ Compteurs cohérents" if ok else "❌ Échec du test des compteurs"))
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Script de test de la file d'emails : lance le serveur SMTP de test (smtp_sink.py) et une
+instance de l'application branchée dessus, met des emails en file et vérifie qu'ils sont
+livrés malgré des refus temporaires, et qu'une adresse refusée passe en lettre morte
+
+Usage : DATABASE_URL=postgresql://... python test_email_outbox.py [nombre_emails]
+(JOIN_TOKEN_SECRET et LOBBY_TICKET_SECRET sont générés s'ils ne sont pas définis)
+"""
+
+import mailbox
+import os
+import secrets
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import requests
+
+from database import SessionLocal
+from models.email_outbox import EmailOutbox
+from utils.email_outbox import queue_email, SENT, DEAD
+
+# Configuration
+HOST = "127.0.0.1"
+APP_PORT = 8103
+SMTP_PORT = 2525
+FAIL_RATE = "0.3"
+REJECTED_DOMAIN = "refuse.invalid"
+STARTUP_TIMEOUT = 30
+DELIVERY_TIMEOUT = 60
+# Secrets obligatoires au démarrage (voir utils/join_tokens, utils/lobby) : générés pour le
+# test s'ils ne sont pas définis, partagés par les instances lancées
+TEST_SECRETS = {
+    "JOIN_TOKEN_SECRET": os.getenv("JOIN_TOKEN_SECRET") or secrets.token_hex(32),
+    "LOBBY_TICKET_SECRET": os.getenv("LOBBY_TICKET_SECRET") or secrets.token_hex(32),
+}
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+def start_sink(mbox_path):
+    """Démarre smtp_sink.py : 30 % de refus temporaires, un domaine refusé définitivement"""
+    return subprocess.Popen(
+        [sys.executable, "smtp_sink.py", "--host", HOST, "--port", str(SMTP_PORT), "--quiet",
+         "--fail-rate", FAIL_RATE, "--reject", REJECTED_DOMAIN, "--mbox", mbox_path],
+        cwd=ROOT,
+    )
+
+def start_instance():
+    """Démarre une instance uvicorn qui envoie ses emails au serveur de test"""
+    env = dict(
+        os.environ,
+        **TEST_SECRETS,
+        SMTP_HOST=HOST, SMTP_PORT=str(SMTP_PORT), SMTP_SECURITY="none",
+        SMTP_FROM="test@conference.local", EMAIL_RETRY_BASE="0.5", EMAIL_POLL_INTERVAL="0.5",
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", HOST, "--port", str(APP_PORT), "--log-level", "warning"],
+        cwd=ROOT,
+        env=env,
+    )
+
+def wait_until_ready():
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        try:
+            requests.get(f"http://{HOST}:{APP_PORT}/docs", timeout=1)
+            return True
+        except requests.RequestException:
+            time.sleep(0.5)
+    return False
+
+def queue_test_emails(tag, count):
+    """Met `count` emails en file plus un email à une adresse refusée ; retourne leurs ids"""
+    db = SessionLocal()
+    try:
+        emails = [
+            queue_email(db, f"participant{i}@conference.local", f"Test {tag} #{i}", f"Email de test {i}")
+            for i in range(count)
+        ]
+        rejected = queue_email(db, f"personne@{REJECTED_DOMAIN}", f"Test {tag} refusé", "Email refusé")
+        db.commit()
+        return [email.id for email in emails], rejected.id
+    finally:
+        db.close()
+
+def wait_for_delivery(ids):
+    """Attend que tous les emails soient envoyés ou en lettre morte ; retourne leurs statuts"""
+    deadline = time.time() + DELIVERY_TIMEOUT
+    while True:
+        db = SessionLocal()
+        try:
+            statuses = dict(db.query(EmailOutbox.id, EmailOutbox.status).filter(EmailOutbox.id.in_(ids)).all())
+        finally:
+            db.close()
+        if all(status in (SENT, DEAD) for status in statuses.values()) or time.time() > deadline:
+            return statuses
+        time.sleep(0.5)
+
+def delivered_subjects(mbox_path, tag):
+    return {message["Subject"] for message in mailbox.mbox(mbox_path) if tag in (message["Subject"] or "")}
+
+def main():
+    print("🚀 Test de la file d'emails (smtp_sink.py + une instance)")
+    print("=" * 50)
+
+    if not os.getenv("DATABASE_URL"):
+        print("ℹ️  DATABASE_URL non défini : utilisation de la base par défaut de database.py")
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    tag = uuid.uuid4().hex[:8]
+    mbox_path = os.path.join(tempfile.mkdtemp(), "outbox.mbox")
+
+    processes = [start_sink(mbox_path), start_instance()]
+    try:
+        if not wait_until_ready():
+            print("❌ L'instance n'a pas démarré")
+            return 1
+        ids, rejected_id = queue_test_emails(tag, count)
+        print(f"📤 {count} emails en file (+1 à une adresse refusée)")
+        statuses = wait_for_delivery(ids + [rejected_id])
+        subjects = delivered_subjects(mbox_path, tag)
+
+        ok = True
+        sent = sum(1 for email_id in ids if statuses.get(email_id) == SENT)
+        if sent == count and len(subjects) == count:
+            print(f"✅ {count}/{count} emails livrés au serveur SMTP de test")
+        else:
+            print(f"❌ {sent}/{count} emails envoyés, {len(subjects)} reçus par le serveur de test")
+            ok = False
+        if statuses.get(rejected_id) == DEAD:
+            print("✅ Adresse refusée (550) : email en lettre morte")
+        else:
+            print(f"❌ Adresse refusée : statut {statuses.get(rejected_id)} au lieu de {DEAD}")
+            ok = False
+        return 0 if ok else 1
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+if __name__ == "__main__":
+    sys.exit(main())
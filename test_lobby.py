@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Script de test du lobby d'admission (utils/lobby) : un client admis dont le ticket arrive à
+expiration doit en recevoir un nouveau en redemandant, sans repasser par la file
+
+Usage : python test_lobby.py (aucun serveur ni base nécessaire, dure quelques secondes)
+"""
+
+import os
+import secrets
+import sys
+import time
+
+# Tickets très courts pour voir l'expiration ; clés de test dédiées
+os.environ["LOBBY_TICKET_TTL"] = "3"
+os.environ["LOBBY_TICKET_RENEW_BEFORE"] = "1"
+os.environ.setdefault("JOIN_TOKEN_SECRET", secrets.token_hex(32))
+os.environ.setdefault("LOBBY_TICKET_SECRET", secrets.token_hex(32))
+
+from utils.lobby import SessionLobby, verify_ticket, check_lobby_ticket_secret, LobbyTicketError, LOBBY_TICKET_TTL
+
+# Configuration
+CONFERENCE_ID = 1
+SESSION_ID = 1
+USER_ID = 42
+
+def is_valid(ticket):
+    try:
+        verify_ticket(ticket, CONFERENCE_ID, SESSION_ID, USER_ID)
+        return True
+    except LobbyTicketError:
+        return False
+
+def check_ticket_renewal():
+    ok = True
+    lobby = SessionLobby(CONFERENCE_ID, SESSION_ID)
+    ticket, admit_at, position = lobby.issue(USER_ID)
+    if not is_valid(ticket) or lobby.issue(USER_ID)[0] != ticket:
+        print("❌ Ticket neuf invalide ou non conservé")
+        return False
+    print("✅ Ticket neuf valide, même ticket en redemandant")
+
+    time.sleep(LOBBY_TICKET_TTL + 1.5)
+    if is_valid(ticket):
+        print("❌ Le ticket aurait dû expirer")
+        ok = False
+    else:
+        print("✅ Ticket expiré refusé")
+
+    renewed, renewed_at, renewed_position = lobby.issue(USER_ID)
+    if renewed != ticket and is_valid(renewed) and renewed_at <= time.time():
+        print("✅ Nouveau ticket valide et admis immédiatement")
+    else:
+        print("❌ Pas de nouveau ticket valide après expiration")
+        ok = False
+    if renewed_position == position and lobby.issued == 1:
+        print("✅ Même position, pas de nouvelle émission dans la file")
+    else:
+        print(f"❌ Position {renewed_position} (attendu {position}), {lobby.issued} émissions")
+        ok = False
+    return ok
+
+def main():
+    print("🚀 Test du lobby d'admission")
+    print("=" * 50)
+    check_lobby_ticket_secret()
+    ok = check_ticket_renewal()
+    print("\n" + ("✅ Lobby opérationnel" if ok else "❌ Échec du test du lobby"))
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Script de test du Q&A multi-workers : lance deux instances de l'application sur la même base
+Postgres et vérifie qu'un message envoyé sur l'une est reçu par les clients de l'autre
+
+Usage : DATABASE_URL=postgresql://... python test_qa_backplane.py [conference_id]
+(JOIN_TOKEN_SECRET et LOBBY_TICKET_SECRET sont générés s'ils ne sont pas définis)
+"""
+
+import asyncio
+import os
+import secrets
+import subprocess
+import sys
+import time
+
+import requests
+import websockets
+
+# Configuration
+HOST = "127.0.0.1"
+PORTS = (8101, 8102)
+STARTUP_TIMEOUT = 30
+# Secrets obligatoires au démarrage (voir utils/join_tokens, utils/lobby) : générés pour le
+# test s'ils ne sont pas définis, partagés par les instances lancées
+TEST_SECRETS = {
+    "JOIN_TOKEN_SECRET": os.getenv("JOIN_TOKEN_SECRET") or secrets.token_hex(32),
+    "LOBBY_TICKET_SECRET": os.getenv("LOBBY_TICKET_SECRET") or secrets.token_hex(32),
+}
+
+def start_instance(port):
+    """Démarre une instance uvicorn avec le backplane Postgres"""
+    env = dict(os.environ, PUBSUB_BACKEND="postgres", **TEST_SECRETS)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", HOST, "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+    )
+
+def wait_until_ready(port):
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        try:
+            requests.get(f"http://{HOST}:{port}/docs", timeout=1)
+            return True
+        except requests.RequestException:
+            time.sleep(0.5)
+    return False
+
+async def wait_for_message(ws, expected, timeout=5):
+    """Attend un message donné (les autres trames, dont l'historique et l'écho, sont ignorées)"""
+    deadline = time.time() + timeout
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        try:
+            data = await asyncio.wait_for(ws.recv(), remaining)
+        except asyncio.TimeoutError:
+            return False
+        if data == expected:
+            return True
+
+async def check_backplane(conference_id):
+    url_a = f"ws://{HOST}:{PORTS[0]}/ws/conference/{conference_id}/qa"
+    url_b = f"ws://{HOST}:{PORTS[1]}/ws/conference/{conference_id}/qa"
+    ok = True
+    async with websockets.connect(url_a) as client_a, websockets.connect(url_b) as client_b:
+        await asyncio.sleep(0.5)
+        for sender, receiver, label in ((client_a, client_b, "A -> B"), (client_b, client_a, "B -> A")):
+            message = f"Question de test {label} {time.time()}"
+            await sender.send(message)
+            if await wait_for_message(receiver, message):
+                print(f"✅ {label}: message reçu par l'autre instance")
+            else:
+                print(f"❌ {label}: message non reçu")
+                ok = False
+    return ok
+
+def main():
+    print("🚀 Test du backplane Q&A (deux instances, une base)")
+    print("=" * 50)
+
+    if not os.getenv("DATABASE_URL"):
+        print("ℹ️  DATABASE_URL non défini : utilisation de la base par défaut de database.py")
+    conference_id = sys.argv[1] if len(sys.argv) > 1 else "1"
+
+    processes = [start_instance(port) for port in PORTS]
+    try:
+        for port in PORTS:
+            if not wait_until_ready(port):
+                print(f"❌ L'instance sur le port {port} n'a pas démarré")
+                return 1
+            print(f"✅ Instance prête sur le port {port}")
+        ok = asyncio.run(check_backplane(conference_id))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+    print("\n" + ("✅ Backplane opérationnel" if ok else "❌ Échec du test du backplane"))
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+import asyncio
+import os
+from collections import defaultdict
+from datetime import datetime
+from threading import Lock
+from typing import List
+
+from sqlalchemy import and_, case, func, insert, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from database import SessionLocal
+from models.attendance import AttendanceEvent, SessionAttendance
+from models.ConferenceParticipant import ConferenceParticipant
+from models.LiveSession import LiveSession
+from models.registration import Registration
+from models.users import User
+
+# Intervalle (secondes) entre deux écritures groupées des événements de présence
+ATTENDANCE_FLUSH_INTERVAL = float(os.getenv("ATTENDANCE_FLUSH_INTERVAL", "0.25"))
+# Écart maximal entre deux signaux d'un participant pour que l'intervalle soit compté comme présence
+ATTENDANCE_HEARTBEAT_TIMEOUT = int(os.getenv("ATTENDANCE_HEARTBEAT_TIMEOUT", "90"))
+# Au-delà, les événements les plus anciens sont abandonnés (base indisponible)
+ATTENDANCE_BUFFER_MAX = int(os.getenv("ATTENDANCE_BUFFER_MAX", "100000"))
+ATTENDANCE_INSERT_CHUNK = 1000
+# Temps de présence cumulé (toutes sessions de la conférence) ouvrant droit au certificat
+# de participation, pour un participant inscrit (inscription payée)
+ATTENDANCE_MIN_MINUTES = float(os.getenv("ATTENDANCE_MIN_MINUTES", "10"))
+
+JOIN = "join"
+HEARTBEAT = "heartbeat"
+LEAVE = "leave"
+EVENT_TYPES = (JOIN, HEARTBEAT, LEAVE)
+
+events_table = AttendanceEvent.__table__
+attendance_table = SessionAttendance.__table__
+participants_table = ConferenceParticipant.__table__
+
+
+def _aggregate(events: List[dict]) -> List[dict]:
+    """
+    Regroupe les événements d'un lot par (session, utilisateur). Le temps compté à l'intérieur
+    du lot est calculé ici ; l'écart avec le dernier signal déjà en base est ajouté par l'upsert.
+    """
+    grouped = defaultdict(list)
+    for event in events:
+        grouped[(event["session_id"], event["user_id"])].append(event)
+
+    rows = []
+    for (session_id, user_id), user_events in grouped.items():
+        user_events.sort(key=lambda e: e["occurred_at"])
+        seconds = 0
+        present = None
+        previous = None
+        for event in user_events:
+            if present and previous is not None:
+                gap = (event["occurred_at"] - previous).total_seconds()
+                if gap <= ATTENDANCE_HEARTBEAT_TIMEOUT:
+                    seconds += gap
+            present = event["event_type"] != LEAVE
+            previous = event["occurred_at"]
+        rows.append({
+            "session_id": session_id,
+            "user_id": user_id,
+            "conference_id": user_events[0]["conference_id"],
+            "first_seen": user_events[0]["occurred_at"],
+            "last_seen": user_events[-1]["occurred_at"],
+            "seconds": int(round(seconds)),
+            "joins": sum(1 for e in user_events if e["event_type"] == JOIN),
+            "present": present,
+        })
+    return rows
+
+
+def _upsert_attendance(db, rows: List[dict]):
+    stmt = pg_insert(attendance_table).values(rows)
+    current, excluded = attendance_table.c, stmt.excluded
+    gap = func.extract("epoch", excluded.first_seen - current.last_seen)
+    # Intervalle entre le dernier signal enregistré et le premier signal de ce lot
+    carried = case(
+        (current.present & (gap > 0) & (gap <= ATTENDANCE_HEARTBEAT_TIMEOUT), func.round(gap)),
+        else_=0
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[current.session_id, current.user_id],
+        set_={
+            "seconds": current.seconds + excluded.seconds + carried,
+            "joins": current.joins + excluded.joins,
+            "first_seen": func.least(current.first_seen, excluded.first_seen),
+            "last_seen": func.greatest(current.last_seen, excluded.last_seen),
+            "present": excluded.present,
+        }
+    )
+    db.execute(stmt)
+
+
+def _record_participants(db, pairs):
+    """
+    Inscrit comme participants (certificat de participation) les utilisateurs du lot dont
+    l'inscription est payée et dont la présence cumulée atteint ATTENDANCE_MIN_MINUTES
+    """
+    if not pairs:
+        return
+    attendance = attendance_table.c
+    eligible = (
+        select(attendance.user_id, attendance.conference_id)
+        .join(Registration, and_(
+            Registration.user_id == attendance.user_id,
+            Registration.conference_id == attendance.conference_id,
+            Registration.status == "paid"
+        ))
+        .where(tuple_(attendance.user_id, attendance.conference_id).in_(sorted(pairs)))
+        .group_by(attendance.user_id, attendance.conference_id)
+        .having(func.sum(attendance.seconds) >= ATTENDANCE_MIN_MINUTES * 60)
+    )
+    db.execute(
+        pg_insert(participants_table)
+        .from_select(["user_id", "conference_id"], eligible)
+        .on_conflict_do_nothing()
+    )
+
+
+def valid_attendance_events(events: List[dict]) -> List[dict]:
+    """
+    Événements dont la session (de la bonne conférence) et l'utilisateur existent encore ;
+    utilisé quand un lot échoue sur une clé étrangère
+    """
+    db = SessionLocal()
+    try:
+        sessions = set(db.execute(
+            select(LiveSession.id, LiveSession.conference_id)
+            .where(LiveSession.id.in_({event["session_id"] for event in events}))
+        ).all())
+        users = set(db.execute(
+            select(User.id).where(User.id.in_({event["user_id"] for event in events}))
+        ).scalars())
+    finally:
+        db.close()
+    return [
+        event for event in events
+        if (event["session_id"], event["conference_id"]) in sessions and event["user_id"] in users
+    ]
+
+
+def write_attendance_batch(events: List[dict]):
+    """
+    Une transaction par lot : insertion multi-lignes du journal, agrégation dans
+    session_attendance et inscription des participants (certificat de participation)
+    """
+    db = SessionLocal()
+    try:
+        for start in range(0, len(events), ATTENDANCE_INSERT_CHUNK):
+            db.execute(insert(events_table).values(events[start:start + ATTENDANCE_INSERT_CHUNK]))
+
+        rows = sorted(_aggregate(events), key=lambda r: (r["session_id"], r["user_id"]))
+        for start in range(0, len(rows), ATTENDANCE_INSERT_CHUNK):
+            _upsert_attendance(db, rows[start:start + ATTENDANCE_INSERT_CHUNK])
+
+        _record_participants(db, {(row["user_id"], row["conference_id"]) for row in rows})
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+class AttendanceBuffer:
+    """
+    Tampon en mémoire des événements de présence, vidé toutes les ATTENDANCE_FLUSH_INTERVAL
+    secondes par une tâche de fond : 5 000 participants produisent un lot, pas 5 000 commits.
+    """
+
+    def __init__(self, interval: float = ATTENDANCE_FLUSH_INTERVAL, max_size: int = ATTENDANCE_BUFFER_MAX):
+        self.interval = interval
+        self.max_size = max_size
+        self._events: List[dict] = []
+        self._lock = Lock()
+        self._task = None
+        self.dropped = 0
+
+    def record(self, event_type: str, conference_id: int, session_id: int, user_id: int):
+        event = {
+            "session_id": session_id,
+            "conference_id": conference_id,
+            "user_id": user_id,
+            "event_type": event_type,
+            "occurred_at": datetime.utcnow(),
+        }
+        with self._lock:
+            self._events.append(event)
+            self._trim()
+
+    def _trim(self):
+        overflow = len(self._events) - self.max_size
+        if overflow > 0:
+            del self._events[:overflow]
+            self.dropped += overflow
+
+    def pending(self) -> int:
+        return len(self._events)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self):
+        with self._lock:
+            events, self._events = self._events, []
+        if not events:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            try:
+                await loop.run_in_executor(None, write_attendance_batch, events)
+            except IntegrityError:
+                # Session, conférence ou utilisateur supprimé entre-temps : seuls les
+                # événements concernés sont abandonnés, le reste du lot est réécrit
+                valid = await loop.run_in_executor(None, valid_attendance_events, events)
+                self.dropped += len(events) - len(valid)
+                print(f"Présences abandonnées: {len(events) - len(valid)} événements sur {len(events)}")
+                events = valid
+                if events:
+                    await loop.run_in_executor(None, write_attendance_batch, events)
+        except IntegrityError as e:
+            # Suppression concurrente pendant la relecture : le lot ne passera pas
+            self.dropped += len(events)
+            print(f"Lot de présences abandonné ({len(events)} événements): {e}")
+        except Exception as e:
+            print(f"Erreur lors de l'écriture des présences ({len(events)} événements): {e}")
+            # On remet le lot en tête pour le prochain passage
+            with self._lock:
+                self._events[:0] = events
+                self._trim()
+
+
+attendance_buffer = AttendanceBuffer()
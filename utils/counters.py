@@ -0,0 +1,340 @@
+import enum
+import json
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import and_, event, func, inspect, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, object_session
+
+from models.conference_counters import ConferenceCounters
+from models.conferences import Conference
+from models.abstracts import Abstract, AbstractStatus, PresentationType
+from models.reviews import Review
+from models.reviewers import Reviewer
+from models.registration import Registration
+from models.certificate import Certificate
+from models.LiveSession import LiveSession
+
+COUNTER_COLUMNS = (
+    "abstracts",
+    "oral_accepted",
+    "poster_accepted",
+    "rejected",
+    "reviews",
+    "reviewers",
+    "participants",
+    "cert_participants",
+    "cert_speakers",
+    "cert_reviewers",
+    "sessions_total",
+)
+
+CERTIFICATE_COLUMNS = {
+    "participation": "cert_participants",
+    "presentation": "cert_speakers",
+    "reviewer": "cert_reviewers",
+}
+
+counters_table = ConferenceCounters.__table__
+
+
+def _value(v):
+    # Certains chemins écrivent les statuts sous forme de chaînes ('accepted'), d'autres en Enum
+    return v.value if isinstance(v, enum.Enum) else v
+
+
+def _abstract_counters(values):
+    counters = {"abstracts": 1}
+    status = _value(values["status"])
+    presentation_type = _value(values["presentation_type"])
+    if status == AbstractStatus.accepted.value:
+        if presentation_type == PresentationType.ORAL.value:
+            counters["oral_accepted"] = 1
+        elif presentation_type == PresentationType.E_POSTER.value:
+            counters["poster_accepted"] = 1
+    elif status == AbstractStatus.rejected.value:
+        counters["rejected"] = 1
+    return counters
+
+
+def _registration_counters(values):
+    return {"participants": 1} if values["status"] == "paid" else {}
+
+
+def _certificate_counters(values):
+    column = CERTIFICATE_COLUMNS.get(values["certificate_type"])
+    return {column: 1} if column else {}
+
+
+# Modèle -> (attributs lus, contribution d'une ligne aux compteurs)
+_TRACKED = {
+    Abstract: (("conference_id", "status", "presentation_type"), _abstract_counters),
+    Review: (("abstract_id",), lambda values: {"reviews": 1}),
+    Reviewer: (("conference_id",), lambda values: {"reviewers": 1}),
+    Registration: (("conference_id", "status"), _registration_counters),
+    Certificate: (("conference_id", "certificate_type"), _certificate_counters),
+    LiveSession: (("conference_id",), lambda values: {"sessions_total": 1}),
+}
+
+
+def empty_counters():
+    return {column: 0 for column in COUNTER_COLUMNS}
+
+
+def compute_counters(bind, conference_ids: Optional[Iterable[int]] = None) -> Dict[int, dict]:
+    """
+    Recalcule les compteurs à partir des tables sources : une requête GROUP BY conference_id
+    par table, fusionnées en Python. `bind` peut être une Session ou une Connection.
+    """
+    if conference_ids is not None:
+        conference_ids = list(conference_ids)
+        if not conference_ids:
+            return {}
+
+    def grouped(stmt, column):
+        if conference_ids is not None:
+            stmt = stmt.where(column.in_(conference_ids))
+        return stmt.group_by(column)
+
+    queries = [
+        grouped(select(
+            Abstract.conference_id.label("conference_id"),
+            func.count().label("abstracts"),
+            func.count().filter(and_(
+                Abstract.status == AbstractStatus.accepted,
+                Abstract.presentation_type == PresentationType.ORAL
+            )).label("oral_accepted"),
+            func.count().filter(and_(
+                Abstract.status == AbstractStatus.accepted,
+                Abstract.presentation_type == PresentationType.E_POSTER
+            )).label("poster_accepted"),
+            func.count().filter(Abstract.status == AbstractStatus.rejected).label("rejected"),
+        ), Abstract.conference_id),
+        grouped(select(
+            Abstract.conference_id.label("conference_id"),
+            func.count(Review.id).label("reviews"),
+        ).select_from(Review).join(Abstract, Review.abstract_id == Abstract.id), Abstract.conference_id),
+        grouped(select(
+            Reviewer.conference_id.label("conference_id"),
+            func.count().label("reviewers"),
+        ), Reviewer.conference_id),
+        grouped(select(
+            Registration.conference_id.label("conference_id"),
+            func.count().filter(Registration.status == 'paid').label("participants"),
+        ), Registration.conference_id),
+        grouped(select(
+            Certificate.conference_id.label("conference_id"),
+            *[
+                func.count().filter(Certificate.certificate_type == cert_type).label(column)
+                for cert_type, column in CERTIFICATE_COLUMNS.items()
+            ],
+        ), Certificate.conference_id),
+        grouped(select(
+            LiveSession.conference_id.label("conference_id"),
+            func.count().label("sessions_total"),
+        ), LiveSession.conference_id),
+    ]
+
+    counters = defaultdict(empty_counters)
+    for stmt in queries:
+        for row in bind.execute(stmt).mappings():
+            if row["conference_id"] is None:
+                continue
+            values = dict(row)
+            counters[values.pop("conference_id")].update(values)
+    return dict(counters)
+
+
+def reconcile_counters(db, conference_ids: Optional[Iterable[int]] = None) -> dict:
+    """
+    Recalcule en masse les compteurs, corrige la table conference_counters et retourne
+    les écarts constatés (drift) ainsi que les conférences dont la ligne a été créée
+    """
+    if conference_ids is None:
+        conference_ids = list(db.execute(select(Conference.id)).scalars())
+    else:
+        conference_ids = list(conference_ids)
+    if not conference_ids:
+        return {"drift": [], "initialized": []}
+
+    actual = compute_counters(db, conference_ids)
+    stored = {
+        row.conference_id: row
+        for row in db.query(ConferenceCounters).filter(ConferenceCounters.conference_id.in_(conference_ids))
+    }
+
+    drift = []
+    initialized = []
+    rows = []
+    for conference_id in conference_ids:
+        expected = actual.get(conference_id, empty_counters())
+        current = stored.get(conference_id)
+        changed = current is None
+        if current is None:
+            initialized.append(conference_id)
+        else:
+            for column in COUNTER_COLUMNS:
+                if getattr(current, column) != expected[column]:
+                    changed = True
+                    drift.append({
+                        "conference_id": conference_id,
+                        "counter": column,
+                        "stored": getattr(current, column),
+                        "actual": expected[column],
+                    })
+        if changed:
+            rows.append({"conference_id": conference_id, "updated_at": datetime.utcnow(), **expected})
+
+    if rows:
+        stmt = pg_insert(counters_table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[counters_table.c.conference_id],
+            set_={column: stmt.excluded[column] for column in COUNTER_COLUMNS + ("updated_at",)}
+        )
+        db.execute(stmt)
+    db.commit()
+    return {"drift": drift, "initialized": initialized}
+
+
+# --- Maintenance incrémentale via les événements du mapper ---
+
+def _conference_id(connection, model, values):
+    if model is Review:
+        if values["abstract_id"] is None:
+            return None
+        return connection.execute(
+            select(Abstract.conference_id).where(Abstract.id == values["abstract_id"])
+        ).scalar()
+    return values["conference_id"]
+
+
+def _current_values(target, attrs):
+    return {attr: getattr(target, attr) for attr in attrs}
+
+
+def _previous_values(target, attrs):
+    state = inspect(target)
+    values = {}
+    for attr in attrs:
+        history = state.attrs[attr].history
+        if history.deleted:
+            values[attr] = history.deleted[0]
+        elif history.unchanged:
+            values[attr] = history.unchanged[0]
+        else:
+            values[attr] = getattr(target, attr)
+    return values
+
+
+def _increment(connection, conference_id, deltas) -> bool:
+    """
+    Applique les variations ; retourne True si la ligne de compteurs a dû être initialisée
+    """
+    result = connection.execute(
+        update(counters_table)
+        .where(counters_table.c.conference_id == conference_id)
+        .values(
+            updated_at=datetime.utcnow(),
+            **{column: counters_table.c[column] + delta for column, delta in deltas.items()}
+        )
+    )
+    if result.rowcount:
+        return False
+    # Première écriture pour cette conférence : on initialise à partir des tables sources,
+    # qui contiennent déjà la ligne qui vient d'être écrite dans cette transaction. Si une
+    # transaction concurrente a créé la ligne entre-temps, son initialisation ne voit pas
+    # notre ligne : on lui ajoute notre variation dans le même upsert.
+    counters = compute_counters(connection, [conference_id]).get(conference_id, empty_counters())
+    stmt = pg_insert(counters_table).values(
+        conference_id=conference_id, updated_at=datetime.utcnow(), **counters
+    )
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=[counters_table.c.conference_id],
+        set_={
+            "updated_at": stmt.excluded.updated_at,
+            **{column: counters_table.c[column] + delta for column, delta in deltas.items()}
+        }
+    ))
+    return True
+
+
+# Le flush écrit toutes les lignes d'un modèle avant d'appeler ses événements after_* : une
+# initialisation compte donc déjà les autres lignes du même lot (insertions / mises à jour,
+# ou suppressions), dont les variations ne doivent pas être ajoutées une seconde fois.
+# Session.info[SEEDED_KEY] : conference_id -> (modèle, phase) du lot qui l'a initialisée,
+# vidé à la fin de chaque flush.
+SEEDED_KEY = "conference_counters_seeded"
+
+
+def _seeded(target) -> dict:
+    session = object_session(target)
+    return session.info.setdefault(SEEDED_KEY, {}) if session is not None else {}
+
+
+def _apply_change(connection, model, previous, current, seeded, phase):
+    _, contribute = _TRACKED[model]
+    deltas = defaultdict(lambda: defaultdict(int))
+    for values, sign in ((previous, -1), (current, 1)):
+        if values is None:
+            continue
+        conference_id = _conference_id(connection, model, values)
+        if conference_id is None:
+            continue
+        for column, count in contribute(values).items():
+            deltas[int(conference_id)][column] += sign * count
+
+    for conference_id, columns in deltas.items():
+        columns = {column: delta for column, delta in columns.items() if delta}
+        if not columns or seeded.get(conference_id) == (model, phase):
+            continue
+        if _increment(connection, conference_id, columns):
+            seeded[conference_id] = (model, phase)
+
+
+def _register_listeners(model, attrs):
+    @event.listens_for(model, "after_insert")
+    def after_insert(mapper, connection, target):
+        _apply_change(connection, model, None, _current_values(target, attrs), _seeded(target), "save")
+
+    @event.listens_for(model, "after_update")
+    def after_update(mapper, connection, target):
+        state = inspect(target)
+        if not any(state.attrs[attr].history.has_changes() for attr in attrs):
+            return
+        _apply_change(
+            connection, model, _previous_values(target, attrs), _current_values(target, attrs),
+            _seeded(target), "save"
+        )
+
+    @event.listens_for(model, "after_delete")
+    def after_delete(mapper, connection, target):
+        _apply_change(connection, model, _previous_values(target, attrs), None, _seeded(target), "delete")
+
+
+@event.listens_for(Session, "after_flush")
+def _clear_seeded(session, flush_context):
+    session.info.pop(SEEDED_KEY, None)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _clear_seeded_on_rollback(session, previous_transaction):
+    session.info.pop(SEEDED_KEY, None)
+
+
+for _model, (_attrs, _) in _TRACKED.items():
+    _register_listeners(_model, _attrs)
+
+
+if __name__ == "__main__":
+    # Job de réconciliation : python -m utils.counters
+    import models  # noqa: F401  (enregistre tous les modèles et leurs relations)
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        report = reconcile_counters(db)
+    finally:
+        db.close()
+    print(json.dumps(report, indent=2, default=str))
@@ -0,0 +1,379 @@
+import asyncio
+import os
+import smtplib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import List, Optional, Set
+
+from sqlalchemy import and_, func, or_, tuple_, update
+
+from database import SessionLocal
+from models.email_outbox import EmailOutbox
+
+# Serveur SMTP. SMTP_SECURITY : "starttls" (port 587), "ssl" (port 465) ou "none" (relais
+# local, puits de test smtp_sink.py). Aucun identifiant par défaut : sans SMTP_USER /
+# SMTP_PASSWORD (hors "none") ni expéditeur, rien n'est envoyé (voir smtp_config_error)
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_SECURITY = os.getenv("SMTP_SECURITY", "starttls")
+SMTP_USER = os.getenv("SMTP_USER", "")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+SMTP_FROM = os.getenv("SMTP_FROM", SMTP_USER)
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+
+# Workers d'envoi (chacun garde sa connexion SMTP ouverte tant qu'il a des emails à envoyer)
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", "4"))
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "20"))
+# Délai maximal avant qu'un email écrit par un autre processus soit vu (secondes)
+EMAIL_POLL_INTERVAL = float(os.getenv("EMAIL_POLL_INTERVAL", "2"))
+# Échecs temporaires : nouvelle tentative après EMAIL_RETRY_BASE * 2^(n-1) secondes ; après
+# EMAIL_MAX_ATTEMPTS tentatives l'email passe en lettre morte (dead)
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "8"))
+EMAIL_RETRY_BASE = float(os.getenv("EMAIL_RETRY_BASE", "30"))
+EMAIL_RETRY_MAX_DELAY = float(os.getenv("EMAIL_RETRY_MAX_DELAY", "3600"))
+# Durée de réservation des emails d'un lot, renouvelée avant chaque envoi : elle doit couvrir
+# un envoi (connexion, TLS, authentification, envoi : plusieurs SMTP_TIMEOUT). Si le worker
+# disparaît, ses emails sont repris ensuite.
+EMAIL_LEASE = float(os.getenv("EMAIL_LEASE", str(max(300.0, 5 * SMTP_TIMEOUT))))
+
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+DEAD = "dead"
+STATUSES = (PENDING, SENDING, SENT, DEAD)
+
+
+def queue_email(db, to_email: str, subject: str, text_body: str, html_body: Optional[str] = None) -> EmailOutbox:
+    """
+    Ajoute un email à la file d'envoi, sans valider la transaction : l'email ne part que si
+    la modification qui l'accompagne est validée. Appeler email_worker.wake() après le commit.
+    """
+    email = EmailOutbox(
+        to_email=to_email,
+        subject=subject,
+        text_body=text_body,
+        html_body=html_body,
+        status=PENDING,
+        attempts=0,
+        next_attempt_at=datetime.utcnow()
+    )
+    db.add(email)
+    return email
+
+
+# --- Accès à la file (threads du pool) ---
+
+def claim_emails(limit: int) -> List[dict]:
+    """
+    Réserve jusqu'à `limit` emails à envoyer. FOR UPDATE SKIP LOCKED : des workers (et des
+    processus) concurrents se partagent la file sans jamais réserver le même email.
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        rows = db.query(EmailOutbox).filter(or_(
+            and_(EmailOutbox.status == PENDING, EmailOutbox.next_attempt_at <= now),
+            and_(EmailOutbox.status == SENDING, EmailOutbox.locked_until < now)
+        )).order_by(EmailOutbox.next_attempt_at).limit(limit).with_for_update(skip_locked=True).all()
+        emails = []
+        for row in rows:
+            row.status = SENDING
+            row.locked_until = now + timedelta(seconds=EMAIL_LEASE)
+            row.attempts += 1
+            emails.append({
+                "id": row.id,
+                "to_email": row.to_email,
+                "subject": row.subject,
+                "text_body": row.text_body,
+                "html_body": row.html_body,
+                "attempts": row.attempts,
+            })
+        db.commit()
+        return emails
+    finally:
+        db.close()
+
+
+def _claimed(email_id: int, attempts: int):
+    # Le numéro de tentative sert de jeton de réservation : un worker dont la réservation a
+    # expiré et été reprise ne peut plus modifier l'email
+    return and_(EmailOutbox.id == email_id, EmailOutbox.attempts == attempts, EmailOutbox.status == SENDING)
+
+
+def renew_lease(emails: List[dict]) -> Set[int]:
+    """
+    Prolonge la réservation des emails restants d'un lot ; retourne les ids encore réservés
+    par ce worker
+    """
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            update(EmailOutbox)
+            .where(
+                tuple_(EmailOutbox.id, EmailOutbox.attempts).in_([(e["id"], e["attempts"]) for e in emails]),
+                EmailOutbox.status == SENDING
+            )
+            .values(locked_until=datetime.utcnow() + timedelta(seconds=EMAIL_LEASE))
+            .returning(EmailOutbox.id)
+        ).scalars().all()
+        db.commit()
+        return set(rows)
+    finally:
+        db.close()
+
+
+def mark_sent(email_id: int, attempts: int):
+    db = SessionLocal()
+    try:
+        db.query(EmailOutbox).filter(_claimed(email_id, attempts)).update(
+            {"status": SENT, "sent_at": datetime.utcnow(), "locked_until": None, "last_error": None},
+            synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def mark_failed(email_id: int, attempts: int, error: str, permanent: bool) -> Optional[str]:
+    """
+    Replanifie l'email avec un délai croissant, ou le passe en lettre morte ; retourne le
+    nouveau statut, None si la réservation a été reprise par un autre worker
+    """
+    if permanent or attempts >= EMAIL_MAX_ATTEMPTS:
+        values = {"status": DEAD}
+    else:
+        delay = min(EMAIL_RETRY_BASE * 2 ** (attempts - 1), EMAIL_RETRY_MAX_DELAY)
+        values = {"status": PENDING, "next_attempt_at": datetime.utcnow() + timedelta(seconds=delay)}
+    values.update({"locked_until": None, "last_error": error[:2000]})
+    db = SessionLocal()
+    try:
+        updated = db.query(EmailOutbox).filter(_claimed(email_id, attempts)).update(
+            values, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+    return values["status"] if updated else None
+
+
+def outbox_counts(db) -> dict:
+    counts = dict(db.query(EmailOutbox.status, func.count()).group_by(EmailOutbox.status).all())
+    return {status: counts.get(status, 0) for status in STATUSES}
+
+
+# --- Envoi SMTP ---
+
+class SMTPConfigurationError(RuntimeError):
+    pass
+
+
+def smtp_config_error() -> Optional[str]:
+    """Retourne la raison pour laquelle la configuration SMTP est inutilisable, None sinon"""
+    if SMTP_SECURITY not in ("starttls", "ssl", "none"):
+        return f"SMTP_SECURITY invalide: {SMTP_SECURITY} (attendu: starttls, ssl ou none)"
+    if SMTP_SECURITY != "none" and not (SMTP_USER and SMTP_PASSWORD):
+        return "SMTP_USER et SMTP_PASSWORD doivent être définis"
+    if not SMTP_FROM:
+        return "SMTP_FROM (ou SMTP_USER) doit être défini"
+    return None
+
+
+def build_message(email: dict) -> MIMEMultipart:
+    message = MIMEMultipart("alternative")
+    message["Subject"] = email["subject"]
+    message["From"] = SMTP_FROM
+    message["To"] = email["to_email"]
+    message.attach(MIMEText(email["text_body"], "plain"))
+    if email["html_body"]:
+        message.attach(MIMEText(email["html_body"], "html"))
+    return message
+
+
+class SMTPConnection:
+    """
+    Connexion SMTP d'un worker, ouverte au premier envoi et réutilisée pour les suivants
+    (une seule poignée de main TLS et authentification par lot)
+    """
+
+    def __init__(self):
+        self._server = None
+
+    def _connect(self):
+        error = smtp_config_error()
+        if error:
+            raise SMTPConfigurationError(error)
+        if SMTP_SECURITY == "ssl":
+            server = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        else:
+            server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+            if SMTP_SECURITY == "starttls":
+                server.starttls()
+        if SMTP_SECURITY != "none":
+            server.login(SMTP_USER, SMTP_PASSWORD)
+        return server
+
+    def send(self, email: dict):
+        message = build_message(email).as_string()
+        if self._server is not None:
+            try:
+                self._server.sendmail(SMTP_FROM, [email["to_email"]], message)
+                return
+            except smtplib.SMTPServerDisconnected:
+                # Connexion fermée par le serveur pendant l'inactivité : on en rouvre une
+                self._server = None
+            except OSError:
+                self._server = None
+                raise
+        self._server = self._connect()
+        try:
+            self._server.sendmail(SMTP_FROM, [email["to_email"]], message)
+        except (smtplib.SMTPServerDisconnected, OSError):
+            self._server = None
+            raise
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+
+def _is_permanent(error: Exception) -> bool:
+    # Refus définitif du serveur (5xx) : inutile de réessayer. Une erreur d'authentification
+    # vient de la configuration, pas de l'email : elle reste temporaire.
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return False
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+
+class EmailOutboxWorker:
+    """
+    Envoi en arrière-plan des emails de la table email_outbox par EMAIL_WORKERS workers.
+    Chaque worker réserve un lot, l'envoie sur sa connexion SMTP et enregistre le résultat de
+    chaque email ; sans travail il attend un réveil (wake) ou EMAIL_POLL_INTERVAL.
+
+    Un email est envoyé au moins une fois : si le processus s'arrête entre l'envoi et
+    l'enregistrement du résultat, il sera renvoyé après EMAIL_LEASE.
+
+    Si la configuration SMTP est incomplète, les workers ne démarrent pas : les emails
+    restent en attente (pending) sans consommer de tentative.
+    """
+
+    def __init__(self, workers: int = EMAIL_WORKERS):
+        self.workers = workers
+        self.sent = 0
+        self.retried = 0
+        self.dead = 0
+        self._pool = None
+        self._tasks = []
+        self._connections = []
+        self._wake = None
+        self._loop = None
+        self.config_error = None
+
+    def wake(self):
+        """Signale de nouveaux emails ; peut être appelé depuis un thread (routes synchrones)"""
+        if self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._wake.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def start(self):
+        self.config_error = smtp_config_error()
+        if self.config_error:
+            print(f"Envoi des emails désactivé: {self.config_error}")
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="email")
+        for _ in range(self.workers):
+            connection = SMTPConnection()
+            self._connections.append(connection)
+            self._tasks.append(asyncio.create_task(self._run(connection)))
+
+    async def stop(self):
+        # Les lots réservés et non envoyés seront repris après EMAIL_LEASE
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        if self._pool is not None:
+            for connection in self._connections:
+                self._pool.submit(connection.close)
+            self._pool.shutdown(wait=False)
+            self._pool = None
+        self._connections = []
+
+    def metrics(self) -> dict:
+        return {
+            "workers": len(self._tasks),
+            "sent": self.sent,
+            "retried": self.retried,
+            "dead": self.dead,
+            "config_error": self.config_error,
+        }
+
+    async def _run(self, connection: SMTPConnection):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                emails = await loop.run_in_executor(self._pool, claim_emails, EMAIL_BATCH_SIZE)
+            except Exception as e:
+                print(f"Erreur lors de la lecture de la file d'emails: {e}")
+                emails = []
+            if not emails:
+                # Rien à envoyer : on libère la connexion SMTP jusqu'au prochain lot
+                await loop.run_in_executor(self._pool, connection.close)
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=EMAIL_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                continue
+            for position, email in enumerate(emails):
+                try:
+                    owned = await loop.run_in_executor(self._pool, renew_lease, emails[position:])
+                    if email["id"] not in owned:
+                        # Réservation expirée et reprise par un autre worker : il l'enverra
+                        continue
+                    await self._deliver(loop, connection, email)
+                except Exception as e:
+                    # Résultat non enregistré : l'email sera repris après EMAIL_LEASE
+                    print(f"Erreur lors de l'enregistrement de l'email {email['id']}: {e}")
+
+    async def _deliver(self, loop, connection: SMTPConnection, email: dict):
+        try:
+            await loop.run_in_executor(self._pool, connection.send, email)
+        except Exception as e:
+            status = await loop.run_in_executor(
+                self._pool, mark_failed, email["id"], email["attempts"], f"{type(e).__name__}: {e}", _is_permanent(e)
+            )
+            if status == DEAD:
+                self.dead += 1
+                print(f"Email {email['id']} à {email['to_email']} abandonné: {e}")
+            elif status is not None:
+                self.retried += 1
+            return
+        await loop.run_in_executor(self._pool, mark_sent, email["id"], email["attempts"])
+        self.sent += 1
+
+
+email_worker = EmailOutboxWorker()
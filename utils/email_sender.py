@@ -7,21 +7,30 @@ from fpdf import FPDF
 import io
 from PIL import Image
 import qrcode
+from utils.email_outbox import (
+    queue_email, smtp_config_error, SMTPConfigurationError,
+    SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASSWORD, SMTP_FROM
+)
 
 class EmailSender:
     def __init__(self):
-        # Gmail SMTP configuration
-        self.smtp_server = "smtp.gmail.com"
-        self.smtp_port = 587  # Using TLS port instead of SSL
-        self.from_email = "sundusnidar@gmail.com"  # Replace with your Gmail
-        self.password = "wzja gtwm lttz molj"  # Replace with your app password
+        # SMTP configuration (SMTP_* environment variables, see utils/email_outbox)
+        self.smtp_server = SMTP_HOST
+        self.smtp_port = SMTP_PORT
+        self.from_email = SMTP_FROM
+        self.login = SMTP_USER
+        self.password = SMTP_PASSWORD
         
-        print(f"Email sender initialized with Gmail: {self.from_email}")
+        print(f"Email sender initialized with: {self.from_email}")
 
     def send_email(self, to_email: str, subject: str, text_body: str, html_body: str = None):
         """
         Send an email using Gmail SMTP
         """
+        # No default credentials: refuse to send until SMTP_* is configured
+        error = smtp_config_error()
+        if error:
+            raise SMTPConfigurationError(error)
         try:
             print(f"\n=== Starting email sending process to {to_email} ===")
             
@@ -54,7 +63,7 @@ class EmailSender:
             
             # Login
             print("\nAttempting to login...")
-            server.login(self.from_email, self.password)
+            server.login(self.login, self.password)
             print("✓ Successfully logged in to Gmail")
             
             # Send email
@@ -81,9 +90,10 @@ class EmailSender:
             except Exception as e:
                 print(f"❌ Error closing SMTP connection: {str(e)}")
 
-    def send_reviewer_invitation(self, to_email: str, conference_title: str, accept_url: str, reject_url: str):
+    def send_reviewer_invitation(self, db, to_email: str, conference_title: str, accept_url: str, reject_url: str):
         """
-        Send a reviewer invitation email
+        Queue a reviewer invitation email in the outbox. It is sent by the background
+        workers once the caller commits the transaction (call email_worker.wake() after).
         """
         try:
             print(f"\n=== Preparing reviewer invitation for {to_email} ===")
@@ -147,8 +157,8 @@ class EmailSender:
             Cet email a été envoyé automatiquement. Merci de ne pas y répondre directement.
             """
 
-            # Send the email
-            return self.send_email(to_email, subject, text_body, html_body)
+            # Queue the email in the same transaction as the invitation
+            return queue_email(db, to_email, subject, text_body, html_body)
             
         except Exception as e:
             print(f"\n❌ Error preparing reviewer invitation: {str(e)}")
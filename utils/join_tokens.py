@@ -0,0 +1,87 @@
+import os
+import time
+from typing import Optional
+
+import jwt
+from jwt.exceptions import PyJWTError
+
+from auth import SECRET_KEY, ALGORITHM
+from utils.live_state import registry
+
+# Secret partagé avec le hook d'authentification Jitsi. Obligatoire et distinct de la clé des
+# jetons d'accès : la configuration Jitsi ne doit pas permettre de forger des jetons de l'API
+JOIN_TOKEN_SECRET = os.getenv("JOIN_TOKEN_SECRET")
+JOIN_TOKEN_TTL = int(os.getenv("JOIN_TOKEN_TTL", "300"))
+JOIN_TOKEN_ISSUER = os.getenv("JOIN_TOKEN_ISSUER", "vrtlconf")
+JOIN_TOKEN_AUDIENCE = os.getenv("JOIN_TOKEN_AUDIENCE", "vrtlconf-live")
+
+TOKEN_TYPE = "join"
+
+
+class JoinTokenError(Exception):
+    """Jeton absent, falsifié, expiré, révoqué ou émis pour une autre salle"""
+
+
+def check_join_token_secret():
+    """
+    Démarrage de l'application : refuse de démarrer sans secret dédié
+    """
+    if not JOIN_TOKEN_SECRET:
+        raise RuntimeError("JOIN_TOKEN_SECRET n'est pas défini (secret partagé avec Jitsi)")
+    if JOIN_TOKEN_SECRET == SECRET_KEY:
+        raise RuntimeError("JOIN_TOKEN_SECRET doit être différent de la clé des jetons d'accès (JWT_SECRET_KEY)")
+
+
+def room_name(conference_id: int) -> str:
+    # Même nom de salle que le frontend (LiveStreamRoom)
+    return f"vrtlconf-conference-{conference_id}"
+
+
+def issue_join_token(user_id: int, conference_id: int, active_session: dict) -> dict:
+    """
+    Jeton court signé (HS256) liant l'utilisateur, la session, la salle et l'epoch courant
+    de la session. Aucun accès à la base : l'epoch vient du registre des sessions actives.
+    """
+    now = int(time.time())
+    claims = {
+        "typ": TOKEN_TYPE,
+        "iss": JOIN_TOKEN_ISSUER,
+        "aud": JOIN_TOKEN_AUDIENCE,
+        "uid": user_id,
+        "cid": conference_id,
+        "sid": active_session["id"],
+        "room": room_name(conference_id),
+        "ep": active_session.get("join_epoch", 0),
+        "iat": now,
+        "exp": now + JOIN_TOKEN_TTL,
+    }
+    return {
+        "join_token": jwt.encode(claims, JOIN_TOKEN_SECRET, algorithm=ALGORITHM),
+        "room": claims["room"],
+        "expires_at": claims["exp"],
+    }
+
+
+def verify_join_token(token: str, room: Optional[str] = None) -> dict:
+    """
+    Vérification purement cryptographique, complétée par le registre local : la session du
+    jeton doit être encore active et son epoch inchangé (sinon le jeton a été révoqué).
+    """
+    try:
+        claims = jwt.decode(
+            token, JOIN_TOKEN_SECRET, algorithms=[ALGORITHM],
+            audience=JOIN_TOKEN_AUDIENCE, issuer=JOIN_TOKEN_ISSUER
+        )
+    except PyJWTError:
+        raise JoinTokenError("Jeton invalide ou expiré")
+    if claims.get("typ") != TOKEN_TYPE:
+        raise JoinTokenError("Jeton invalide")
+    if room is not None and claims.get("room") != room:
+        raise JoinTokenError("Jeton émis pour une autre salle")
+
+    active_session = registry.get(claims["cid"])
+    if not active_session or active_session["id"] != claims["sid"]:
+        raise JoinTokenError("La session n'est plus active")
+    if active_session.get("join_epoch", 0) != claims["ep"]:
+        raise JoinTokenError("Jeton révoqué")
+    return claims
@@ -0,0 +1,205 @@
+import asyncio
+import heapq
+import itertools
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from database import SessionLocal
+from models.LiveSession import LiveSession, SessionStatus
+from utils.live_state import LIVE_SESSIONS_CHANNEL, SessionTransitionError, start_session, stop_session
+from utils.pubsub import pubsub
+
+# Durée d'une session lancée automatiquement avant son arrêt automatique ; une session lancée
+# par l'organisateur n'est arrêtée que par lui
+LIVE_SESSION_DURATION_MINUTES = float(os.getenv("LIVE_SESSION_DURATION_MINUTES", "60"))
+LIVE_SCHEDULER_ENABLED = os.getenv("LIVE_SCHEDULER_ENABLED", "1") == "1"
+# Attente maximale du minuteur : borne l'effet d'un changement de l'horloge système
+LIVE_SCHEDULER_MAX_SLEEP = 60.0
+
+START = "start"
+STOP = "stop"
+
+
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _parse(value: Optional[str]) -> Optional[datetime]:
+    return _naive_utc(datetime.fromisoformat(value)) if value else None
+
+
+class LiveSessionScheduler:
+    """
+    Lancement et arrêt automatiques des sessions live : un tas (heap) de transitions
+    (date, séquence, session, action) et une seule tâche minuteur qui dort jusqu'à la
+    prochaine échéance. Chaque session n'a qu'une transition en attente ; replanifier ou
+    annuler remplace l'entrée de _pending et l'ancienne entrée du tas est ignorée quand
+    elle remonte (suppression paresseuse).
+    """
+
+    def __init__(self, duration_minutes: float = LIVE_SESSION_DURATION_MINUTES):
+        self.duration = timedelta(minutes=duration_minutes)
+        self._heap: List[Tuple[datetime, int, int, str]] = []
+        # session_id -> (séquence, action) de la seule transition valide pour cette session
+        self._pending: Dict[int, Tuple[int, str]] = {}
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running = set()
+
+    # --- Planification ---
+
+    def schedule(self, session_id: int, action: str, when: datetime):
+        seq = next(self._sequence)
+        self._pending[session_id] = (seq, action)
+        heapq.heappush(self._heap, (when, seq, session_id, action))
+        if len(self._heap) > 2 * len(self._pending) + 64:
+            self._compact()
+        if self._wakeup is not None and self._heap[0][1] == seq:
+            # Nouvelle échéance la plus proche : on réveille le minuteur
+            self._wakeup.set()
+
+    def cancel(self, session_id: int):
+        self._pending.pop(session_id, None)
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def _compact(self):
+        self._heap = [entry for entry in self._heap if self._is_current(entry)]
+        heapq.heapify(self._heap)
+
+    def _is_current(self, entry) -> bool:
+        _, seq, session_id, action = entry
+        return self._pending.get(session_id) == (seq, action)
+
+    def _schedule_session(self, session_id: int, status: str, session_time: datetime,
+                          started_at: Optional[datetime], auto_started: bool = False):
+        if status == SessionStatus.PENDING.value:
+            # Une session dont le créneau est entièrement passé n'est pas lancée après coup
+            if session_time + self.duration > datetime.utcnow():
+                self.schedule(session_id, START, session_time)
+            else:
+                self.cancel(session_id)
+        elif status == SessionStatus.ACTIVE.value and auto_started:
+            self.schedule(session_id, STOP, (started_at or session_time) + self.duration)
+        else:
+            self.cancel(session_id)
+
+    def load(self, db):
+        """
+        Reconstruit la file depuis la base (démarrage, reconnexion au canal pub/sub)
+        """
+        rows = db.query(
+            LiveSession.id, LiveSession.status, LiveSession.session_time, LiveSession.started_at,
+            LiveSession.auto_started
+        ).filter(LiveSession.status.in_([SessionStatus.PENDING, SessionStatus.ACTIVE])).all()
+        self._heap = []
+        self._pending = {}
+        for session_id, status, session_time, started_at, auto_started in rows:
+            self._schedule_session(session_id, status.value, _naive_utc(session_time),
+                                   _naive_utc(started_at) if started_at else None, auto_started)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def on_session_event(self, event: dict):
+        event_type = event["type"]
+        if event_type in ("session_created", "session_started", "session_ended"):
+            session = event["session"]
+            self._schedule_session(
+                session["id"], session["status"], _parse(session["session_time"]), _parse(session["started_at"]),
+                session.get("auto_started", False)
+            )
+        elif event_type == "session_deleted":
+            self.cancel(event["session_id"])
+        # conference_deleted : les sessions supprimées en cascade seront ignorées au déclenchement
+
+    # --- Minuteur ---
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            while self._heap and not self._is_current(self._heap[0]):
+                heapq.heappop(self._heap)
+
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            delay = (self._heap[0][0] - datetime.utcnow()).total_seconds()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=min(delay, LIVE_SCHEDULER_MAX_SLEEP))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, session_id, action = heapq.heappop(self._heap)
+            del self._pending[session_id]
+            task = asyncio.create_task(self._fire(session_id, action))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _fire(self, session_id: int, action: str):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self._transition, session_id, action)
+        except Exception as e:
+            print(f"Erreur lors de la transition automatique ({action}) de la session {session_id}: {e}")
+
+    def _transition(self, session_id: int, action: str):
+        # Exécuté dans un thread ; l'événement publié met à jour le registre et replanifie
+        # la session (arrêt après lancement) sur tous les workers
+        db = SessionLocal()
+        try:
+            live_session = db.query(LiveSession).filter(LiveSession.id == session_id).first()
+            if live_session is None:
+                return
+            if action == START:
+                start_session(db, live_session, automatic=True)
+            else:
+                stop_session(db, live_session)
+        except SessionTransitionError:
+            # Transition déjà effectuée par un autre worker ou par l'organisateur
+            pass
+        finally:
+            db.close()
+
+
+scheduler = LiveSessionScheduler()
+
+
+async def start_live_scheduler(db):
+    """
+    Démarrage de l'application, après start_live_state
+    """
+    if not LIVE_SCHEDULER_ENABLED:
+        return
+    pubsub.subscribe(LIVE_SESSIONS_CHANNEL, scheduler.on_session_event)
+    pubsub.on_reconnect(_reload)
+    scheduler.load(db)
+    await scheduler.start()
+
+
+def _reload():
+    db = SessionLocal()
+    try:
+        scheduler.load(db)
+    finally:
+        db.close()
@@ -0,0 +1,249 @@
+import asyncio
+import os
+from datetime import datetime, time, timedelta, timezone
+from typing import Dict, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from database import SessionLocal
+from models.conferences import Conference
+from models.LiveSession import LiveSession, SessionStatus
+from utils.lobby import lobbies
+from utils.pubsub import pubsub
+from utils.push import conference_topic, session_topic
+from utils.push_delivery import notify
+from utils.stats_cache import invalidate_stats
+
+# Taille de la file de chaque abonné ; un client trop lent perd les événements les plus anciens
+LIVE_EVENTS_QUEUE_SIZE = int(os.getenv("LIVE_EVENTS_QUEUE_SIZE", "32"))
+# Fuseau des dates reçues sans fuseau (champ datetime-local d'anciens clients) ; les dates
+# des sessions sont stockées en UTC
+LIVE_SESSION_TIMEZONE = ZoneInfo(os.getenv("LIVE_SESSION_TIMEZONE", "UTC"))
+
+
+def to_utc(value: datetime) -> datetime:
+    """Date reçue d'un client -> UTC sans fuseau (stockage)"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=LIVE_SESSION_TIMEZONE)
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def utc_isoformat(value: Optional[datetime]) -> Optional[str]:
+    # Date stockée en UTC -> ISO 8601 avec décalage, lue correctement par new Date() côté client
+    return value.replace(tzinfo=timezone.utc).isoformat() if value else None
+
+
+def today_bounds() -> Tuple[datetime, datetime]:
+    """Début et fin (UTC) de la journée en cours dans LIVE_SESSION_TIMEZONE"""
+    today = datetime.now(LIVE_SESSION_TIMEZONE).date()
+    start = to_utc(datetime.combine(today, time.min))
+    return start, to_utc(datetime.combine(today + timedelta(days=1), time.min))
+
+
+def session_snapshot(live_session) -> Optional[dict]:
+    if live_session is None:
+        return None
+    return {
+        "id": live_session.id,
+        "session_title": live_session.session_title,
+        "session_time": utc_isoformat(live_session.session_time),
+        "status": live_session.status.value if hasattr(live_session.status, "value") else live_session.status,
+        "is_active": live_session.is_active,
+        "auto_started": bool(live_session.auto_started),
+        "started_at": utc_isoformat(live_session.started_at),
+        "ended_at": utc_isoformat(live_session.ended_at),
+        "organizer_id": live_session.organizer_id,
+        "join_epoch": live_session.join_epoch or 0
+    }
+
+
+class LiveSessionBroker:
+    """
+    Diffusion des changements d'état des sessions live aux clients abonnés (SSE / WebSocket)
+    d'une conférence. Doit être utilisé depuis la boucle asyncio de l'application.
+    """
+
+    def __init__(self, queue_size: int = LIVE_EVENTS_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+
+    def subscribe(self, conference_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(conference_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, conference_id: int, queue: asyncio.Queue):
+        queues = self._subscribers.get(conference_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[conference_id]
+
+    def publish(self, conference_id: int, event: dict):
+        for queue in self._subscribers.get(conference_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def subscriber_count(self, conference_id: int) -> int:
+        return len(self._subscribers.get(conference_id, ()))
+
+
+broker = LiveSessionBroker()
+
+
+class ActiveSessionRegistry:
+    """
+    Registre local au processus : conference_id -> instantané de la session active.
+    Alimenté au démarrage (warm) puis par les événements de session reçus via le canal pub/sub,
+    il permet de répondre à /active et /can-join sans accès à la base.
+    """
+
+    def __init__(self):
+        self._active: Dict[int, dict] = {}
+        self._conferences: Set[int] = set()
+
+    def warm(self, db):
+        conference_ids = {conference_id for (conference_id,) in db.query(Conference.id)}
+        active_sessions = db.query(LiveSession).filter(
+            LiveSession.is_active == True,
+            LiveSession.status == SessionStatus.ACTIVE
+        ).all()
+        self._conferences = conference_ids
+        self._active = {session.conference_id: session_snapshot(session) for session in active_sessions}
+
+    def knows_conference(self, conference_id: int) -> bool:
+        return conference_id in self._conferences
+
+    def add_conference(self, conference_id: int):
+        self._conferences.add(conference_id)
+
+    def get(self, conference_id: int) -> Optional[dict]:
+        return self._active.get(conference_id)
+
+    def session_active(self, session_id: int) -> bool:
+        # Une session active au plus par conférence : parcours court
+        return any(session["id"] == session_id for session in self._active.values())
+
+    def apply(self, event: dict):
+        conference_id = event["conference_id"]
+        event_type = event["type"]
+        if event_type == "session_started":
+            self._conferences.add(conference_id)
+            self._active[conference_id] = event["session"]
+        elif event_type == "session_tokens_revoked":
+            current = self._active.get(conference_id)
+            if current is not None and current["id"] == event["session_id"]:
+                self._active[conference_id] = event["session"]
+        elif event_type in ("session_ended", "session_deleted"):
+            current = self._active.get(conference_id)
+            if current is not None and current["id"] == event["session_id"]:
+                del self._active[conference_id]
+        elif event_type == "conference_deleted":
+            self._active.pop(conference_id, None)
+            self._conferences.discard(conference_id)
+
+
+registry = ActiveSessionRegistry()
+
+LIVE_SESSIONS_CHANNEL = "live_sessions"
+
+
+def _on_session_event(event: dict):
+    registry.apply(event)
+    if event["type"] in ("session_ended", "session_deleted"):
+        lobbies.discard(event["conference_id"], event["session_id"])
+    elif event["type"] == "conference_deleted":
+        lobbies.discard(event["conference_id"])
+    broker.publish(event["conference_id"], event)
+
+
+def publish_session_event(event_type: str, conference_id: int, live_session=None, session_id: Optional[int] = None):
+    """
+    À appeler après le commit : session_created, session_started, session_ended, session_deleted,
+    session_tokens_revoked ou conference_deleted. L'événement met à jour le registre et les flux de tous les workers.
+    """
+    snapshot = session_snapshot(live_session)
+    pubsub.publish(LIVE_SESSIONS_CHANNEL, {
+        "type": event_type,
+        "conference_id": conference_id,
+        "session_id": snapshot["id"] if snapshot else session_id,
+        "session": snapshot,
+    })
+
+
+class SessionTransitionError(Exception):
+    """Transition refusée par les règles d'état d'une session live"""
+
+
+def start_session(db, live_session, automatic: bool = False):
+    """
+    Règles communes au lancement manuel (/start) et automatique (planificateur).
+    La ligne est relue sous verrou : si plusieurs workers tentent la même transition,
+    un seul la voit encore PENDING. Seule une session lancée par le planificateur
+    (automatic) est arrêtée automatiquement.
+    """
+    db.refresh(live_session, with_for_update=True)
+    if live_session.status != SessionStatus.PENDING:
+        db.rollback()
+        raise SessionTransitionError("Cette session ne peut pas être lancée (déjà active ou terminée)")
+
+    # Désactiver toutes les autres sessions actives pour cette conférence
+    db.query(LiveSession).filter(
+        LiveSession.conference_id == live_session.conference_id,
+        LiveSession.is_active == True
+    ).update({"is_active": False})
+
+    live_session.status = SessionStatus.ACTIVE
+    live_session.is_active = True
+    live_session.started_at = datetime.utcnow()
+    live_session.auto_started = automatic
+
+    db.commit()
+    db.refresh(live_session)
+    invalidate_stats(live_session.conference_id)
+    publish_session_event("session_started", live_session.conference_id, live_session)
+    # Abonnés de la conférence (dont les inscrits payés) et de la session
+    notify(
+        f"La session « {live_session.session_title} » commence",
+        topics=[conference_topic(live_session.conference_id), session_topic(live_session.id)]
+    )
+    return live_session
+
+
+def stop_session(db, live_session):
+    """
+    Règles communes à l'arrêt manuel (/stop) et automatique (planificateur)
+    """
+    db.refresh(live_session, with_for_update=True)
+    if live_session.status != SessionStatus.ACTIVE:
+        db.rollback()
+        raise SessionTransitionError("Cette session n'est pas active")
+
+    live_session.status = SessionStatus.ENDED
+    live_session.is_active = False
+    live_session.ended_at = datetime.utcnow()
+
+    db.commit()
+    db.refresh(live_session)
+    invalidate_stats(live_session.conference_id)
+    publish_session_event("session_ended", live_session.conference_id, live_session)
+    return live_session
+
+
+def start_live_state(db):
+    """
+    Démarrage de l'application : abonnement au canal puis chargement initial du registre
+    """
+    pubsub.subscribe(LIVE_SESSIONS_CHANNEL, _on_session_event)
+    pubsub.on_reconnect(_rewarm)
+    registry.warm(db)
+
+
+def _rewarm():
+    # Des notifications ont pu être perdues pendant la coupure : on recharge depuis la base
+    db = SessionLocal()
+    try:
+        registry.warm(db)
+    finally:
+        db.close()
@@ -0,0 +1,190 @@
+import os
+import random
+import time
+from collections import deque
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+import jwt
+from jwt.exceptions import PyJWTError
+
+from auth import SECRET_KEY, ALGORITHM
+
+# Admissions par seconde (par worker) une fois la rafale initiale consommée
+LOBBY_ADMIT_RATE = float(os.getenv("LOBBY_ADMIT_RATE", "50"))
+# Nombre de clients admis immédiatement à l'ouverture du lobby
+LOBBY_BURST = int(os.getenv("LOBBY_BURST", "200"))
+# Bornes et amplitude aléatoire (fraction) des délais retry_after renvoyés aux clients
+LOBBY_MIN_RETRY = float(os.getenv("LOBBY_MIN_RETRY", "1"))
+LOBBY_MAX_RETRY = float(os.getenv("LOBBY_MAX_RETRY", "30"))
+LOBBY_RETRY_JITTER = float(os.getenv("LOBBY_RETRY_JITTER", "0.5"))
+# Durée de validité d'un ticket après son heure d'admission ; un client déjà admis qui
+# redemande un ticket à moins de LOBBY_TICKET_RENEW_BEFORE secondes de son expiration en
+# reçoit un nouveau, admis immédiatement
+LOBBY_TICKET_TTL = int(os.getenv("LOBBY_TICKET_TTL", "900"))
+LOBBY_TICKET_RENEW_BEFORE = int(os.getenv("LOBBY_TICKET_RENEW_BEFORE", "120"))
+# Clé de signature des tickets, partagée par les workers. Obligatoire et distincte de la clé
+# des jetons d'accès et du secret Jitsi : aucune des deux ne doit permettre de forger un ticket
+LOBBY_TICKET_SECRET = os.getenv("LOBBY_TICKET_SECRET")
+# Fenêtre (secondes) du débit d'admission observé
+LOBBY_METRICS_WINDOW = 10.0
+
+TICKET_TYPE = "lobby"
+
+
+class LobbyTicketError(Exception):
+    """Ticket absent, falsifié, expiré ou émis pour une autre session"""
+
+
+def check_lobby_ticket_secret():
+    """
+    Démarrage de l'application : refuse de démarrer sans clé dédiée aux tickets
+    """
+    if not LOBBY_TICKET_SECRET:
+        raise RuntimeError("LOBBY_TICKET_SECRET n'est pas défini (clé des tickets du lobby)")
+    if LOBBY_TICKET_SECRET in (SECRET_KEY, os.getenv("JOIN_TOKEN_SECRET")):
+        raise RuntimeError(
+            "LOBBY_TICKET_SECRET doit être différent de JWT_SECRET_KEY et de JOIN_TOKEN_SECRET"
+        )
+
+
+def retry_after(wait: float) -> float:
+    """
+    Délai avant la prochaine vérification : le temps d'attente estimé, borné, étalé
+    aléatoirement pour que les clients d'un même lot ne reviennent pas ensemble
+    """
+    base = min(max(wait, LOBBY_MIN_RETRY), LOBBY_MAX_RETRY)
+    return round(base * random.uniform(1 - LOBBY_RETRY_JITTER / 2, 1 + LOBBY_RETRY_JITTER / 2), 2)
+
+
+class SessionLobby:
+    """
+    File d'admission d'une session active. L'heure d'admission de chaque ticket est calculée
+    à l'émission (GCRA : rafale LOBBY_BURST puis LOBBY_ADMIT_RATE par seconde) et signée dans
+    le ticket ; la vérification ne demande donc ni base ni état par client.
+    """
+
+    def __init__(self, conference_id: int, session_id: int, rate: float = LOBBY_ADMIT_RATE,
+                 burst: int = LOBBY_BURST):
+        self.conference_id = conference_id
+        self.session_id = session_id
+        self.rate = rate
+        self.burst = burst
+        self.opened_at = time.time()
+        self._interval = 1.0 / rate
+        self._tolerance = max(burst - 1, 0) * self._interval
+        self._tat = self.opened_at  # heure d'arrivée théorique du prochain ticket
+        self._lock = Lock()
+        # user_id -> (ticket, admit_at, position) : un client qui redemande garde sa place
+        self._tickets: Dict[int, Tuple[str, float, int]] = {}
+        self._waiting = deque()  # heures d'admission des tickets pas encore admis (croissantes)
+        self._recent = deque()   # heures d'admission récentes, pour le débit observé
+        self.issued = 0
+        self.admitted = 0
+
+    def issue(self, user_id: int) -> Tuple[str, float, int]:
+        now = time.time()
+        with self._lock:
+            existing = self._tickets.get(user_id)
+            if existing is not None:
+                ticket, admit_at, position = existing
+                if admit_at + LOBBY_TICKET_TTL - LOBBY_TICKET_RENEW_BEFORE > now:
+                    return existing
+                # Ticket (bientôt) expiré d'un client déjà admis : nouveau ticket, sans repasser
+                # par la file ni compter une nouvelle émission
+                ticket = self._sign(user_id, position, now)
+                self._tickets[user_id] = (ticket, now, position)
+                return ticket, now, position
+            admit_at = max(now, self._tat - self._tolerance)
+            self._tat = max(now, self._tat) + self._interval
+            self.issued += 1
+            position = self.issued
+            ticket = self._sign(user_id, position, admit_at)
+            self._tickets[user_id] = (ticket, admit_at, position)
+            self._waiting.append(admit_at)
+            self._advance(now)
+        return ticket, admit_at, position
+
+    def _sign(self, user_id: int, position: int, admit_at: float) -> str:
+        return jwt.encode({
+            "typ": TICKET_TYPE,
+            "uid": user_id,
+            "cid": self.conference_id,
+            "sid": self.session_id,
+            "pos": position,
+            "adm": admit_at,
+            "exp": int(admit_at) + LOBBY_TICKET_TTL,
+        }, LOBBY_TICKET_SECRET, algorithm=ALGORITHM)
+
+    def _advance(self, now: float):
+        while self._waiting and self._waiting[0] <= now:
+            self._recent.append(self._waiting.popleft())
+            self.admitted += 1
+        while self._recent and self._recent[0] < now - LOBBY_METRICS_WINDOW:
+            self._recent.popleft()
+
+    def queue_depth(self) -> int:
+        with self._lock:
+            self._advance(time.time())
+            return len(self._waiting)
+
+    def metrics(self) -> dict:
+        now = time.time()
+        with self._lock:
+            self._advance(now)
+            window = min(LOBBY_METRICS_WINDOW, max(now - self.opened_at, 1.0))
+            return {
+                "session_id": self.session_id,
+                "queue_depth": len(self._waiting),
+                "issued": self.issued,
+                "admitted": self.admitted,
+                "admit_rate": self.rate,
+                "burst": self.burst,
+                "observed_admit_rate": round(len(self._recent) / window, 2),
+                "estimated_wait": round(max(self._waiting[-1] - now, 0), 2) if self._waiting else 0,
+                "opened_at": self.opened_at,
+            }
+
+
+def verify_ticket(ticket: str, conference_id: int, session_id: int, user_id: int) -> dict:
+    try:
+        claims = jwt.decode(ticket, LOBBY_TICKET_SECRET, algorithms=[ALGORITHM])
+    except PyJWTError:
+        raise LobbyTicketError("Ticket invalide ou expiré")
+    if (claims.get("typ") != TICKET_TYPE or claims.get("uid") != user_id
+            or claims.get("cid") != conference_id or claims.get("sid") != session_id):
+        raise LobbyTicketError("Ticket invalide pour cette session")
+    return claims
+
+
+class LobbyManager:
+    """
+    Un lobby par conférence, remplacé dès que la session active change (local au worker)
+    """
+
+    def __init__(self):
+        self._lobbies: Dict[int, SessionLobby] = {}
+        self._lock = Lock()
+
+    def get(self, conference_id: int, session_id: int) -> SessionLobby:
+        with self._lock:
+            lobby = self._lobbies.get(conference_id)
+            if lobby is None or lobby.session_id != session_id:
+                lobby = SessionLobby(conference_id, session_id)
+                self._lobbies[conference_id] = lobby
+            return lobby
+
+    def find(self, conference_id: int, session_id: Optional[int]) -> Optional[SessionLobby]:
+        lobby = self._lobbies.get(conference_id)
+        if lobby is None or lobby.session_id != session_id:
+            return None
+        return lobby
+
+    def discard(self, conference_id: int, session_id: Optional[int] = None):
+        with self._lock:
+            lobby = self._lobbies.get(conference_id)
+            if lobby is not None and (session_id is None or lobby.session_id == session_id):
+                del self._lobbies[conference_id]
+
+
+lobbies = LobbyManager()
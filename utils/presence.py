@@ -0,0 +1,247 @@
+import asyncio
+import hashlib
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Set
+
+from utils.live_state import LiveSessionBroker, LIVE_SESSIONS_CHANNEL, registry
+from utils.pubsub import pubsub, WORKER_ID
+
+# Un membre sans heartbeat depuis PRESENCE_TTL secondes est considéré hors ligne
+PRESENCE_TTL = float(os.getenv("PRESENCE_TTL", "45"))
+PRESENCE_SWEEP_INTERVAL = float(os.getenv("PRESENCE_SWEEP_INTERVAL", "5"))
+# Nombre de membres par message lors d'une resynchronisation (limite de 8000 octets de NOTIFY)
+PRESENCE_SYNC_CHUNK = 200
+HLL_PRECISION = 12
+
+PRESENCE_CHANNEL = "presence"
+
+
+class HyperLogLog:
+    """
+    Estimation du nombre de visiteurs uniques en mémoire constante (2^p registres d'un octet,
+    erreur type ~1.04/sqrt(2^p), soit ~1.6 % pour p=12)
+    """
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(self.size)
+        self._alpha = 0.7213 / (1 + 1.079 / self.size)
+        self._count = 0
+
+    def add(self, value) -> bool:
+        """Retourne True si un registre a changé (l'estimation est alors recalculée)"""
+        digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+        x = int.from_bytes(digest, "big")
+        index = x >> (64 - self.precision)
+        rest = (x << self.precision) & ((1 << 64) - 1)
+        rank = (64 - self.precision + 1) if rest == 0 else (65 - rest.bit_length())
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            self._count = None
+            return True
+        return False
+
+    def count(self) -> int:
+        if self._count is None:
+            self._count = self._estimate()
+        return self._count
+
+    def _estimate(self) -> int:
+        estimate = self._alpha * self.size * self.size / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.size and zeros:
+            # Correction des petites cardinalités (linear counting)
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
+
+
+class PresenceTracker:
+    """
+    Présence en ligne par salle (ex. "session:12", "qa:3").
+
+    Chaque worker suit ses propres membres (heartbeats reçus) dans un OrderedDict trié par
+    échéance : rafraîchir et expirer sont en O(1). Seules les arrivées et départs sont diffusés
+    sur le canal pub/sub ; chaque worker en déduit la vue globale room -> membre -> workers,
+    dont la taille donne le nombre de personnes en ligne sans recalcul. Un worker qui ne
+    donne plus signe de vie voit ses membres retirés.
+
+    Le compteur de visiteurs uniques d'une salle (4 Ko) est libéré quand la salle se vide,
+    sauf pour une session encore en cours : il l'est alors à la fin de la session.
+    """
+
+    def __init__(self, ttl: float = PRESENCE_TTL):
+        self.ttl = ttl
+        self._local: Dict[str, OrderedDict] = {}          # room -> member -> expires_at
+        self._global: Dict[str, Dict[str, Set[str]]] = {}  # room -> member -> workers
+        self._unique: Dict[str, HyperLogLog] = {}
+        self._workers: Dict[str, float] = {}               # worker -> dernier signe de vie
+        self.updates = LiveSessionBroker(queue_size=1)
+        self._task = None
+
+    # --- Lecture ---
+
+    def online(self, room: str) -> int:
+        return len(self._global.get(room, ()))
+
+    def unique_visitors(self, room: str) -> int:
+        hll = self._unique.get(room)
+        return hll.count() if hll else 0
+
+    def snapshot(self, room: str) -> dict:
+        return {"room": room, "online": self.online(room), "unique_visitors": self.unique_visitors(room)}
+
+    # --- Écriture (boucle asyncio) ---
+
+    def heartbeat(self, room: str, member):
+        member = str(member)
+        members = self._local.setdefault(room, OrderedDict())
+        known = member in members
+        members[member] = time.monotonic() + self.ttl
+        members.move_to_end(member)
+        if not known:
+            self._publish({"type": "join", "room": room, "members": [member]})
+
+    def leave(self, room: str, member):
+        member = str(member)
+        members = self._local.get(room)
+        if members is None or members.pop(member, None) is None:
+            return
+        if not members:
+            del self._local[room]
+        self._publish({"type": "leave", "room": room, "members": [member]})
+
+    def _publish(self, message: dict):
+        message["worker"] = WORKER_ID
+        pubsub.publish(PRESENCE_CHANNEL, message)
+
+    def on_message(self, message: dict):
+        worker = message["worker"]
+        self._workers[worker] = time.monotonic()
+        if message["type"] == "join":
+            self._add(message["room"], message["members"], worker)
+        elif message["type"] == "leave":
+            self._remove(message["room"], message["members"], worker)
+        elif message["type"] == "resync" and worker != WORKER_ID:
+            self._announce_all()
+
+    def _add(self, room: str, members, worker: str):
+        room_members = self._global.setdefault(room, {})
+        hll = self._unique.setdefault(room, HyperLogLog())
+        before = len(room_members)
+        for member in members:
+            room_members.setdefault(member, set()).add(worker)
+            hll.add(member)
+        if len(room_members) != before:
+            self._notify(room)
+
+    def _remove(self, room: str, members, worker: str):
+        room_members = self._global.get(room)
+        if not room_members:
+            return
+        before = len(room_members)
+        for member in members:
+            workers = room_members.get(member)
+            if workers is None:
+                continue
+            workers.discard(worker)
+            if not workers:
+                del room_members[member]
+        if not room_members:
+            del self._global[room]
+            if not _session_room_active(room):
+                self._unique.pop(room, None)
+        if len(room_members) != before:
+            self._notify(room)
+
+    def on_session_event(self, event: dict):
+        if event["type"] in ("session_ended", "session_deleted"):
+            room = f"session:{event['session_id']}"
+            if room not in self._global:
+                self._unique.pop(room, None)
+        elif event["type"] == "conference_deleted":
+            room = f"qa:{event['conference_id']}"
+            if room not in self._global:
+                self._unique.pop(room, None)
+
+    def _notify(self, room: str):
+        self.updates.publish(room, self.snapshot(room))
+
+    def _announce_all(self):
+        for room, members in self._local.items():
+            names = list(members)
+            for start in range(0, len(names), PRESENCE_SYNC_CHUNK):
+                self._publish({"type": "join", "room": room, "members": names[start:start + PRESENCE_SYNC_CHUNK]})
+
+    # --- Expiration ---
+
+    def sweep(self):
+        now = time.monotonic()
+        for room in list(self._local):
+            members = self._local[room]
+            expired = []
+            while members:
+                member, expires_at = next(iter(members.items()))
+                if expires_at > now:
+                    break
+                members.popitem(last=False)
+                expired.append(member)
+            if not members:
+                del self._local[room]
+            for start in range(0, len(expired), PRESENCE_SYNC_CHUNK):
+                self._publish({"type": "leave", "room": room, "members": expired[start:start + PRESENCE_SYNC_CHUNK]})
+
+        # Signe de vie de ce worker, puis oubli des workers silencieux (arrêtés ou plantés)
+        self._publish({"type": "alive"})
+        for worker, seen in list(self._workers.items()):
+            if worker != WORKER_ID and seen < now - 2 * self.ttl:
+                del self._workers[worker]
+                self._drop_worker(worker)
+
+    def _drop_worker(self, worker: str):
+        for room in list(self._global):
+            members = [member for member, workers in self._global[room].items() if worker in workers]
+            if members:
+                self._remove(room, members, worker)
+
+    async def start(self):
+        pubsub.subscribe(PRESENCE_CHANNEL, self.on_message)
+        pubsub.subscribe(LIVE_SESSIONS_CHANNEL, self.on_session_event)
+        pubsub.on_reconnect(self._resync)
+        self._resync()
+        self._task = asyncio.create_task(self._run())
+
+    def _resync(self):
+        # Des départs ont pu être perdus : on reconstruit la vue globale, les autres workers
+        # renvoient leurs membres et on renvoie les nôtres
+        self._global = {}
+        self._publish({"type": "resync"})
+        self._announce_all()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(PRESENCE_SWEEP_INTERVAL)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Erreur lors de l'expiration des présences: {e}")
+
+
+def _session_room_active(room: str) -> bool:
+    kind, _, room_id = room.partition(":")
+    return kind == "session" and room_id.isdigit() and registry.session_active(int(room_id))
+
+
+presence = PresenceTracker()
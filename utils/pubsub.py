@@ -0,0 +1,202 @@
+import asyncio
+import json
+import os
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import psycopg2
+
+from database import engine
+
+# "postgres" (LISTEN/NOTIFY, partagé entre workers) ou "memory" (processus courant, tests)
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "postgres")
+PUBSUB_RECONNECT_DELAY = float(os.getenv("PUBSUB_RECONNECT_DELAY", "2"))
+
+# Limite de Postgres pour la charge utile d'un NOTIFY (octets)
+NOTIFY_MAX_PAYLOAD = 7999
+
+# Identifiant de ce worker : permet d'ignorer l'écho de nos propres NOTIFY
+WORKER_ID = uuid.uuid4().hex
+
+Handler = Callable[[dict], None]
+
+
+class InProcessPubSub:
+    """
+    Canal de diffusion local au processus. Les handlers sont toujours appelés dans la boucle
+    asyncio de l'application ; publish() peut être appelé depuis un thread (routes synchrones).
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, List[Handler]] = defaultdict(list)
+        self._reconnect_hooks: List[Callable[[], None]] = []
+        self._loop = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+
+    async def stop(self):
+        pass
+
+    def subscribe(self, channel: str, handler: Handler):
+        self._handlers[channel].append(handler)
+
+    def on_reconnect(self, hook: Callable[[], None]):
+        # Appelé quand des messages ont pu être perdus (reconnexion au backplane)
+        self._reconnect_hooks.append(hook)
+
+    def publish(self, channel: str, message: dict):
+        if self._from_other_thread():
+            self._loop.call_soon_threadsafe(self.publish, channel, message)
+            return
+        self._dispatch(channel, message)
+
+    def _from_other_thread(self) -> bool:
+        if self._loop is None:
+            return False
+        try:
+            return asyncio.get_running_loop() is not self._loop
+        except RuntimeError:
+            return True
+
+    def _dispatch(self, channel: str, message: dict):
+        for handler in list(self._handlers.get(channel, ())):
+            try:
+                handler(message)
+            except Exception as e:
+                print(f"Erreur dans un handler pub/sub ({channel}): {e}")
+
+
+class PostgresPubSub(InProcessPubSub):
+    """
+    Diffusion entre workers via Postgres LISTEN/NOTIFY, sans service supplémentaire.
+    Les messages sont d'abord remis aux handlers locaux puis envoyés aux autres workers ;
+    la charge utile JSON doit rester sous la limite de 8000 octets de NOTIFY.
+    """
+
+    def __init__(self, dsn: str):
+        super().__init__()
+        self.dsn = dsn
+        self._listen_conn = None
+        self._notify_conn = None
+        # Un seul thread : les NOTIFY partent dans l'ordre de publication
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pg-notify")
+        self._stopped = False
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopped = False
+        await self._loop.run_in_executor(self._executor, self._connect)
+        self._loop.add_reader(self._listen_conn.fileno(), self._on_readable)
+
+    async def stop(self):
+        self._stopped = True
+        self._close_listener()
+        if self._notify_conn is not None:
+            self._notify_conn.close()
+            self._notify_conn = None
+
+    def subscribe(self, channel: str, handler: Handler):
+        first = channel not in self._handlers
+        super().subscribe(channel, handler)
+        if first and self._listen_conn is not None:
+            self._listen(channel)
+
+    def publish(self, channel: str, message: dict):
+        if self._from_other_thread():
+            self._loop.call_soon_threadsafe(self.publish, channel, message)
+            return
+        self._dispatch(channel, message)
+        payload = json.dumps({"origin": WORKER_ID, "message": message}, default=str)
+        if self._loop is None:
+            return
+        if len(payload.encode()) > NOTIFY_MAX_PAYLOAD:
+            print(f"Message trop volumineux pour NOTIFY ({channel}), non transmis aux autres workers")
+            return
+        future = self._loop.run_in_executor(self._executor, self._notify, channel, payload)
+        future.add_done_callback(self._log_failure)
+
+    def _connect(self):
+        self._listen_conn = psycopg2.connect(self.dsn)
+        self._listen_conn.autocommit = True
+        for channel in self._handlers:
+            self._listen(channel)
+
+    def _listen(self, channel: str):
+        with self._listen_conn.cursor() as cursor:
+            cursor.execute(f'LISTEN "{channel}"')
+
+    def _notify(self, channel: str, payload: str):
+        for attempt in range(2):
+            try:
+                if self._notify_conn is None or self._notify_conn.closed:
+                    self._notify_conn = psycopg2.connect(self.dsn)
+                    self._notify_conn.autocommit = True
+                with self._notify_conn.cursor() as cursor:
+                    cursor.execute("SELECT pg_notify(%s, %s)", (channel, payload))
+                return
+            except psycopg2.OperationalError:
+                self._notify_conn = None
+                if attempt:
+                    raise
+
+    def _on_readable(self):
+        try:
+            self._listen_conn.poll()
+        except Exception as e:
+            print(f"Connexion LISTEN perdue: {e}")
+            self._close_listener()
+            self._loop.create_task(self._reconnect())
+            return
+        while self._listen_conn.notifies:
+            notify = self._listen_conn.notifies.pop(0)
+            try:
+                envelope = json.loads(notify.payload)
+            except ValueError:
+                continue
+            if envelope.get("origin") == WORKER_ID:
+                continue
+            self._dispatch(notify.channel, envelope["message"])
+
+    def _close_listener(self):
+        if self._listen_conn is None:
+            return
+        try:
+            self._loop.remove_reader(self._listen_conn.fileno())
+        except Exception:
+            pass
+        try:
+            self._listen_conn.close()
+        except Exception:
+            pass
+        self._listen_conn = None
+
+    async def _reconnect(self):
+        while not self._stopped:
+            await asyncio.sleep(PUBSUB_RECONNECT_DELAY)
+            try:
+                await self._loop.run_in_executor(self._executor, self._connect)
+            except Exception as e:
+                print(f"Reconnexion LISTEN impossible: {e}")
+                continue
+            self._loop.add_reader(self._listen_conn.fileno(), self._on_readable)
+            for hook in list(self._reconnect_hooks):
+                hook()
+            return
+
+    @staticmethod
+    def _log_failure(future):
+        if future.exception() is not None:
+            print(f"Erreur NOTIFY: {future.exception()}")
+
+
+def create_pubsub(backend: str = PUBSUB_BACKEND):
+    if backend == "memory":
+        return InProcessPubSub()
+    dsn = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+    return PostgresPubSub(dsn)
+
+
+pubsub = create_pubsub()
@@ -0,0 +1,232 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from sqlalchemy import func, select, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from py_vapid import Vapid
+
+from models.push_subscription import PushSubscription, PushTopicSubscription
+from models.users import UserRole
+
+# Clés VAPID (generate_vapid.py) : la clé privée n'est jamais écrite dans le code
+VAPID_PRIVATE_KEY = os.getenv("VAPID_PRIVATE_KEY")
+VAPID_PUBLIC_KEY = os.getenv(
+    "VAPID_PUBLIC_KEY",
+    "BD-3sYib-nb1LbZtOBDj7fwoAIRXwGgIcG_gNDfmCdA5pWrAN0rQmjTdUG3MJjPKN-1P2dBslItR-67AbCeq0sI"
+)
+VAPID_SUBJECT = os.getenv("VAPID_SUBJECT", "mailto:admin@example.com")
+# Durée de validité des jetons VAPID signés (24 h maximum pour les services push) ; un jeton
+# est renouvelé VAPID_REFRESH_MARGIN secondes avant son expiration
+VAPID_TOKEN_TTL = int(os.getenv("VAPID_TOKEN_TTL", str(12 * 3600)))
+VAPID_REFRESH_MARGIN = int(os.getenv("VAPID_REFRESH_MARGIN", "300"))
+# Abonnements lus par paquets de PUSH_FETCH_SIZE lignes (curseur côté serveur)
+PUSH_FETCH_SIZE = int(os.getenv("PUSH_FETCH_SIZE", "500"))
+
+subscriptions_table = PushSubscription.__table__
+topics_table = PushTopicSubscription.__table__
+
+# Sujets : une conférence (inscrits payés, abonnés depuis sa page), une session live, un rôle
+TOPIC_PATTERN = re.compile(r"^(conference|session):[1-9][0-9]*$|^role:(%s)$" % "|".join(r.value for r in UserRole))
+
+
+class SubscriptionError(Exception):
+    """Abonnement envoyé par le navigateur incomplet ou invalide"""
+
+
+def conference_topic(conference_id: int) -> str:
+    return f"conference:{conference_id}"
+
+
+def session_topic(session_id: int) -> str:
+    return f"session:{session_id}"
+
+
+def role_topic(role) -> str:
+    return f"role:{role.value if hasattr(role, 'value') else role}"
+
+
+def validate_topics(topics) -> List[str]:
+    if not isinstance(topics, list) or not topics:
+        raise SubscriptionError("Liste de sujets attendue")
+    invalid = [t for t in topics if not isinstance(t, str) or not TOPIC_PATTERN.match(t)]
+    if invalid:
+        raise SubscriptionError(f"Sujets invalides: {', '.join(map(str, invalid))}")
+    return list(dict.fromkeys(topics))
+
+
+def endpoint_hash(endpoint: str) -> str:
+    return hashlib.sha256(endpoint.encode()).hexdigest()
+
+
+def parse_subscription(data) -> dict:
+    """
+    Abonnement au format PushSubscription.toJSON() du navigateur :
+    {"endpoint": "...", "keys": {"p256dh": "...", "auth": "..."}}
+    """
+    if not isinstance(data, dict):
+        raise SubscriptionError("Abonnement invalide")
+    endpoint = data.get("endpoint")
+    keys = data.get("keys")
+    if not isinstance(endpoint, str) or not endpoint.startswith("https://"):
+        raise SubscriptionError("Endpoint d'abonnement invalide")
+    if not isinstance(keys, dict) or not all(isinstance(keys.get(k), str) and keys.get(k) for k in ("p256dh", "auth")):
+        raise SubscriptionError("Clés d'abonnement manquantes")
+    return {"endpoint": endpoint, "p256dh": keys["p256dh"], "auth": keys["auth"]}
+
+
+def upsert_subscription(db: Session, data, user_id: Optional[int] = None,
+                        conference_id: Optional[int] = None) -> str:
+    """
+    Enregistre ou met à jour l'abonnement (un navigateur qui se réabonne garde une seule
+    ligne). L'utilisateur et la conférence déjà connus sont conservés si absents.
+    """
+    subscription = parse_subscription(data)
+    key = endpoint_hash(subscription["endpoint"])
+    now = datetime.utcnow()
+    stmt = pg_insert(subscriptions_table).values(
+        endpoint_hash=key,
+        user_id=user_id,
+        conference_id=conference_id,
+        created_at=now,
+        updated_at=now,
+        **subscription
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[subscriptions_table.c.endpoint_hash],
+        set_={
+            "p256dh": stmt.excluded.p256dh,
+            "auth": stmt.excluded.auth,
+            "user_id": func.coalesce(stmt.excluded.user_id, subscriptions_table.c.user_id),
+            "conference_id": func.coalesce(stmt.excluded.conference_id, subscriptions_table.c.conference_id),
+            "updated_at": now,
+        }
+    )
+    db.execute(stmt)
+    db.commit()
+    return key
+
+
+def subscribe_topics(db: Session, key: str, topics: List[str]):
+    """
+    Abonne un endpoint à des sujets (sans effet s'il y est déjà). Pas de commit : l'appelant
+    valide avec le reste de sa transaction.
+    """
+    now = datetime.utcnow()
+    db.execute(
+        pg_insert(topics_table)
+        .values([{"topic": topic, "endpoint_hash": key, "created_at": now} for topic in topics])
+        .on_conflict_do_nothing()
+    )
+
+
+def unsubscribe_topics(db: Session, key: str, topics: List[str]) -> int:
+    deleted = db.query(PushTopicSubscription).filter(
+        PushTopicSubscription.endpoint_hash == key,
+        PushTopicSubscription.topic.in_(topics)
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+def subscribe_user_to_topic(db: Session, user_id: int, topic: str):
+    """
+    Abonne tous les navigateurs d'un utilisateur à un sujet, en une requête
+    (INSERT ... SELECT). Pas de commit.
+    """
+    db.execute(
+        pg_insert(topics_table)
+        .from_select(
+            ["topic", "endpoint_hash", "created_at"],
+            select(literal(topic), subscriptions_table.c.endpoint_hash, literal(datetime.utcnow()))
+            .where(subscriptions_table.c.user_id == user_id)
+        )
+        .on_conflict_do_nothing()
+    )
+
+
+def subscription_info(row) -> dict:
+    # Format attendu par pywebpush
+    return {"endpoint": row.endpoint, "keys": {"p256dh": row.p256dh, "auth": row.auth}}
+
+
+def iter_subscriptions(db: Session, topics: Optional[List[str]] = None,
+                       user_id: Optional[int] = None) -> Iterator:
+    """
+    Parcourt les abonnements sans charger toute la table : curseur côté serveur, lignes
+    remises par paquets de PUSH_FETCH_SIZE. Avec `topics`, seuls les abonnés de ces sujets
+    sont lus (parcours de l'index des sujets, pas de la table entière).
+    """
+    query = db.query(
+        PushSubscription.endpoint_hash,
+        PushSubscription.endpoint,
+        PushSubscription.p256dh,
+        PushSubscription.auth
+    )
+    if topics:
+        query = query.join(
+            PushTopicSubscription,
+            PushTopicSubscription.endpoint_hash == PushSubscription.endpoint_hash
+        ).filter(PushTopicSubscription.topic.in_(topics))
+        if len(topics) > 1:
+            # Un abonné de plusieurs des sujets ne reçoit le message qu'une fois
+            query = query.distinct()
+    if user_id is not None:
+        query = query.filter(PushSubscription.user_id == user_id)
+    yield from query.yield_per(PUSH_FETCH_SIZE)
+
+
+def delete_subscriptions(db: Session, keys: List[str]) -> int:
+    deleted = db.query(PushSubscription).filter(
+        PushSubscription.endpoint_hash.in_(keys)
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+class VapidHeaderCache:
+    """
+    En-têtes d'autorisation VAPID par service push. Le jeton signé ne dépend que de l'origine
+    de l'endpoint (aud) : tous les abonnés d'un même service (fcm.googleapis.com, ...) partagent
+    un seul en-tête pendant sa validité, au lieu d'une signature ECDSA par message.
+    """
+
+    def __init__(self, private_key: Optional[str] = VAPID_PRIVATE_KEY, subject: str = VAPID_SUBJECT,
+                 ttl: int = VAPID_TOKEN_TTL, margin: int = VAPID_REFRESH_MARGIN):
+        self.subject = subject
+        self.ttl = ttl
+        self.margin = min(margin, ttl // 2)
+        self._private_key = private_key
+        self._vapid = None
+        self._headers: Dict[str, Tuple[dict, float]] = {}  # origine -> (en-têtes, renouveler à)
+        self._lock = threading.Lock()
+        self.signed = 0
+
+    def _signer(self) -> Vapid:
+        if self._vapid is None:
+            # Clé privée lue une seule fois
+            self._vapid = Vapid.from_string(private_key=self._private_key)
+        return self._vapid
+
+    def headers(self, endpoint: str) -> dict:
+        parts = urlsplit(endpoint)
+        audience = f"{parts.scheme}://{parts.netloc}"
+        now = time.time()
+        with self._lock:
+            cached = self._headers.get(audience)
+            if cached is not None and now < cached[1]:
+                return cached[0]
+            expires_at = int(now) + self.ttl
+            headers = self._signer().sign({"sub": self.subject, "aud": audience, "exp": expires_at})
+            self._headers[audience] = (headers, expires_at - self.margin)
+            self.signed += 1
+            return headers
+
+
+vapid_headers = VapidHeaderCache()
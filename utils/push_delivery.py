@@ -0,0 +1,316 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import requests
+from pywebpush import webpush, WebPushException
+
+from database import SessionLocal
+from utils.pubsub import pubsub
+from utils.push import (
+    iter_subscriptions, subscription_info, delete_subscriptions, vapid_headers, VAPID_PRIVATE_KEY
+)
+
+# Envois simultanés (threads) : le chiffrement du message et l'appel HTTP au service push
+# du navigateur se font hors de la boucle asyncio
+PUSH_CONCURRENCY = int(os.getenv("PUSH_CONCURRENCY", "16"))
+PUSH_TIMEOUT = float(os.getenv("PUSH_TIMEOUT", "10"))
+# Nouvelles tentatives des échecs temporaires (429, 5xx, réseau) : délai PUSH_RETRY_BASE * 2^n
+PUSH_MAX_RETRIES = int(os.getenv("PUSH_MAX_RETRIES", "3"))
+PUSH_RETRY_BASE = float(os.getenv("PUSH_RETRY_BASE", "2"))
+PUSH_RETRY_MAX_DELAY = 60.0
+# Fréquence maximale de publication de la progression d'un envoi (secondes)
+PUSH_PROGRESS_INTERVAL = 1.0
+# Nombre d'envois dont la progression reste consultable
+PUSH_JOBS_KEPT = 200
+
+PUSH_JOBS_CHANNEL = "push_jobs"
+
+# Abonnement expiré ou révoqué côté navigateur : à supprimer
+GONE_STATUSES = (404, 410)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class PushJob:
+    """Un envoi à un ensemble d'abonnés et sa progression"""
+
+    def __init__(self, payload: str, topics: Optional[List[str]] = None, user_id: Optional[int] = None,
+                 submitted_by: Optional[int] = None):
+        self.id = uuid.uuid4().hex
+        self.payload = payload
+        self.topics = topics
+        self.user_id = user_id
+        self.submitted_by = submitted_by  # auteur de l'envoi (seul à pouvoir en suivre la progression)
+        self.status = QUEUED
+        self.total = 0
+        self.sent = 0
+        self.failed = 0
+        self.pruned = 0
+        self.retries = 0
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.finished_at = None
+        self.lock = threading.Lock()
+        self._published_at = 0.0
+
+    def progress(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "topics": self.topics,
+            "submitted_by": self.submitted_by,
+            "total": self.total,
+            "sent": self.sent,
+            "failed": self.failed,
+            "pruned": self.pruned,
+            "retries": self.retries,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class PushDeliveryWorker:
+    """
+    Envoi des notifications push en arrière-plan. Les abonnés sont lus en flux (curseur côté
+    serveur) et envoyés par un pool de PUSH_CONCURRENCY threads, sans dépasser ce nombre
+    d'envois en cours. Les échecs temporaires sont retentés par vagues avec un délai croissant,
+    les abonnements expirés (404 / 410) supprimés.
+
+    La progression est publiée sur le backplane : n'importe quel worker répond à
+    GET /api/notifications/jobs/{job_id}.
+    """
+
+    def __init__(self, concurrency: int = PUSH_CONCURRENCY):
+        self.concurrency = concurrency
+        self._pool = None
+        self._sessions = threading.local()
+        self.jobs: "OrderedDict[str, dict]" = OrderedDict()  # job_id -> dernière progression connue
+        self._running: Dict[str, PushJob] = {}
+        self._tasks = set()
+        self._stopping = threading.Event()
+        self._loop = None
+
+    # --- API ---
+
+    def submit(self, payload: str, topics: Optional[List[str]] = None,
+               user_id: Optional[int] = None, submitted_by: Optional[int] = None) -> PushJob:
+        """
+        Lance un envoi aux abonnés des sujets `topics` (à tous si None), éventuellement limité
+        à un utilisateur. Peut être appelé depuis un thread (routes synchrones, planificateur).
+        """
+        job = PushJob(payload, topics, user_id, submitted_by)
+        if self._loop is not None and _running_loop() is not self._loop:
+            self._loop.call_soon_threadsafe(self._spawn, job)
+        else:
+            self._spawn(job)
+        return job
+
+    def _spawn(self, job: PushJob):
+        self._running[job.id] = job
+        self._publish(job, force=True)
+        task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        job = self._running.get(job_id)
+        if job is not None:
+            return job.progress()
+        return self.jobs.get(job_id)
+
+    # --- Progression partagée entre workers ---
+
+    def _publish(self, job: PushJob, force: bool = False):
+        now = time.monotonic()
+        if not force and now - job._published_at < PUSH_PROGRESS_INTERVAL:
+            return
+        job._published_at = now
+        pubsub.publish(PUSH_JOBS_CHANNEL, job.progress())
+
+    def on_progress(self, progress: dict):
+        self.jobs[progress["job_id"]] = progress
+        self.jobs.move_to_end(progress["job_id"])
+        while len(self.jobs) > PUSH_JOBS_KEPT:
+            self.jobs.popitem(last=False)
+
+    # --- Envoi ---
+
+    async def _run(self, job: PushJob):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self._deliver, job)
+            job.status = DONE
+        except Exception as e:
+            job.status = FAILED
+            job.error = str(e)
+            print(f"Erreur lors de l'envoi des notifications push {job.id}: {e}")
+        finally:
+            job.finished_at = datetime.utcnow()
+            self._running.pop(job.id, None)
+            self._publish(job, force=True)
+
+    def _deliver(self, job: PushJob):
+        job.status = RUNNING
+        self._publish(job, force=True)
+        retry = self._send_all(job, self._subscriptions(job))
+        for attempt in range(PUSH_MAX_RETRIES):
+            if not retry or self._stopping.is_set():
+                break
+            delay = max(wait_for for _, wait_for in retry)
+            self._stopping.wait(min(max(delay, PUSH_RETRY_BASE * 2 ** attempt), PUSH_RETRY_MAX_DELAY))
+            with job.lock:
+                job.retries += len(retry)
+            retry = self._send_all(job, [row for row, _ in retry])
+        with job.lock:
+            job.failed += len(retry)
+
+    def _subscriptions(self, job: PushJob):
+        db = SessionLocal()
+        try:
+            for row in iter_subscriptions(db, topics=job.topics, user_id=job.user_id):
+                with job.lock:
+                    job.total += 1
+                yield row
+        finally:
+            db.close()
+
+    def _send_all(self, job: PushJob, rows) -> List:
+        """
+        Un passage sur les abonnés ; retourne les échecs temporaires (ligne, délai demandé)
+        """
+        retry = []
+        gone = []
+        slots = threading.BoundedSemaphore(self.concurrency)
+
+        def send(row):
+            try:
+                if self._stopping.is_set():
+                    return
+                outcome, wait_for = self._send_one(job.payload, row)
+                with job.lock:
+                    if outcome == "sent":
+                        job.sent += 1
+                    elif outcome == "gone":
+                        gone.append(row.endpoint_hash)
+                    elif outcome == "retry":
+                        retry.append((row, wait_for))
+                    else:
+                        job.failed += 1
+                self._publish(job)
+            finally:
+                slots.release()
+
+        for row in rows:
+            if self._stopping.is_set():
+                break
+            slots.acquire()
+            self.pool.submit(send, row)
+        # Tous les emplacements libres = plus aucun envoi en cours
+        for _ in range(self.concurrency):
+            slots.acquire()
+
+        if gone:
+            db = SessionLocal()
+            try:
+                pruned = delete_subscriptions(db, gone)
+            finally:
+                db.close()
+            with job.lock:
+                job.pruned += pruned
+        return retry
+
+    def _send_one(self, payload: str, row):
+        """
+        Envoi à un abonné : ("sent" | "gone" | "retry" | "failed", délai demandé en secondes)
+        """
+        session = getattr(self._sessions, "session", None)
+        if session is None:
+            # Une session HTTP par thread : connexions réutilisées vers un même service push
+            session = self._sessions.session = requests.Session()
+        try:
+            # En-tête VAPID partagé par service push ; seul le chiffrement reste par message
+            webpush(
+                subscription_info=subscription_info(row),
+                data=payload,
+                headers=vapid_headers.headers(row.endpoint),
+                timeout=PUSH_TIMEOUT,
+                requests_session=session
+            )
+            return "sent", 0
+        except WebPushException as ex:
+            status_code = ex.response.status_code if ex.response is not None else None
+            if status_code in GONE_STATUSES:
+                return "gone", 0
+            if status_code is None or status_code == 429 or status_code >= 500:
+                return "retry", _retry_after(ex.response)
+            print(f"Erreur d'envoi ({status_code}): {ex}")
+            return "failed", 0
+        except requests.RequestException:
+            return "retry", 0
+        except Exception as ex:
+            # Abonnement inutilisable (clés invalides...) : on passe au suivant
+            print(f"Erreur d'envoi: {ex}")
+            return "failed", 0
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="push")
+        return self._pool
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        pubsub.subscribe(PUSH_JOBS_CHANNEL, self.on_progress)
+
+    async def stop(self):
+        # Les envois en cours sont abandonnés ; les abonnés restants ne reçoivent rien
+        self._stopping.set()
+        for task in list(self._tasks):
+            task.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _retry_after(response) -> float:
+    if response is None:
+        return 0
+    try:
+        return float(response.headers.get("Retry-After", 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+push_worker = PushDeliveryWorker()
+
+
+def notify(payload: str, topics: Optional[List[str]] = None, user_id: Optional[int] = None) -> Optional[PushJob]:
+    """
+    Notification déclenchée par un événement (session lancée, inscription payée) : sans effet
+    si les notifications push ne sont pas configurées, et ne fait jamais échouer l'appelant
+    """
+    if not VAPID_PRIVATE_KEY:
+        return None
+    try:
+        return push_worker.submit(payload, topics=topics, user_id=user_id)
+    except Exception as e:
+        print(f"Erreur lors du lancement de la notification push: {e}")
+        return None
@@ -0,0 +1,167 @@
+import asyncio
+import os
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal
+from models.qa_message import QAMessage
+
+# Écriture groupée : un lot toutes les QA_HISTORY_FLUSH_MS millisecondes ou dès
+# QA_HISTORY_BATCH_SIZE messages en attente
+QA_HISTORY_FLUSH_MS = int(os.getenv("QA_HISTORY_FLUSH_MS", "200"))
+QA_HISTORY_BATCH_SIZE = int(os.getenv("QA_HISTORY_BATCH_SIZE", "500"))
+# Au-delà, les messages les plus anciens ne sont plus persistés (base indisponible)
+QA_HISTORY_BUFFER_MAX = int(os.getenv("QA_HISTORY_BUFFER_MAX", "50000"))
+QA_HISTORY_PAGE_SIZE = int(os.getenv("QA_HISTORY_PAGE_SIZE", "50"))
+QA_HISTORY_MAX_PAGE_SIZE = 200
+
+messages_table = QAMessage.__table__
+
+
+def message_payload(row) -> dict:
+    return {
+        "id": row["id"],
+        "user_id": row["user_id"],
+        "content": row["content"],
+        "created_at": row["created_at"].isoformat(),
+    }
+
+
+def write_messages_batch(messages: List[dict]):
+    db = SessionLocal()
+    try:
+        db.execute(insert(messages_table).values(messages))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def load_history(conf_id: int, before: Optional[int] = None, limit: int = QA_HISTORY_PAGE_SIZE) -> dict:
+    """
+    Page de l'historique, du plus récent au plus ancien. `before` est le curseur renvoyé par
+    la page précédente (next_cursor) ; None quand il n'y a plus rien à charger.
+    """
+    limit = max(1, min(limit, QA_HISTORY_MAX_PAGE_SIZE))
+    stmt = select(messages_table).where(messages_table.c.conference_id == conf_id)
+    if before is not None:
+        stmt = stmt.where(messages_table.c.id < before)
+    stmt = stmt.order_by(messages_table.c.id.desc()).limit(limit + 1)
+
+    db = SessionLocal()
+    try:
+        rows = db.execute(stmt).mappings().all()
+    finally:
+        db.close()
+    page = [message_payload(row) for row in rows[:limit]]
+    return {
+        "messages": page,
+        "next_cursor": page[-1]["id"] if len(rows) > limit else None,
+    }
+
+
+class QAHistoryWriter:
+    """
+    Persistance des messages Q&A hors du chemin de diffusion : record() ajoute au tampon sans
+    attendre, une tâche de fond écrit les lots (insertion multi-lignes, un commit par lot).
+    """
+
+    def __init__(self, flush_ms: int = QA_HISTORY_FLUSH_MS, batch_size: int = QA_HISTORY_BATCH_SIZE):
+        self.interval = flush_ms / 1000
+        self.batch_size = batch_size
+        self._buffer: List[dict] = []
+        self._in_flight: List[dict] = []
+        self._full = None
+        self._task = None
+        self.dropped = 0
+
+    def record(self, conf_id: int, content: str, user_id: Optional[int] = None):
+        self._buffer.append({
+            "conference_id": conf_id,
+            "user_id": user_id,
+            "content": content,
+            "created_at": datetime.utcnow(),
+        })
+        overflow = len(self._buffer) - QA_HISTORY_BUFFER_MAX
+        if overflow > 0:
+            del self._buffer[:overflow]
+            self.dropped += overflow
+        if len(self._buffer) >= self.batch_size and self._full is not None:
+            self._full.set()
+
+    def pending(self, conf_id: int) -> List[dict]:
+        """
+        Messages reçus mais pas encore en base, du plus récent au plus ancien
+        """
+        pending = [m for m in self._in_flight + self._buffer if m["conference_id"] == conf_id]
+        return [{
+            "id": None,
+            "user_id": m["user_id"],
+            "content": m["content"],
+            "created_at": m["created_at"].isoformat(),
+        } for m in reversed(pending)]
+
+    async def replay(self, conf_id: int, limit: int = QA_HISTORY_PAGE_SIZE) -> dict:
+        """
+        Première page de l'historique : messages en attente d'écriture puis page en base.
+        Les messages en attente s'ajoutent à la page (sans id) pour ne pas décaler le curseur.
+        """
+        # Capturé avant la lecture : un lot écrit pendant celle-ci apparaît alors dans les deux
+        # listes (dédoublonnées ci-dessous) au lieu de n'apparaître dans aucune
+        pending = self.pending(conf_id)
+        loop = asyncio.get_running_loop()
+        history = await loop.run_in_executor(None, load_history, conf_id, None, limit)
+        stored = {(m["created_at"], m["content"]) for m in history["messages"]}
+        pending = [m for m in pending if (m["created_at"], m["content"]) not in stored]
+        history["messages"] = pending + history["messages"]
+        return history
+
+    async def start(self):
+        self._full = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+
+    async def flush(self):
+        while self._buffer:
+            batch = self._buffer[:self.batch_size]
+            del self._buffer[:len(batch)]
+            self._in_flight = batch
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(None, write_messages_batch, batch)
+            except IntegrityError as e:
+                # Conférence supprimée entre-temps : le lot ne passera jamais
+                self.dropped += len(batch)
+                print(f"Lot de messages Q&A abandonné ({len(batch)} messages): {e}")
+            except Exception as e:
+                print(f"Erreur lors de l'écriture des messages Q&A ({len(batch)} messages): {e}")
+                self._buffer[:0] = batch
+                return
+            finally:
+                self._in_flight = []
+
+
+qa_history = QAHistoryWriter()
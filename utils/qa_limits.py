@@ -0,0 +1,181 @@
+import hashlib
+import os
+import time
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, Optional
+
+from utils.pubsub import NOTIFY_MAX_PAYLOAD
+
+# Taille maximale d'une trame Q&A (octets UTF-8). Une trame diffusée est réencodée en JSON
+# dans l'enveloppe du backplane (jusqu'à 3 fois plus longue avec les échappements) : la
+# limite est ramenée sous ce que NOTIFY peut transmettre aux autres workers.
+QA_MAX_FRAME_BYTES = min(
+    int(os.getenv("QA_MAX_FRAME_BYTES", "2048")),
+    (NOTIFY_MAX_PAYLOAD - 512) // 3
+)
+# Seaux à jetons : débit soutenu (trames par seconde) et rafale, par connexion et par
+# utilisateur (toutes ses connexions sur ce worker)
+QA_CONNECTION_RATE = float(os.getenv("QA_CONNECTION_RATE", "2"))
+QA_CONNECTION_BURST = int(os.getenv("QA_CONNECTION_BURST", "10"))
+QA_USER_RATE = float(os.getenv("QA_USER_RATE", "3"))
+QA_USER_BURST = int(os.getenv("QA_USER_BURST", "15"))
+# Un même contenu renvoyé par le même émetteur dans cette fenêtre (secondes) est ignoré
+QA_DEDUP_WINDOW = float(os.getenv("QA_DEDUP_WINDOW", "30"))
+QA_DEDUP_SIZE = 32
+# Au-delà de QA_ERROR_FRAMES_MAX refus consécutifs on cesse de répondre par une trame
+# d'erreur ; à QA_MAX_REJECTED_STREAK la connexion est fermée
+QA_ERROR_FRAMES_MAX = 5
+QA_MAX_REJECTED_STREAK = int(os.getenv("QA_MAX_REJECTED_STREAK", "100"))
+# Nombre d'utilisateurs suivis par worker (les moins récents sont oubliés)
+QA_USER_STATES_MAX = 10000
+
+TOO_LARGE = "too_large"
+RATE_LIMITED = "rate_limited"
+DUPLICATE = "duplicate"
+
+
+class FrameRejected(Exception):
+    """Trame refusée avant diffusion ; le client reçoit une trame d'erreur"""
+
+    def __init__(self, code: str, detail: str, retry_after: Optional[float] = None):
+        super().__init__(detail)
+        self.code = code
+        self.detail = detail
+        self.retry_after = retry_after
+
+    def frame(self) -> dict:
+        frame = {"type": "error", "code": self.code, "detail": self.detail}
+        if self.retry_after is not None:
+            frame["retry_after"] = self.retry_after
+        return frame
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait(self) -> float:
+        # Délai avant le prochain jeton (0 s'il en reste un)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+class SenderState:
+    """
+    Seau à jetons et empreintes des derniers contenus d'un émetteur (connexion ou utilisateur)
+    """
+    __slots__ = ("bucket", "recent", "rejected_streak")
+
+    def __init__(self, rate: float, burst: int):
+        self.bucket = TokenBucket(rate, burst)
+        self.recent: OrderedDict = OrderedDict()  # empreinte -> échéance
+        self.rejected_streak = 0
+
+    def seen(self, digest: bytes, now: float) -> bool:
+        while self.recent:
+            _, expires_at = next(iter(self.recent.items()))
+            if expires_at > now:
+                break
+            self.recent.popitem(last=False)
+        if digest in self.recent:
+            return True
+        self.recent[digest] = now + QA_DEDUP_WINDOW
+        if len(self.recent) > QA_DEDUP_SIZE:
+            self.recent.popitem(last=False)
+        return False
+
+
+class QAFrameGuard:
+    """
+    Contrôle des trames reçues sur le WebSocket Q&A avant toute diffusion : taille, débit
+    (connexion et utilisateur) et doublons. Compte les trames acceptées et refusées par salle.
+    """
+
+    def __init__(self):
+        self._users: OrderedDict = OrderedDict()  # user_id -> SenderState
+        self.accepted: Counter = Counter()
+        self.rejected: Dict[int, Counter] = defaultdict(Counter)
+        self.closed = Counter()
+
+    def connection_state(self) -> SenderState:
+        return SenderState(QA_CONNECTION_RATE, QA_CONNECTION_BURST)
+
+    def _user_state(self, user_id: int) -> SenderState:
+        state = self._users.get(user_id)
+        if state is None:
+            state = self._users[user_id] = SenderState(QA_USER_RATE, QA_USER_BURST)
+            if len(self._users) > QA_USER_STATES_MAX:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user_id)
+        return state
+
+    def _reject(self, conf_id: int, connection: SenderState, error: FrameRejected):
+        connection.rejected_streak += 1
+        self.rejected[conf_id][error.code] += 1
+        raise error
+
+    def admit(self, conf_id: int, connection: SenderState, user_id: Optional[int], data: str):
+        """
+        Taille et débit d'une trame ; lève FrameRejected. Le jeton n'est pris que si la
+        connexion et l'utilisateur en ont chacun un.
+        """
+        if len(data) > QA_MAX_FRAME_BYTES or len(data.encode()) > QA_MAX_FRAME_BYTES:
+            self._reject(conf_id, connection, FrameRejected(
+                TOO_LARGE, f"Message trop long (maximum {QA_MAX_FRAME_BYTES} octets)"
+            ))
+        now = time.monotonic()
+        buckets = [connection.bucket]
+        if user_id is not None:
+            buckets.append(self._user_state(user_id).bucket)
+        for bucket in buckets:
+            bucket.refill(now)
+        wait = max(bucket.wait() for bucket in buckets)
+        if wait > 0:
+            wait = round(wait, 2)
+            self._reject(conf_id, connection, FrameRejected(
+                RATE_LIMITED, f"Trop de messages, réessayez dans {wait} s", retry_after=wait
+            ))
+        for bucket in buckets:
+            bucket.tokens -= 1
+
+    def check_duplicate(self, conf_id: int, connection: SenderState, user_id: Optional[int], content: str):
+        """
+        Refuse un contenu déjà envoyé par le même émetteur dans la fenêtre QA_DEDUP_WINDOW
+        """
+        digest = hashlib.blake2b(f"{conf_id}:{content}".encode(), digest_size=16).digest()
+        sender = connection if user_id is None else self._user_state(user_id)
+        if sender.seen(digest, time.monotonic()):
+            self._reject(conf_id, connection, FrameRejected(DUPLICATE, "Message identique déjà envoyé"))
+
+    def accept(self, conf_id: int, connection: SenderState):
+        connection.rejected_streak = 0
+        self.accepted[conf_id] += 1
+
+    def should_reply(self, connection: SenderState) -> bool:
+        return connection.rejected_streak <= QA_ERROR_FRAMES_MAX
+
+    def should_close(self, conf_id: int, connection: SenderState) -> bool:
+        if connection.rejected_streak < QA_MAX_REJECTED_STREAK:
+            return False
+        self.closed[conf_id] += 1
+        return True
+
+    def metrics(self, conf_id: int) -> dict:
+        rejected = self.rejected.get(conf_id, Counter())
+        return {
+            "accepted": self.accepted[conf_id],
+            "rejected": {code: rejected[code] for code in (TOO_LARGE, RATE_LIMITED, DUPLICATE)},
+            "closed_for_abuse": self.closed[conf_id],
+        }
+
+
+qa_guard = QAFrameGuard()
@@ -0,0 +1,419 @@
+import asyncio
+import json
+import os
+import uuid
+from bisect import bisect_left, insort
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from database import SessionLocal
+from models.conferences import Conference
+from models.qa_question import QAQuestion, QAQuestionVote
+from utils.pubsub import pubsub, WORKER_ID
+from utils.qa_rooms import qa_rooms
+
+# Intervalle (secondes) entre deux instantanés des questions en base
+QA_SNAPSHOT_INTERVAL = float(os.getenv("QA_SNAPSHOT_INTERVAL", "5"))
+# Durée (secondes) pendant laquelle les opérations reçues sont gardées pour être rejouées au
+# chargement d'une salle : la base peut avoir jusqu'à un instantané de retard sur chaque
+# worker d'origine (plus le temps d'écriture, ou un instantané en échec retenté)
+QA_RECENT_OPS_WINDOW = float(os.getenv("QA_RECENT_OPS_WINDOW", str(3 * QA_SNAPSHOT_INTERVAL)))
+# Nombre de questions envoyées à la connexion et maximum pour une demande "top"
+QA_TOP_SIZE = int(os.getenv("QA_TOP_SIZE", "20"))
+QA_TOP_MAX = 200
+QA_QUESTION_MAX_LENGTH = int(os.getenv("QA_QUESTION_MAX_LENGTH", "1000"))
+
+QA_QUESTIONS_CHANNEL = "qa_questions"
+
+# Trames du protocole de questions ; toute autre trame reste un message de discussion
+QUESTION_FRAMES = ("ask", "upvote", "answer", "hide", "unhide", "top")
+
+questions_table = QAQuestion.__table__
+votes_table = QAQuestionVote.__table__
+
+
+class QuestionError(Exception):
+    """Trame refusée ; le message est renvoyé au client dans une trame d'erreur"""
+
+
+class Question:
+    __slots__ = ("id", "conf_id", "user_id", "content", "votes", "answered", "hidden", "created_at")
+
+    def __init__(self, id, conf_id, user_id, content, votes=0, answered=False, hidden=False, created_at=None):
+        self.id = id
+        self.conf_id = conf_id
+        self.user_id = user_id
+        self.content = content
+        self.votes = votes
+        self.answered = answered
+        self.hidden = hidden
+        self.created_at = created_at or datetime.utcnow()
+
+    def key(self) -> Tuple:
+        # Plus de votes d'abord, puis la plus ancienne
+        return (-self.votes, self.created_at, self.id)
+
+    def visible(self) -> bool:
+        return not self.answered and not self.hidden
+
+    def payload(self) -> dict:
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "content": self.content,
+            "votes": self.votes,
+            "answered": self.answered,
+            "hidden": self.hidden,
+            "created_at": self.created_at.isoformat(),
+        }
+
+
+class QuestionIndex:
+    """
+    Questions d'une conférence. Les questions ouvertes (ni répondues ni masquées) sont gardées
+    triées dans une liste de clés (-votes, created_at, id) : un vote retire puis réinsère une
+    clé par recherche dichotomique, et le top k est une simple tranche de la liste.
+    """
+
+    def __init__(self, conf_id: int, organizer_id: Optional[int]):
+        self.conf_id = conf_id
+        self.organizer_id = organizer_id
+        self.questions: Dict[str, Question] = {}
+        self.voters: Dict[str, Set[int]] = defaultdict(set)
+        self._ranked: List[Tuple] = []
+
+    def _rank(self, question: Question):
+        if question.visible():
+            insort(self._ranked, question.key())
+
+    def _unrank(self, question: Question):
+        key = question.key()
+        index = bisect_left(self._ranked, key)
+        if index < len(self._ranked) and self._ranked[index] == key:
+            del self._ranked[index]
+
+    def add(self, question: Question):
+        if question.id in self.questions:
+            return
+        self.questions[question.id] = question
+        self._rank(question)
+
+    def upvote(self, question_id: str, user_id: int) -> Optional[Question]:
+        question = self.questions.get(question_id)
+        if question is None or user_id in self.voters[question_id]:
+            return None
+        self._unrank(question)
+        self.voters[question_id].add(user_id)
+        question.votes += 1
+        self._rank(question)
+        return question
+
+    def set_state(self, question_id: str, answered: Optional[bool] = None,
+                  hidden: Optional[bool] = None) -> Optional[Question]:
+        question = self.questions.get(question_id)
+        if question is None:
+            return None
+        self._unrank(question)
+        if answered is not None:
+            question.answered = answered
+        if hidden is not None:
+            question.hidden = hidden
+        self._rank(question)
+        return question
+
+    def top(self, limit: int) -> List[dict]:
+        return [self.questions[key[2]].payload() for key in self._ranked[:limit]]
+
+    def open_count(self) -> int:
+        return len(self._ranked)
+
+
+def _load_room(conf_id: int):
+    db = SessionLocal()
+    try:
+        organizer_id = db.execute(
+            select(Conference.organizer_id).where(Conference.id == conf_id)
+        ).scalar()
+        rows = db.execute(
+            select(questions_table).where(questions_table.c.conference_id == conf_id)
+        ).mappings().all()
+        votes = db.execute(
+            select(votes_table.c.question_id, votes_table.c.user_id)
+            .join(questions_table, questions_table.c.id == votes_table.c.question_id)
+            .where(questions_table.c.conference_id == conf_id)
+        ).all()
+    finally:
+        db.close()
+
+    index = QuestionIndex(conf_id, organizer_id)
+    for question_id, user_id in votes:
+        index.voters[question_id].add(user_id)
+    for row in rows:
+        # Le nombre de votes fait foi depuis la table des votes
+        index.add(Question(
+            row["id"], conf_id, row["user_id"], row["content"],
+            votes=len(index.voters.get(row["id"], ())),
+            answered=row["answered"], hidden=row["hidden"], created_at=row["created_at"]
+        ))
+    return index
+
+
+def _write_snapshot(questions: List[dict], votes: List[dict]):
+    db = SessionLocal()
+    try:
+        if questions:
+            stmt = pg_insert(questions_table).values(questions)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[questions_table.c.id],
+                set_={
+                    "votes": stmt.excluded.votes,
+                    "answered": stmt.excluded.answered,
+                    "hidden": stmt.excluded.hidden,
+                    "updated_at": stmt.excluded.updated_at,
+                }
+            )
+            db.execute(stmt)
+        if votes:
+            db.execute(pg_insert(votes_table).values(votes).on_conflict_do_nothing())
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+class QuestionBoard:
+    """
+    Index des questions par conférence, identique sur chaque worker : toutes les opérations
+    (question, vote, changement d'état) passent par le backplane et sont appliquées partout,
+    puis seule la variation est diffusée aux clients. Le worker d'origine d'une opération
+    l'inclut dans son prochain instantané en base.
+
+    Une salle est chargée depuis la base à la première connexion sur ce worker. La base peut
+    ne pas encore contenir les dernières opérations des autres workers : les opérations des
+    QA_RECENT_OPS_WINDOW dernières secondes (salle chargée ou non) sont gardées et rejouées
+    après le chargement, sans doublon (question par id, vote par votant). Une salle restée sans
+    connexion sur ce worker pendant deux instantanés est déchargée, une fois ses
+    modifications écrites.
+    """
+
+    def __init__(self):
+        self.rooms: Dict[int, QuestionIndex] = {}
+        self._loading: Dict[int, asyncio.Future] = {}
+        # conf_id -> (heure de réception, opération) des QA_RECENT_OPS_WINDOW dernières secondes
+        self._recent_ops: Dict[int, Deque[Tuple[float, dict]]] = {}
+        self._dirty: Set[Tuple[int, str]] = set()
+        self._new_votes: List[dict] = []
+        self._idle: Set[int] = set()
+        self._task = None
+
+    async def ensure_loaded(self, conf_id: int) -> QuestionIndex:
+        if conf_id in self.rooms:
+            return self.rooms[conf_id]
+        if conf_id in self._loading:
+            return await asyncio.shield(self._loading[conf_id])
+        future = asyncio.get_running_loop().create_future()
+        self._loading[conf_id] = future
+        try:
+            index = await asyncio.get_running_loop().run_in_executor(None, _load_room, conf_id)
+        except Exception as e:
+            del self._loading[conf_id]
+            future.set_exception(e)
+            future.exception()
+            raise
+        self.rooms[conf_id] = index
+        del self._loading[conf_id]
+        # Opérations récentes, y compris celles reçues pendant le chargement : celles déjà en
+        # base sont ignorées par QuestionIndex (question connue, votant déjà compté)
+        for _, op in self._recent_ops.get(conf_id, ()):
+            self._apply(op, broadcast=False)
+        future.set_result(index)
+        return index
+
+    # --- Trames des clients ---
+
+    def handle(self, conf_id: int, user_id: Optional[int], frame: dict) -> Optional[dict]:
+        """
+        Traite une trame du protocole de questions ; retourne la réponse destinée au seul
+        client émetteur (top) ou None. Lève QuestionError si la trame est refusée.
+        """
+        index = self.rooms[conf_id]
+        frame_type = frame["type"]
+
+        if frame_type == "top":
+            try:
+                limit = int(frame.get("limit", QA_TOP_SIZE))
+            except (TypeError, ValueError):
+                raise QuestionError("Paramètre limit invalide")
+            return {"type": "questions", "questions": index.top(max(1, min(limit, QA_TOP_MAX)))}
+
+        if frame_type == "ask":
+            content = frame.get("content")
+            if not isinstance(content, str) or not content.strip():
+                raise QuestionError("La question est vide")
+            if len(content) > QA_QUESTION_MAX_LENGTH:
+                raise QuestionError("La question est trop longue")
+            question = Question(uuid.uuid4().hex, conf_id, user_id, content.strip())
+            self._publish({"op": "ask", "conf_id": conf_id, "question": question.payload()})
+            return None
+
+        question_id = frame.get("id")
+        if question_id not in index.questions:
+            raise QuestionError("Question introuvable")
+
+        if frame_type == "upvote":
+            if user_id is None:
+                raise QuestionError("Authentification requise pour voter")
+            if user_id in index.voters.get(question_id, ()):
+                raise QuestionError("Vous avez déjà voté pour cette question")
+            self._publish({"op": "upvote", "conf_id": conf_id, "id": question_id, "user_id": user_id})
+            return None
+
+        # answer / hide / unhide : réservés à l'organisateur
+        if user_id is None or user_id != index.organizer_id:
+            raise QuestionError("Action réservée à l'organisateur de la conférence")
+        if frame_type == "answer":
+            state = {"answered": bool(frame.get("answered", True))}
+        else:
+            state = {"hidden": frame_type == "hide"}
+        self._publish({"op": "state", "conf_id": conf_id, "id": question_id, **state})
+        return None
+
+    # --- Backplane ---
+
+    def _publish(self, op: dict):
+        op["worker"] = WORKER_ID
+        pubsub.publish(QA_QUESTIONS_CHANNEL, op)
+
+    def on_backplane_message(self, op: dict):
+        conf_id = op["conf_id"]
+        self._remember(op)
+        if conf_id in self.rooms:
+            self._apply(op, broadcast=True)
+        # Salle en cours de chargement ou non chargée sur ce worker : l'opération sera rejouée
+        # après lecture de la base
+
+    def _remember(self, op: dict):
+        now = time.monotonic()
+        recent = self._recent_ops.setdefault(op["conf_id"], deque())
+        recent.append((now, op))
+        while recent[0][0] < now - QA_RECENT_OPS_WINDOW:
+            recent.popleft()
+
+    def _prune_recent_ops(self):
+        limit = time.monotonic() - QA_RECENT_OPS_WINDOW
+        for conf_id, recent in list(self._recent_ops.items()):
+            while recent and recent[0][0] < limit:
+                recent.popleft()
+            if not recent:
+                del self._recent_ops[conf_id]
+
+    def _apply(self, op: dict, broadcast: bool):
+        index = self.rooms[op["conf_id"]]
+        if op["op"] == "ask":
+            data = op["question"]
+            question = Question(
+                data["id"], op["conf_id"], data["user_id"], data["content"],
+                created_at=datetime.fromisoformat(data["created_at"])
+            )
+            index.add(question)
+            delta = {"type": "question_added", "question": question.payload()}
+        elif op["op"] == "upvote":
+            question = index.upvote(op["id"], op["user_id"])
+            if question is None:
+                return
+            if op.get("worker") == WORKER_ID:
+                self._new_votes.append({"question_id": question.id, "user_id": op["user_id"], "created_at": datetime.utcnow()})
+            delta = {"type": "question_updated", "id": question.id, "votes": question.votes}
+        else:
+            question = index.set_state(op["id"], op.get("answered"), op.get("hidden"))
+            if question is None:
+                return
+            delta = {"type": "question_updated", "id": question.id,
+                     "answered": question.answered, "hidden": question.hidden}
+
+        if op.get("worker") == WORKER_ID:
+            self._dirty.add((op["conf_id"], question.id))
+        if broadcast:
+            qa_rooms.broadcast(op["conf_id"], json.dumps(delta))
+
+    # --- Instantanés ---
+
+    def _collect_snapshot(self):
+        now = datetime.utcnow()
+        questions = []
+        for conf_id, question_id in self._dirty:
+            index = self.rooms.get(conf_id)
+            question = index.questions.get(question_id) if index else None
+            if question is None:
+                continue
+            questions.append({
+                "id": question.id,
+                "conference_id": conf_id,
+                "user_id": question.user_id,
+                "content": question.content,
+                "votes": question.votes,
+                "answered": question.answered,
+                "hidden": question.hidden,
+                "created_at": question.created_at,
+                "updated_at": now,
+            })
+        votes = self._new_votes
+        self._dirty = set()
+        self._new_votes = []
+        return questions, votes
+
+    async def snapshot(self):
+        questions, votes = self._collect_snapshot()
+        if not questions and not votes:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, _write_snapshot, questions, votes)
+        except Exception as e:
+            print(f"Erreur lors de l'instantané des questions Q&A: {e}")
+            # Les questions restent en mémoire : on retentera au prochain passage
+            self._dirty.update((q["conference_id"], q["id"]) for q in questions)
+            self._new_votes[:0] = votes
+
+    def unload_idle(self):
+        """
+        Décharge les salles sans connexion locale depuis le passage précédent. Une salle dont
+        des modifications ne sont pas encore écrites (instantané en échec) est conservée ; un
+        vote nouveau marque toujours sa question comme modifiée.
+        """
+        idle = {conf_id for conf_id in self.rooms if qa_rooms.connection_count(conf_id) == 0}
+        unsaved = {conf_id for conf_id, _ in self._dirty}
+        for conf_id in (idle & self._idle) - unsaved:
+            del self.rooms[conf_id]
+        self._idle = idle & set(self.rooms)
+
+    async def start(self):
+        pubsub.subscribe(QA_QUESTIONS_CHANNEL, self.on_backplane_message)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.snapshot()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(QA_SNAPSHOT_INTERVAL)
+            await self.snapshot()
+            self.unload_idle()
+            self._prune_recent_ops()
+
+
+question_board = QuestionBoard()
@@ -0,0 +1,297 @@
+import asyncio
+import json
+import os
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Set, Union
+
+from fastapi import WebSocket, status
+from starlette.websockets import WebSocketState
+
+from utils.pubsub import pubsub
+
+try:
+    import msgpack
+except ImportError:  # encodage MessagePack indisponible, seul le tableau JSON est proposé
+    msgpack = None
+
+# Taille de la file d'envoi de chaque connexion Q&A
+QA_SEND_QUEUE_SIZE = int(os.getenv("QA_SEND_QUEUE_SIZE", "256"))
+# Politique quand la file d'un client lent est pleine :
+#   drop_oldest (défaut) : on abandonne le plus ancien message en attente
+#   drop_newest          : on abandonne le message qui arrive
+#   disconnect           : on ferme la connexion (le client se reconnecte)
+QA_SLOW_CONSUMER_POLICY = os.getenv("QA_SLOW_CONSUMER_POLICY", "drop_oldest")
+
+POLICIES = ("drop_oldest", "drop_newest", "disconnect")
+
+# Mode groupé (optionnel, choisi par le client) : les messages d'une salle sont regroupés
+# pendant QA_BATCH_MS millisecondes puis envoyés en une seule trame, encodée une seule fois
+# pour toute la salle. Une trame contient au plus QA_BATCH_MAX_MESSAGES messages.
+QA_BATCH_MS = int(os.getenv("QA_BATCH_MS", "50"))
+QA_BATCH_MAX_MESSAGES = int(os.getenv("QA_BATCH_MAX_MESSAGES", "500"))
+#   json    : trame texte, tableau JSON des messages
+#   msgpack : trame binaire, tableau MessagePack des messages
+BATCH_FORMATS = ("json", "msgpack") if msgpack is not None else ("json",)
+
+
+def encode_batch(messages: List[str], batch_format: str) -> Union[str, bytes]:
+    if batch_format == "msgpack":
+        return msgpack.packb(messages)
+    return json.dumps(messages, ensure_ascii=False)
+
+# La vivacité des connexions repose sur les pings du protocole WebSocket (WS_PING_INTERVAL /
+# WS_PING_TIMEOUT, voir main.py) : uvicorn ferme une connexion qui n'y répond plus, et le
+# ramasse-miettes (toutes les QA_REAP_INTERVAL secondes) retire alors la connexion de sa salle.
+# Un client qui ne fait qu'écouter n'est donc jamais fermé tant qu'il répond à ces pings.
+# En complément, une trame applicative {"type": "ping"} est envoyée toutes les QA_PING_INTERVAL
+# secondes à une connexion muette (0 pour désactiver) ; y répondre ({"type": "pong"}) est facultatif.
+QA_PING_INTERVAL = float(os.getenv("QA_PING_INTERVAL", "20"))
+QA_REAP_INTERVAL = float(os.getenv("QA_REAP_INTERVAL", "10"))
+PING_FRAME = json.dumps({"type": "ping"})
+
+QA_CHANNEL = "qa"
+
+
+class QAConnection:
+    """
+    Une connexion WebSocket et sa file d'envoi bornée, vidée par une tâche dédiée :
+    un client lent ne retarde que lui-même. En mode groupé (`batch`), chaque trame est un
+    tableau de messages.
+    """
+
+    def __init__(self, websocket: WebSocket, conf_id: int, queue_size: int = QA_SEND_QUEUE_SIZE,
+                 batch: Optional[str] = None):
+        self.websocket = websocket
+        self.conf_id = conf_id
+        self.batch = batch
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.closed = False
+        self.closing = False  # fermeture pour lenteur décidée, pas encore effectuée
+        self.sender = None
+        self.last_seen = time.monotonic()  # dernière trame reçue du client
+        self.pinged_at = 0.0  # dernier ping applicatif envoyé
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def is_dead(self) -> bool:
+        return (
+            self.sender is None or self.sender.done()
+            or self.websocket.client_state == WebSocketState.DISCONNECTED
+            or self.websocket.application_state == WebSocketState.DISCONNECTED
+        )
+
+    def enqueue(self, message: str, policy: str) -> bool:
+        """
+        Non bloquant. Retourne False si la connexion doit être fermée (politique disconnect).
+        """
+        if self.batch is not None:
+            return self.put(encode_batch([message], self.batch), policy)
+        return self.put(message, policy)
+
+    def put(self, frame: Union[str, bytes], policy: str) -> bool:
+        """
+        Ajoute une trame déjà encodée pour cette connexion. Ne retourne False qu'une fois :
+        les trames suivantes sont ignorées jusqu'à la fermeture.
+        """
+        if self.closed or self.closing:
+            return True
+        if self.queue.full():
+            if policy == "disconnect":
+                self.closing = True
+                return False
+            self.dropped += 1
+            if policy == "drop_newest":
+                return True
+            self.queue.get_nowait()
+        self.queue.put_nowait(frame)
+        return True
+
+    async def send_loop(self):
+        while True:
+            frame = await self.queue.get()
+            if isinstance(frame, bytes):
+                await self.websocket.send_bytes(frame)
+            else:
+                await self.websocket.send_text(frame)
+
+
+class QARoomManager:
+    """
+    Salles Q&A locales au worker : conf_id -> ensemble de connexions (ajout / retrait en O(1)).
+    Les connexions en mode groupé sont servies par un envoi différé par salle au lieu d'une
+    trame par message.
+    """
+
+    def __init__(self, policy: str = QA_SLOW_CONSUMER_POLICY):
+        if policy not in POLICIES:
+            raise ValueError(f"QA_SLOW_CONSUMER_POLICY invalide: {policy} (attendu: {', '.join(POLICIES)})")
+        self.policy = policy
+        self.rooms: Dict[int, Set[QAConnection]] = {}
+        self._immediate: Dict[int, Set[QAConnection]] = {}
+        self._batched: Dict[int, Set[QAConnection]] = {}
+        self._pending: Dict[int, List[str]] = {}
+        self._flush_handles: Dict[int, asyncio.TimerHandle] = {}
+        self.disconnected_slow = 0
+        self.reaped_dead = 0
+        self._reaper = None
+        self._tasks = set()  # fermetures en cours (référence gardée jusqu'à leur fin)
+        # Par salle : messages abandonnés des connexions fermées, fermetures pour lenteur
+        self._dropped = Counter()
+        self._slow = Counter()
+
+    def connect(self, conf_id: int, websocket: WebSocket, batch: Optional[str] = None) -> QAConnection:
+        if batch is not None and batch not in BATCH_FORMATS:
+            raise ValueError(f"Format de trame groupée non supporté: {batch}")
+        connection = QAConnection(websocket, conf_id, batch=batch)
+        connection.sender = asyncio.create_task(self._run_sender(connection))
+        self.rooms.setdefault(conf_id, set()).add(connection)
+        members = self._batched if batch is not None else self._immediate
+        members.setdefault(conf_id, set()).add(connection)
+        return connection
+
+    @staticmethod
+    def _discard(members: Dict[int, Set[QAConnection]], connection: QAConnection):
+        room = members.get(connection.conf_id)
+        if room is not None:
+            room.discard(connection)
+            if not room:
+                del members[connection.conf_id]
+
+    async def disconnect(self, connection: QAConnection, code: int = None):
+        if connection.closed:
+            return
+        connection.closed = True
+        self._dropped[connection.conf_id] += connection.dropped
+        self._discard(self.rooms, connection)
+        self._discard(self._batched if connection.batch is not None else self._immediate, connection)
+        if connection.sender is not None and connection.sender is not asyncio.current_task():
+            connection.sender.cancel()
+        if code is not None:
+            try:
+                await connection.websocket.close(code=code)
+            except Exception:
+                pass
+
+    def publish(self, conf_id: int, message: str):
+        """
+        Diffusion à toute la salle, tous workers confondus : le backplane (utils.pubsub) remet
+        le message aux connexions locales puis aux autres workers, qui le diffusent chez eux
+        """
+        pubsub.publish(QA_CHANNEL, {"conf_id": conf_id, "message": message})
+
+    def on_backplane_message(self, envelope: dict):
+        self.broadcast(envelope["conf_id"], envelope["message"])
+
+    def broadcast(self, conf_id: int, message: str):
+        for connection in list(self._immediate.get(conf_id, ())):
+            self._put(connection, message)
+        if conf_id in self._batched:
+            pending = self._pending.setdefault(conf_id, [])
+            pending.append(message)
+            if len(pending) >= QA_BATCH_MAX_MESSAGES:
+                self._flush(conf_id)
+            elif conf_id not in self._flush_handles:
+                self._flush_handles[conf_id] = asyncio.get_running_loop().call_later(
+                    QA_BATCH_MS / 1000, self._flush, conf_id
+                )
+
+    def _flush(self, conf_id: int):
+        handle = self._flush_handles.pop(conf_id, None)
+        if handle is not None:
+            handle.cancel()
+        messages = self._pending.pop(conf_id, None)
+        if not messages:
+            return
+        # Une trame encodée par format pour toute la salle
+        frames = {}
+        for connection in list(self._batched.get(conf_id, ())):
+            frame = frames.get(connection.batch)
+            if frame is None:
+                frame = frames[connection.batch] = encode_batch(messages, connection.batch)
+            self._put(connection, frame)
+
+    def _put(self, connection: QAConnection, frame: Union[str, bytes]):
+        if not connection.put(frame, self.policy):
+            self.disconnected_slow += 1
+            self._slow[connection.conf_id] += 1
+            self._spawn(self.disconnect(connection, code=status.WS_1013_TRY_AGAIN_LATER))
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_sender(self, connection: QAConnection):
+        try:
+            await connection.send_loop()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Envoi impossible (socket fermée côté client) : on retire la connexion
+            await self.disconnect(connection)
+
+    def connection_count(self, conf_id: int) -> int:
+        return len(self.rooms.get(conf_id, ()))
+
+    def room_counts(self) -> Dict[int, int]:
+        return {conf_id: len(connections) for conf_id, connections in self.rooms.items()}
+
+    # --- Battement et ramasse-miettes ---
+
+    def reap(self):
+        """
+        Retire les connexions mortes (tâche d'envoi terminée, socket fermée, notamment après
+        un ping WebSocket sans réponse), envoie un ping applicatif aux connexions silencieuses
+        et oublie les envois groupés des salles vides
+        """
+        now = time.monotonic()
+        for conf_id, connections in list(self.rooms.items()):
+            for connection in list(connections):
+                if connection.is_dead():
+                    self.reaped_dead += 1
+                    self._spawn(self.disconnect(connection))
+                elif QA_PING_INTERVAL and now - max(connection.last_seen, connection.pinged_at) > QA_PING_INTERVAL:
+                    connection.pinged_at = now
+                    self._put(connection, encode_batch([PING_FRAME], connection.batch)
+                              if connection.batch is not None else PING_FRAME)
+        for conf_id in [conf_id for conf_id in self._pending if conf_id not in self._batched]:
+            handle = self._flush_handles.pop(conf_id, None)
+            if handle is not None:
+                handle.cancel()
+            del self._pending[conf_id]
+
+    async def start(self):
+        pubsub.subscribe(QA_CHANNEL, self.on_backplane_message)
+        self._reaper = asyncio.create_task(self._run_reaper())
+
+    async def stop(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            try:
+                await self._reaper
+            except asyncio.CancelledError:
+                pass
+            self._reaper = None
+
+    async def _run_reaper(self):
+        while True:
+            await asyncio.sleep(QA_REAP_INTERVAL)
+            try:
+                self.reap()
+            except Exception as e:
+                print(f"Erreur lors du nettoyage des connexions Q&A: {e}")
+
+    def metrics(self, conf_id: int) -> dict:
+        connections = self.rooms.get(conf_id, ())
+        return {
+            "connections": len(connections),
+            "batched_connections": len(self._batched.get(conf_id, ())),
+            "dropped": self._dropped[conf_id] + sum(c.dropped for c in connections),
+            "disconnected_slow": self._slow[conf_id],
+        }
+
+
+qa_rooms = QARoomManager()
@@ -0,0 +1,85 @@
+import json
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import cast, Date, delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from models.payment import Payment
+from models.payment_rollup import PaymentDailyRollup
+
+rollups_table = PaymentDailyRollup.__table__
+
+# Valeurs de Payment.payment_status prises en compte dans les totaux
+COMPLETED_STATUS = "completed"
+REFUNDED_STATUS = "refunded"
+
+
+def record_payment(db, conference_id: int, amount: float, paid_at: datetime, refund: bool = False):
+    """
+    Ajoute un paiement (ou un remboursement) au total journalier de la conférence.
+    N'effectue pas de commit : à appeler dans la transaction qui écrit le Payment.
+    """
+    if refund:
+        values = {"refunds_count": 1, "refunds_total": amount}
+    else:
+        values = {"payments_count": 1, "amount_total": amount}
+
+    stmt = pg_insert(rollups_table).values(
+        conference_id=int(conference_id),
+        day=paid_at.date(),
+        updated_at=datetime.utcnow(),
+        **values
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[rollups_table.c.conference_id, rollups_table.c.day],
+        set_={
+            "updated_at": stmt.excluded.updated_at,
+            **{column: rollups_table.c[column] + stmt.excluded[column] for column in values},
+        }
+    )
+    db.execute(stmt)
+
+
+def backfill_revenue_rollups(db, conference_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Reconstruit en masse les totaux journaliers à partir de la table payments
+    (INSERT ... SELECT ... GROUP BY) et retourne le nombre de jours écrits
+    """
+    day = cast(Payment.paid_at, Date)
+    source = select(
+        Payment.conference_id,
+        day.label("day"),
+        func.count().filter(Payment.payment_status == COMPLETED_STATUS).label("payments_count"),
+        func.coalesce(func.sum(Payment.amount).filter(Payment.payment_status == COMPLETED_STATUS), 0).label("amount_total"),
+        func.count().filter(Payment.payment_status == REFUNDED_STATUS).label("refunds_count"),
+        func.coalesce(func.sum(Payment.amount).filter(Payment.payment_status == REFUNDED_STATUS), 0).label("refunds_total"),
+        func.now().label("updated_at"),
+    ).where(Payment.paid_at.isnot(None)).group_by(Payment.conference_id, day)
+
+    clear = delete(rollups_table)
+    if conference_ids is not None:
+        conference_ids = list(conference_ids)
+        source = source.where(Payment.conference_id.in_(conference_ids))
+        clear = clear.where(rollups_table.c.conference_id.in_(conference_ids))
+
+    db.execute(clear)
+    result = db.execute(rollups_table.insert().from_select(
+        ["conference_id", "day", "payments_count", "amount_total", "refunds_count", "refunds_total", "updated_at"],
+        source
+    ))
+    db.commit()
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    # Backfill : python -m utils.revenue
+    import models  # noqa: F401  (enregistre tous les modèles et leurs relations)
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        days = backfill_revenue_rollups(db)
+    finally:
+        db.close()
+    print(json.dumps({"days": days}))
@@ -0,0 +1,44 @@
+import os
+import time
+from threading import Lock
+from typing import Optional
+
+# Durée de vie (en secondes) d'un instantané de statistiques par conférence
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "30"))
+
+# conference_id -> (expire_at, organizer_id, stats)
+_stats_cache = {}
+_lock = Lock()
+
+
+def get_cached_stats(conference_id: int, organizer_id: int) -> Optional[dict]:
+    """
+    Retourne l'instantané en cache s'il est encore valide et appartient bien à l'organisateur
+    """
+    with _lock:
+        entry = _stats_cache.get(conference_id)
+        if entry is None:
+            return None
+        expire_at, owner_id, stats = entry
+        if expire_at < time.monotonic():
+            del _stats_cache[conference_id]
+            return None
+    if owner_id != organizer_id:
+        return None
+    return stats
+
+
+def set_cached_stats(conference_id: int, organizer_id: int, stats: dict):
+    with _lock:
+        _stats_cache[conference_id] = (time.monotonic() + STATS_CACHE_TTL, organizer_id, stats)
+
+
+def invalidate_stats(conference_id: Optional[int]):
+    """
+    À appeler par les chemins d'écriture (reviews, inscriptions, certificats, sessions)
+    après le commit pour que le prochain chargement du tableau de bord soit à jour
+    """
+    if conference_id is None:
+        return
+    with _lock:
+        _stats_cache.pop(int(conference_id), None)